@@ -0,0 +1,17 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+Performance benchmarks for the EGRET unit commitment, DCOPF, and ACOPF
+pipelines. Run
+
+    python -m egret.benchmarks --help
+
+for the command line interface, or see egret.benchmarks.harness.
+"""
@@ -0,0 +1,77 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+Command line interface for the EGRET benchmarks, e.g.,
+
+    python -m egret.benchmarks --output current.json
+    python -m egret.benchmarks --solver cbc --baseline baseline.json
+
+Without --solver only the model build is benchmarked. With --baseline,
+the stages which are slower than the baseline by more than --threshold
+are reported, and the exit status is 1 if there are any.
+"""
+import sys
+import argparse
+
+from egret.benchmarks import harness
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m egret.benchmarks',
+                                     description='Benchmark the EGRET unit commitment, DCOPF, and ACOPF pipelines')
+    parser.add_argument('--solver', default=None,
+                        help='solver to use (e.g., cbc, glpk, ipopt); if not given, only the model build is benchmarked')
+    parser.add_argument('--problem', action='append', choices=[harness.UC, harness.DCOPF, harness.ACOPF],
+                        help='only benchmark these problem types (can be repeated)')
+    parser.add_argument('--case', action='append',
+                        help='only benchmark the cases with this name (can be repeated)')
+    parser.add_argument('--synthetic', type=int, nargs='+', metavar='NUM_BUSES',
+                        help='also benchmark synthetic unit commitment instances with these numbers of buses')
+    parser.add_argument('--time-periods', type=int, default=24,
+                        help='number of time periods in the synthetic instances')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed for the synthetic instances')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of times to run each build stage; the minimum time is reported')
+    parser.add_argument('--output', default=None,
+                        help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=None,
+                        help='compare against the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slow down over the baseline reported as a regression')
+    parser.add_argument('--absolute', action='store_true',
+                        help='compare the raw times rather than those normalized by the calibration workload')
+    args = parser.parse_args(args)
+
+    cases = harness.default_cases()
+    if args.synthetic:
+        cases.extend(harness.synthetic_cases(args.synthetic, num_time_periods=args.time_periods, seed=args.seed))
+    if args.problem:
+        cases = [ c for c in cases if c.problem in args.problem ]
+    if args.case:
+        cases = [ c for c in cases if c.name in args.case ]
+
+    results = harness.run_benchmarks(cases, solver=args.solver, repeat=args.repeat)
+    harness.print_results(results)
+
+    if args.output is not None:
+        harness.write_results(results, args.output)
+
+    if args.baseline is not None:
+        comparison, regressions = harness.compare(harness.read_results(args.baseline), results,
+                                                  threshold=args.threshold, normalized=not args.absolute)
+        sys.stdout.write('\ncomparison with {} (baseline, current, ratio):\n'.format(args.baseline))
+        harness.print_comparison(comparison)
+        if regressions:
+            sys.stdout.write('\n{} stage(s) slower than the baseline by more than {:.0%}\n'.format(len(regressions), args.threshold))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
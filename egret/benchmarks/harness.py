@@ -0,0 +1,349 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+This module times the stages of the EGRET pipelines on a ladder of
+instances. For each BenchmarkCase the stages timed are
+
+* read : ModelData.read (or the function creating the ModelData)
+* scale_to_pu : clone_in_service and scale_ModelData_to_pu
+* ptdf : construction of the PTDFMatrix (for cases with branches)
+* generate_model : construction of the pyomo model
+* solve : the full solve_* call, if a solver is given; for unit
+  commitment the time in the lazy PTDF iterations and in extracting
+  the results is reported as well
+
+Each stage is run repeat times and the minimum time is kept. The results
+also carry the time of a fixed calibration workload, and every stage time
+divided by it, so that runs on different machines can be compared. Results
+are written as JSON, and compare reports the stages which got slower
+relative to a baseline.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from egret.data.model_data import ModelData
+from egret.model_library.defn import BasePointType
+from egret.model_library.transmission.tx_utils import scale_ModelData_to_pu
+from egret.common.log import logger
+import egret.common.lazy_ptdf_utils as lpu
+import egret.data.data_utils as data_utils
+
+_BENCHMARK_FORMAT_VERSION = 1
+
+## problem types
+UC = 'uc'
+DCOPF = 'dcopf'
+ACOPF = 'acopf'
+
+BenchmarkCase = namedtuple('BenchmarkCase', ['name', 'problem', 'source'])
+BenchmarkCase.__doc__ = '''
+A benchmark instance. problem is one of 'uc', 'dcopf', or 'acopf',
+and source is either a file name (read with ModelData.read) or a
+function of no arguments which returns a ModelData object.
+'''
+
+_tests_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'tests')
+
+def default_cases():
+    '''
+    The default ladder of benchmark instances: the unit commitment
+    test instances bundled with EGRET, and the pglib-opf instances
+    used by the transmission tests if they have been downloaded
+    '''
+    cases = list()
+    uc_dir = os.path.join(_tests_dir, 'uc_test_instances')
+    for name in ['tiny_uc_tc', 'tiny_uc_tc_2', 'test_case_1', 'test_case_3', 'test_case_5']:
+        cases.append(BenchmarkCase(name, UC, os.path.join(uc_dir, name+'.json')))
+
+    pglib_dir = os.path.join(_tests_dir, 'transmission_test_instances', 'pglib-opf-master')
+    for name in ['pglib_opf_case30_ieee', 'pglib_opf_case300_ieee', 'pglib_opf_case3012wp_k', 'pglib_opf_case13659_pegase']:
+        file_name = os.path.join(pglib_dir, name+'.m')
+        if not os.path.isfile(file_name):
+            continue
+        cases.append(BenchmarkCase(name, DCOPF, file_name))
+        cases.append(BenchmarkCase(name, ACOPF, file_name))
+
+    return cases
+
+def synthetic_cases(sizes=(100, 500, 2000), num_time_periods=24, seed=0):
+    '''
+    A ladder of synthetic unit commitment instances (see egret.data.synthetic)
+    with the given numbers of buses. Each instance is created as its read stage.
+    '''
+    from egret.data.synthetic import create_ModelData
+    return [ BenchmarkCase('synthetic_{}'.format(n), UC,
+                           functools.partial(create_ModelData, num_buses=n, num_storage=n//100,
+                                             num_interfaces=2, num_areas=2, num_time_periods=num_time_periods, seed=seed))
+             for n in sizes ]
+
+def calibrate(repeat=3):
+    '''
+    the time for a fixed workload of python and numpy operations,
+    which gives a unit of time in which to compare different machines
+    '''
+    def _workload():
+        total = 0
+        for i in range(500000):
+            total += i % 7
+        A = np.arange(250*250, dtype=float).reshape(250,250) / (250.*250.)
+        for _ in range(20):
+            A = np.tanh(A.dot(A.T))
+        return total
+    return _min_time(_workload, repeat)[0]
+
+def _min_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ret = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ret
+
+def _machine_metadata():
+    import pyomo.version
+    return { 'python' : platform.python_version(),
+             'implementation' : platform.python_implementation(),
+             'platform' : platform.platform(),
+             'machine' : platform.machine(),
+             'processor' : platform.processor(),
+             'cpu_count' : os.cpu_count(),
+             'numpy' : np.__version__,
+             'pyomo' : pyomo.version.version,
+           }
+
+def _read(case):
+    if callable(case.source):
+        return case.source()
+    return ModelData.read(case.source)
+
+def _case_size(md):
+    size = { element_type : len(elements) for element_type, elements in md.data['elements'].items() }
+    size['time_periods'] = len(md.data['system'].get('time_indices', ()))
+    return size
+
+def _calculate_ptdf(md_pu, ptdf_options=None):
+    ptdf_options = lpu.populate_default_ptdf_options(ptdf_options)
+    lpu.check_and_scale_ptdf_options(ptdf_options, md_pu.data['system']['baseMVA'])
+
+    branches = dict(md_pu.elements(element_type='branch'))
+    buses = dict(md_pu.elements(element_type='bus'))
+    interfaces = dict(md_pu.elements(element_type='interface'))
+    reference_bus = md_pu.data['system']['reference_bus']
+
+    return data_utils.PTDFMatrix(branches, buses, reference_bus, BasePointType.FLATSTART, ptdf_options,
+                                 branches_keys=tuple(branches.keys()), buses_keys=tuple(buses.keys()),
+                                 interfaces=interfaces)
+
+def _generate_model_function(problem):
+    if problem == UC:
+        from egret.models.unit_commitment import create_tight_unit_commitment_model
+        return lambda md, ptdf_options : create_tight_unit_commitment_model(md, ptdf_options=ptdf_options)
+    if problem == DCOPF:
+        from egret.models.dcopf import create_ptdf_dcopf_model
+        return lambda md, ptdf_options : create_ptdf_dcopf_model(md, ptdf_options=ptdf_options)
+    if problem == ACOPF:
+        from egret.models.acopf import create_psv_acopf_model
+        return lambda md, ptdf_options : create_psv_acopf_model(md)
+    raise Exception("Unrecognized problem type {}".format(problem))
+
+def _solve(problem, md, solver, ptdf_options):
+    if problem == UC:
+        from egret.models.unit_commitment import solve_unit_commitment
+        return solve_unit_commitment(md, solver, solver_tee=False, ptdf_options=ptdf_options, return_results=True)
+    if problem == DCOPF:
+        from egret.models.dcopf import solve_dcopf, create_ptdf_dcopf_model
+        return solve_dcopf(md, solver, solver_tee=False, dcopf_model_generator=create_ptdf_dcopf_model,
+                           ptdf_options=ptdf_options, return_results=True)
+    if problem == ACOPF:
+        from egret.models.acopf import solve_acopf
+        return solve_acopf(md, solver, solver_tee=False, return_results=True)
+    raise Exception("Unrecognized problem type {}".format(problem))
+
+def _copy_options(ptdf_options):
+    ## the ptdf_options are scaled in place by the model generators
+    return None if ptdf_options is None else dict(ptdf_options)
+
+def run_case(case, solver=None, repeat=1, ptdf_options=None):
+    '''
+    Times the stages of the pipeline for case
+
+    Parameters
+    ----------
+    case : BenchmarkCase
+        The instance to benchmark
+    solver : str (optional)
+        The solver to use. If None (the default), only the
+        model build is benchmarked.
+    repeat : int (optional)
+        The number of times each stage is run; the minimum time is kept.
+        The solve stage is only run once. Default is 1.
+    ptdf_options : dict (optional)
+        ptdf_options for the unit commitment and DCOPF models
+
+    Returns
+    -------
+        dict : the case, its size, and the time of each stage
+    '''
+    stages = dict()
+
+    stages['read'], md = _min_time(lambda : _read(case), repeat)
+
+    def _scale():
+        md_pu = md.clone_in_service(deep=False)
+        scale_ModelData_to_pu(md_pu, inplace=True)
+        return md_pu
+    stages['scale_to_pu'], md_pu = _min_time(_scale, repeat)
+
+    if len(md_pu.data['elements'].get('branch', {})) > 0 and case.problem in (UC, DCOPF):
+        stages['ptdf'], _ = _min_time(lambda : _calculate_ptdf(md_pu, _copy_options(ptdf_options)), repeat)
+
+    generate_model = _generate_model_function(case.problem)
+    stages['generate_model'], model = _min_time(lambda : generate_model(md, _copy_options(ptdf_options)), repeat)
+
+    result = { 'name' : case.name,
+               'problem' : case.problem,
+               'size' : _case_size(md),
+               'stages' : stages,
+             }
+
+    ## the unit commitment model records the time in each of its build phases
+    if case.problem == UC:
+        report = model._performance_report.to_dict()
+        result['build_phases'] = { p['name'] : p['time'] for p in report['phases'] }
+        result['size']['variables'] = sum(p.get('variables', 0) for p in report['phases'])
+        result['size']['constraints'] = sum(p.get('constraints', 0) for p in report['phases'])
+    del model
+
+    if solver is not None:
+        start = time.perf_counter()
+        _, results = _solve(case.problem, md, solver, _copy_options(ptdf_options))
+        stages['solve'] = time.perf_counter() - start
+
+        if case.problem == UC:
+            report = results.egret_metasolver['performance']
+            lazy_iterations = report['lazy_iterations']
+            stages['lazy_check'] = sum(it['check_time'] for it in lazy_iterations)
+            stages['lazy_add'] = sum(it['add_time'] for it in lazy_iterations)
+            stages['lazy_solve'] = sum(it['solve_time'] for it in lazy_iterations)
+            result['lazy_iterations'] = len(lazy_iterations)
+            for p in report['phases']:
+                if p['name'] == 'extract results':
+                    stages['extract_results'] = p['time']
+
+    return result
+
+def run_benchmarks(cases=None, solver=None, repeat=1, ptdf_options=None):
+    '''
+    Runs run_case for each case in cases (by default, default_cases())
+
+    Returns
+    -------
+        dict : the machine metadata, calibration time, and case results.
+               Each case result also has its stage times divided by the
+               calibration time under 'normalized_stages'
+    '''
+    if cases is None:
+        cases = default_cases()
+
+    calibration_time = calibrate()
+
+    results = list()
+    for case in cases:
+        logger.info("benchmarking {} ({})".format(case.name, case.problem))
+        result = run_case(case, solver=solver, repeat=repeat, ptdf_options=ptdf_options)
+        result['normalized_stages'] = { stage : t / calibration_time for stage, t in result['stages'].items() }
+        results.append(result)
+
+    return { 'format_version' : _BENCHMARK_FORMAT_VERSION,
+             'timestamp' : datetime.datetime.now().isoformat(),
+             'machine' : _machine_metadata(),
+             'solver' : solver,
+             'repeat' : repeat,
+             'calibration_time' : calibration_time,
+             'cases' : results,
+           }
+
+def write_results(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def read_results(filename):
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+def compare(baseline, current, threshold=0.1, normalized=True):
+    '''
+    Compares two sets of results from run_benchmarks
+
+    Parameters
+    ----------
+    baseline : dict
+        Results from run_benchmarks (or read_results)
+    current : dict
+        Results from run_benchmarks (or read_results)
+    threshold : float (optional)
+        The relative slow down over the baseline above which
+        a stage is reported as a regression. Default is 0.1.
+    normalized : bool (optional)
+        If True (the default), the normalized stage times are
+        compared, which allows results from different machines
+        to be compared
+
+    Returns
+    -------
+        list : a list of (case name, problem, stage, baseline time, current
+               time, ratio) tuples for each stage in both results, sorted
+               with the largest ratio first
+        list : the subset of the first list with ratio above 1+threshold
+    '''
+    key = 'normalized_stages' if normalized else 'stages'
+    baseline_cases = { (c['name'], c['problem']) : c for c in baseline['cases'] }
+
+    comparison = list()
+    for c in current['cases']:
+        base = baseline_cases.get((c['name'], c['problem']))
+        if base is None:
+            continue
+        for stage, t in c[key].items():
+            if stage not in base[key]:
+                continue
+            base_t = base[key][stage]
+            ratio = t / base_t if base_t > 0 else float('inf')
+            comparison.append((c['name'], c['problem'], stage, base_t, t, ratio))
+
+    comparison.sort(key=lambda row : row[-1], reverse=True)
+    regressions = [ row for row in comparison if row[-1] > 1.+threshold ]
+    return comparison, regressions
+
+def print_results(results, stream=sys.stdout):
+    stage_names = list()
+    for c in results['cases']:
+        for stage in c['stages']:
+            if stage not in stage_names:
+                stage_names.append(stage)
+    header = ['case', 'problem'] + stage_names
+    stream.write(' '.join('{:>16}'.format(h[:16]) for h in header)+'\n')
+    for c in results['cases']:
+        row = [ c['name'][:16], c['problem'] ] + [ '{:.4f}'.format(c['stages'][s]) if s in c['stages'] else '-' for s in stage_names ]
+        stream.write(' '.join('{:>16}'.format(r) for r in row)+'\n')
+
+def print_comparison(comparison, stream=sys.stdout):
+    for name, problem, stage, base_t, t, ratio in comparison:
+        stream.write('{:>24} {:>6} {:>16} {:>12.4f} {:>12.4f} {:>8.2f}x\n'.format(name[:24], problem, stage, base_t, t, ratio))
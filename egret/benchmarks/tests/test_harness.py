@@ -0,0 +1,50 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+benchmark harness tester
+'''
+import os
+import tempfile
+
+from egret.benchmarks import harness
+
+def _tiny_cases():
+    return [ c for c in harness.default_cases() if c.name == 'tiny_uc_tc' ]
+
+def test_build_only_benchmark():
+    results = harness.run_benchmarks(_tiny_cases())
+
+    assert results['calibration_time'] > 0.
+    assert len(results['cases']) == 1
+    case = results['cases'][0]
+    for stage in ('read', 'scale_to_pu', 'ptdf', 'generate_model'):
+        assert stage in case['stages']
+        assert case['normalized_stages'][stage] == case['stages'][stage] / results['calibration_time']
+    assert 'solve' not in case['stages']
+    assert case['size']['bus'] == 2
+    assert case['size']['time_periods'] == 24
+    assert case['size']['constraints'] > 0
+
+def test_benchmark_comparison():
+    results = harness.run_benchmarks(_tiny_cases())
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_name = os.path.join(tmpdir, 'results.json')
+        harness.write_results(results, file_name)
+        baseline = harness.read_results(file_name)
+
+    comparison, regressions = harness.compare(baseline, results)
+    assert len(comparison) == len(results['cases'][0]['stages'])
+    assert regressions == []
+
+    ## a run which is twice as slow is a regression
+    slower = dict(baseline, cases=[ dict(c, normalized_stages={ s : 2*t for s, t in c['normalized_stages'].items() }) for c in baseline['cases'] ])
+    comparison, regressions = harness.compare(baseline, slower)
+    assert len(regressions) == len(comparison)
@@ -0,0 +1,145 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+This module records where the time (and memory) goes when building and
+solving EGRET models. A PerformanceReport collects
+
+* phases : for each phase of the model build (or solve), the wall time,
+  the growth in the peak resident set size of the process, and the number
+  of pyomo components, variables, and constraints created in the phase
+
+* lazy_iterations : for each iteration of a lazy PTDF loop, the time
+  spent checking for violations, adding constraints, and re-solving
+
+The report can be converted to a dictionary with to_dict or written
+as a JSON trace with write.
+"""
+import sys
+import time
+import json
+from contextlib import contextmanager
+
+import pyomo.environ as pe
+
+try:
+    import resource
+except ImportError:
+    ## e.g., on Windows
+    resource = None
+
+def _peak_rss_mb():
+    '''
+    the peak resident set size of this process in MB,
+    or None if it is not available on this platform
+    '''
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ## ru_maxrss is in bytes on macOS, and kilobytes elsewhere
+    if sys.platform == 'darwin':
+        return maxrss / (1024.*1024.)
+    return maxrss / 1024.
+
+def _components(model):
+    return { id(c) : c for c in model.component_objects(descend_into=True) }
+
+def _component_counts(components):
+    counts = { 'components' : len(components), 'variables' : 0, 'constraints' : 0 }
+    for c in components:
+        if isinstance(c, pe.Var):
+            counts['variables'] += len(c)
+        elif isinstance(c, pe.Constraint):
+            counts['constraints'] += len(c)
+    return counts
+
+
+class PerformanceReport(object):
+    '''
+    Collects the timing and memory use of the phases of
+    building and solving a model
+    '''
+    def __init__(self):
+        self.phases = list()
+        self.lazy_iterations = list()
+
+    @contextmanager
+    def phase(self, name, model=None):
+        '''
+        Records the wall time and peak RSS growth of the code in this
+        context as the phase name. If model is given, the pyomo components
+        created on model in this context are counted as well.
+        '''
+        if model is not None:
+            components_before = _components(model)
+        rss_before = _peak_rss_mb()
+        start_time = time.perf_counter()
+
+        yield
+
+        record = { 'name' : name, 'time' : time.perf_counter() - start_time }
+        rss_after = _peak_rss_mb()
+        record['peak_rss_delta_mb'] = None if rss_before is None else rss_after - rss_before
+        if model is not None:
+            new_components = [ c for i, c in _components(model).items() if i not in components_before ]
+            record.update(_component_counts(new_components))
+        self.phases.append(record)
+
+    def record_phase(self, name, elapsed):
+        '''
+        Records a phase named name which took elapsed seconds, for
+        code which cannot conveniently be wrapped with phase
+        '''
+        self.phases.append({ 'name' : name, 'time' : elapsed, 'peak_rss_delta_mb' : None })
+
+    def record_iteration(self, loop, iteration, check_time, add_time=0., solve_time=0., violations=0, added=0):
+        '''
+        Records a single iteration of a lazy PTDF loop
+
+        Parameters
+        ----------
+        loop : str
+            The name of the loop, e.g., "[MIP phase] "
+        iteration : int
+            The iteration number
+        check_time : float
+            Time spent calculating flows and checking for violations
+        add_time : float (optional)
+            Time spent adding the violated constraints
+        solve_time : float (optional)
+            Time spent re-solving the model
+        violations : int (optional)
+            The number of violations found
+        added : int (optional)
+            The number of constraints added
+        '''
+        self.lazy_iterations.append({ 'loop' : loop.strip(),
+                                      'iteration' : iteration,
+                                      'check_time' : check_time,
+                                      'add_time' : add_time,
+                                      'solve_time' : solve_time,
+                                      'violations' : violations,
+                                      'added' : added,
+                                    })
+
+    def total_time(self):
+        return sum(p['time'] for p in self.phases)
+
+    def to_dict(self):
+        return { 'phases' : [ dict(p) for p in self.phases ],
+                 'lazy_iterations' : [ dict(it) for it in self.lazy_iterations ],
+                 'total_phase_time' : self.total_time(),
+               }
+
+    def write(self, filename):
+        '''
+        Writes this report as a JSON trace to filename
+        '''
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -9,13 +9,18 @@
 
 ## helpers for flow verification across dcopf and unit commitment models
 from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
-from egret.model_library.defn import ApproximationType
+from egret.model_library.defn import ApproximationType, BasePointType
 from egret.common.log import logger
 import egret.model_library.transmission.branch as libbranch
+import egret.data.data_utils as data_utils
 import pyomo.environ as pe
 import numpy as np
 import copy as cp
+import os
+import json
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from enum import Enum
 
 
@@ -62,6 +67,42 @@ def populate_default_ptdf_options(ptdf_options):
         ptdf_options['active_flow_tol'] = 10.
     if 'lp_cleanup_phase' not in ptdf_options:
         ptdf_options['lp_cleanup_phase'] = True
+    if 'ptdf_method' not in ptdf_options:
+        ptdf_options['ptdf_method'] = 'splu'
+    if 'lazy_ptdf_rows' not in ptdf_options:
+        ptdf_options['lazy_ptdf_rows'] = False
+    if 'low_rank_outage_update' not in ptdf_options:
+        ptdf_options['low_rank_outage_update'] = True
+    if 'cache_dir' not in ptdf_options:
+        ptdf_options['cache_dir'] = None
+    if 'batch_violation_check' not in ptdf_options:
+        ptdf_options['batch_violation_check'] = True
+    if 'ptdf_workers' not in ptdf_options:
+        ptdf_options['ptdf_workers'] = None
+    if 'non_persistent_warmstart' not in ptdf_options:
+        ptdf_options['non_persistent_warmstart'] = False
+    if 'binding_constraint_store' not in ptdf_options:
+        ptdf_options['binding_constraint_store'] = None
+    if 'ptdf_cache' not in ptdf_options:
+        ptdf_options['ptdf_cache'] = None
+    if 'lazy_interfaces' not in ptdf_options:
+        ptdf_options['lazy_interfaces'] = True
+    if 'interface_abs_flow_tol' not in ptdf_options:
+        ptdf_options['interface_abs_flow_tol'] = 1.e-3
+    if 'interface_rel_flow_tol' not in ptdf_options:
+        ptdf_options['interface_rel_flow_tol'] = 1.e-5
+    if 'interface_lazy_rel_flow_tol' not in ptdf_options:
+        ptdf_options['interface_lazy_rel_flow_tol'] = -0.01
+    if 'interface_active_flow_tol' not in ptdf_options:
+        ptdf_options['interface_active_flow_tol'] = 10.
+    if 'contingencies' not in ptdf_options:
+        ptdf_options['contingencies'] = None
+    if 'num_threads' not in ptdf_options:
+        ptdf_options['num_threads'] = None
+    if 'sparse_ptdf' not in ptdf_options:
+        ptdf_options['sparse_ptdf'] = False
+    if 'ptdf_float32' not in ptdf_options:
+        ptdf_options['ptdf_float32'] = False
     return ptdf_options
 
 def check_and_scale_ptdf_options(ptdf_options, baseMVA):
@@ -69,9 +110,12 @@ def check_and_scale_ptdf_options(ptdf_options, baseMVA):
     ptdf_options['abs_ptdf_tol'] /= baseMVA
     ptdf_options['abs_flow_tol'] /= baseMVA
     ptdf_options['active_flow_tol'] /= baseMVA
+    ptdf_options['interface_abs_flow_tol'] /= baseMVA
+    ptdf_options['interface_active_flow_tol'] /= baseMVA
 
     ## lowercase keyword options
     ptdf_options['kv_threshold_type'] = ptdf_options['kv_threshold_type'].lower()
+    ptdf_options['ptdf_method'] = ptdf_options['ptdf_method'].lower()
 
     rel_flow_tol = ptdf_options['rel_flow_tol']
     abs_flow_tol = ptdf_options['abs_flow_tol']
@@ -95,6 +139,31 @@ def check_and_scale_ptdf_options(ptdf_options, baseMVA):
                         " above branch_kv_threshold) or 'both' (for both end of the line above"
                         " branch_kv_threshold), kv_threshold_type={}".format(ptdf_options['kv_threshold_type']))
 
+    if ptdf_options['ptdf_method'] not in ['splu', 'dense']:
+        raise Exception("ptdf_method must be either 'splu' (for a sparse LU factorization of the"
+                        " network matrix) or 'dense' (for a dense inverse of the network matrix),"
+                        " ptdf_method={}".format(ptdf_options['ptdf_method']))
+
+    if ptdf_options['lazy_ptdf_rows'] and ptdf_options['ptdf_method'] != 'splu':
+        raise Exception("lazy_ptdf_rows requires ptdf_method='splu', ptdf_method={}".format(ptdf_options['ptdf_method']))
+
+    if ptdf_options['sparse_ptdf'] and ptdf_options['lazy'] and ptdf_options['lazy_ptdf_rows']:
+        raise Exception("sparse_ptdf cannot be used with lazy_ptdf_rows, which never stores the full PTDF matrix")
+
+    if ptdf_options['ptdf_float32'] and not ptdf_options['sparse_ptdf']:
+        raise Exception("ptdf_float32 requires sparse_ptdf=True")
+
+    contingencies = ptdf_options['contingencies']
+    if contingencies is not None:
+        if isinstance(contingencies, str) and contingencies.lower() != 'all':
+            raise Exception("contingencies must be None, 'all', or a list of branch names,"
+                            " contingencies={}".format(contingencies))
+        if isinstance(contingencies, str):
+            ptdf_options['contingencies'] = 'all'
+        if not ptdf_options['lazy']:
+            raise Exception("contingencies requires lazy=True, as the post-contingency"
+                            " flow limits are only added when violated")
+
     if abs_flow_tol < 1e-6:
         logger.warning("WARNING: abs_flow_tol={0}, which is below the numeric threshold of most solvers.".format(abs_flow_tol*baseMVA))
     if abs_flow_tol < rel_ptdf_tol*10:
@@ -109,21 +178,261 @@ def check_and_scale_ptdf_options(ptdf_options, baseMVA):
 def add_monitored_branch_tracker(mb):
     mb._lt_idx_monitored = list()
     mb._gt_idx_monitored = list()
+    mb._lt_interface_idx_monitored = list()
+    mb._gt_interface_idx_monitored = list()
+    mb._lt_contingency_idx_monitored = list()
+    mb._gt_contingency_idx_monitored = list()
+
+def _lazy_interfaces(mb, PTDF):
+    return len(PTDF.interface_keys) > 0 and mb.model()._ptdf_options['lazy_interfaces']
+
+def _contingencies(PTDF):
+    return len(PTDF.contingency_keys) > 0
 
 def calculate_PFV(mb, PTDF):
+    '''
+    calculates the (masked) branch flows, the interface flows,
+    and the flows on the contingency branches
+    '''
     NWV = np.fromiter((pe.value(mb.p_nw[b]) for b in PTDF.bus_iterator()), float, count=len(PTDF.buses_keys))
+
+    PFV_I = PTDF.calculate_PFV_I(NWV)
+
     NWV += PTDF.phi_adjust_array
 
-    PFV  = PTDF.PTDFM_masked.dot(NWV)
-    PFV += PTDF.phase_shift_array_masked
+    PFV = PTDF.calculate_masked_PFV(NWV)
+    PFV_K = PTDF.calculate_contingency_PFV(NWV)
+
+    return PFV, PFV_I, PFV_K
+
+
+def calculate_PFV_batch(mbs, PTDF):
+    '''
+    calculates the flows for every block in mbs, which
+    all share PTDF, as a (branch x block) matrix, along
+    with the (interface x block) matrix of interface flows
+    and the (contingency x block) matrix of contingency flows
+    '''
+    NWV = np.empty((len(PTDF.buses_keys), len(mbs)))
+    for k, mb in enumerate(mbs):
+        NWV[:,k] = np.fromiter((pe.value(mb.p_nw[b]) for b in PTDF.bus_iterator()), float, count=len(PTDF.buses_keys))
+
+    PFV_I = PTDF.calculate_PFV_I(NWV)
+
+    NWV += PTDF.phi_adjust_array[:,np.newaxis]
+
+    PFV = PTDF.calculate_masked_PFV(NWV)
+    PFV_K = PTDF.calculate_contingency_PFV(NWV)
+
+    return PFV, PFV_I, PFV_K
+
+
+def map_in_threads(func, items, num_threads=None):
+    '''
+    returns the list [func(item) for item in items], calling func
+    in a pool of num_threads threads if num_threads is at least 2.
+    This helps when func spends its time in numpy, which releases
+    the GIL. The results are always in the order of items.
+    '''
+    items = list(items)
+    if num_threads is None or num_threads < 2 or len(items) < 2:
+        return [ func(item) for item in items ]
+    with ThreadPoolExecutor(max_workers=min(num_threads, len(items))) as executor:
+        return list(executor.map(func, items))
+
+## batched violation checker
+def check_violations_batch(mbs, md, PTDF, max_viol_add, times, prepend_str="", num_threads=None):
+    '''
+    check_violations for several blocks which share the same
+    PTDF matrix, calculating all the flows with a single
+    matrix-matrix product. Returns a list with the output
+    of check_violations for each block in mbs. The blocks
+    with violations are checked in num_threads threads
+    '''
+    PFV, PFV_I, PFV_K = calculate_PFV_batch(mbs, PTDF)
+
+    ## find the blocks with any flow beyond the lazy limits;
+    ## there is nothing more to check for the others
+    lazy_branch_limits = PTDF.lazy_branch_limits[:,np.newaxis]
+    any_viol_lazy = np.logical_or(PFV > lazy_branch_limits, -PFV > lazy_branch_limits).any(axis=0)
+    if _lazy_interfaces(mbs[0], PTDF):
+        any_viol_lazy |= np.logical_or(PFV_I > PTDF.lazy_interface_max_limits[:,np.newaxis],
+                                       PFV_I < PTDF.lazy_interface_min_limits[:,np.newaxis]).any(axis=0)
+    ## the post-contingency flows are screened block by block
+    if _contingencies(PTDF):
+        any_viol_lazy[:] = True
+
+    def _check_violations(k):
+        return check_violations(mbs[k], md, PTDF, max_viol_add, time=times[k], prepend_str=prepend_str,
+                                PFV=PFV[:,k], PFV_I=PFV_I[:,k], PFV_K=PFV_K[:,k])
+
+    to_check = np.nonzero(any_viol_lazy)[0].tolist()
+    checked = dict(zip(to_check, map_in_threads(_check_violations, to_check, num_threads)))
+
+    viol_data = list()
+    for k in range(len(mbs)):
+        if k in checked:
+            viol_data.append(checked[k])
+        else:
+            viol_data.append((PFV[:,k], PFV_I[:,k], 0, 0, set(), set(), set(), set(), set(), set()))
 
-    return PFV
+    return viol_data
 
 
-## violation checker
-def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str=""):
+def _generate_interface_viol_warning(sense, mb, i_n, flow, limit, baseMVA, time):
+    ret_str = "WARNING: interface {0} ({1}) is in the  monitored set".format(i_n, sense)
+    if time is not None:
+        ret_str += " at time {}".format(time)
+    ret_str += ", but flow exceeds limit!!\n\t flow={0}, limit={1}".format(flow*baseMVA, limit*baseMVA)
+    ret_str += ", model_flow={}".format(pe.value(mb.pfi[i_n])*baseMVA)
+    return ret_str
+
+## interface violation checker
+def _check_interface_violations(mb, md, PTDF, PFV_I, max_viol_add, time=None, prepend_str=""):
+    '''
+    the interface counterpart of check_violations. Returns the
+    number of violations, the number of violations which are
+    already monitored, and the indices of the interfaces to add
+    at their upper and lower limits
+    '''
+    if not _lazy_interfaces(mb, PTDF):
+        return 0, 0, set(), set()
+
+    ## calculate the lazy violations
+    gt_viol_lazy_array = PFV_I - PTDF.lazy_interface_max_limits
+    lt_viol_lazy_array = PTDF.lazy_interface_min_limits - PFV_I
+
+    gt_viol_lazy = np.nonzero(gt_viol_lazy_array > 0)[0]
+    lt_viol_lazy = np.nonzero(lt_viol_lazy_array > 0)[0]
+
+    ## the violations are a subset of the lazy violations
+    gt_viol = frozenset(gt_viol_lazy[PFV_I[gt_viol_lazy] > PTDF.enforced_interface_max_limits[gt_viol_lazy]])
+    lt_viol = frozenset(lt_viol_lazy[PFV_I[lt_viol_lazy] < PTDF.enforced_interface_min_limits[lt_viol_lazy]])
+
+    gt_idx_monitored = mb._gt_interface_idx_monitored
+    lt_idx_monitored = mb._lt_interface_idx_monitored
+
+    ## monitored interfaces with slack variables are
+    ## allowed to exceed their limits
+    if hasattr(mb, 'pfi_slack_pos'):
+        gt_viol = frozenset(i for i in gt_viol if not (i in gt_idx_monitored and PTDF.interface_keys[i] in mb.pfi_slack_pos))
+    if hasattr(mb, 'pfi_slack_neg'):
+        lt_viol = frozenset(i for i in lt_viol if not (i in lt_idx_monitored and PTDF.interface_keys[i] in mb.pfi_slack_neg))
+
+    gt_viol_in_mb = gt_viol.intersection(gt_idx_monitored)
+    lt_viol_in_mb = lt_viol.intersection(lt_idx_monitored)
+
+    baseMVA = md.data['system']['baseMVA']
+    for i in lt_viol_in_mb:
+        logger.warning(prepend_str+_generate_interface_viol_warning('LB', mb, PTDF.interface_keys[i], PFV_I[i], PTDF.interface_min_limits[i], baseMVA, time))
+    for i in gt_viol_in_mb:
+        logger.warning(prepend_str+_generate_interface_viol_warning('UB', mb, PTDF.interface_keys[i], PFV_I[i], PTDF.interface_max_limits[i], baseMVA, time))
+
+    ## don't add interfaces that are already monitored
+    gt_viol_lazy = set(gt_viol_lazy).difference(gt_idx_monitored)
+    lt_viol_lazy = set(lt_viol_lazy).difference(lt_idx_monitored)
+
+    ## limit the number of interfaces we add in one iteration
+    ## by taking those with the largest violations
+    if len(gt_viol_lazy)+len(lt_viol_lazy) > max_viol_add:
+        all_viol_lazy = [ (gt_viol_lazy_array[i], True, i) for i in gt_viol_lazy ] + \
+                        [ (lt_viol_lazy_array[i], False, i) for i in lt_viol_lazy ]
+        all_viol_lazy.sort(reverse=True)
+        gt_viol_lazy = set(i for _, gt, i in all_viol_lazy[:max_viol_add] if gt)
+        lt_viol_lazy = set(i for _, gt, i in all_viol_lazy[:max_viol_add] if not gt)
+
+    viol_num = len(gt_viol)+len(lt_viol)
+    monitored_viol_num = len(lt_viol_in_mb)+len(gt_viol_in_mb)
+
+    return viol_num, monitored_viol_num, gt_viol_lazy, lt_viol_lazy
+
+
+def _generate_contingency_viol_warning(sense, cn, bn, flow, limit, baseMVA, time):
+    ret_str = "WARNING: line {0} ({1}) after contingency {2} is in the  monitored set".format(bn, sense, cn)
+    if time is not None:
+        ret_str += " at time {}".format(time)
+    ret_str += ", but flow exceeds limit!!\n\t flow={0}, limit={1}".format(flow*baseMVA, limit*baseMVA)
+    return ret_str
+
+## contingency violation checker
+def _check_contingency_violations(mb, md, PTDF, PFV, PFV_K, max_viol_add, time=None, prepend_str=""):
+    '''
+    the post-contingency counterpart of check_violations. The flows after
+    every contingency are screened at once using the LODFs. Returns the
+    number of violations, the number of violations which are already
+    monitored, and the (masked branch, contingency) index pairs to add at
+    their upper and lower limits
+    '''
+    if not _contingencies(PTDF):
+        return 0, 0, set(), set()
+
+    ## the (branch x contingency) matrix of post-contingency flows
+    PFV_C = PFV[:,np.newaxis] + PTDF.LODF*PFV_K
+
+    ## calculate the lazy violations
+    lazy_limits = PTDF.lazy_contingency_branch_limits[:,np.newaxis]
+    gt_viol_lazy_array = PFV_C - lazy_limits
+    lt_viol_lazy_array = -PFV_C - lazy_limits
+
+    gt_branch_idx, gt_cont_idx = np.nonzero(gt_viol_lazy_array > 0)
+    lt_branch_idx, lt_cont_idx = np.nonzero(lt_viol_lazy_array > 0)
+
+    ## the violations are a subset of the lazy violations
+    enforced_limits = PTDF.enforced_contingency_branch_limits
+    gt_enforced = PFV_C[gt_branch_idx, gt_cont_idx] > enforced_limits[gt_branch_idx]
+    lt_enforced = -PFV_C[lt_branch_idx, lt_cont_idx] > enforced_limits[lt_branch_idx]
+
+    gt_viol = frozenset(zip(gt_branch_idx[gt_enforced].tolist(), gt_cont_idx[gt_enforced].tolist()))
+    lt_viol = frozenset(zip(lt_branch_idx[lt_enforced].tolist(), lt_cont_idx[lt_enforced].tolist()))
+
+    gt_idx_monitored = mb._gt_contingency_idx_monitored
+    lt_idx_monitored = mb._lt_contingency_idx_monitored
 
-    PFV = calculate_PFV(mb, PTDF)
+    gt_viol_in_mb = gt_viol.intersection(gt_idx_monitored)
+    lt_viol_in_mb = lt_viol.intersection(lt_idx_monitored)
+
+    baseMVA = md.data['system']['baseMVA']
+    for i, k in lt_viol_in_mb:
+        thermal_limit = PTDF.contingency_branch_limits_array_masked[i]
+        logger.warning(prepend_str+_generate_contingency_viol_warning('LB', PTDF.contingency_keys[k], PTDF.branches_keys_masked[i],
+                                                                  PFV_C[i,k], -thermal_limit, baseMVA, time))
+    for i, k in gt_viol_in_mb:
+        thermal_limit = PTDF.contingency_branch_limits_array_masked[i]
+        logger.warning(prepend_str+_generate_contingency_viol_warning('UB', PTDF.contingency_keys[k], PTDF.branches_keys_masked[i],
+                                                                  PFV_C[i,k], thermal_limit, baseMVA, time))
+
+    ## don't add pairs that are already monitored
+    gt_viol_lazy = set(zip(gt_branch_idx.tolist(), gt_cont_idx.tolist())).difference(gt_idx_monitored)
+    lt_viol_lazy = set(zip(lt_branch_idx.tolist(), lt_cont_idx.tolist())).difference(lt_idx_monitored)
+
+    ## limit the number of pairs we add in one iteration
+    ## by taking those with the largest violations
+    if len(gt_viol_lazy)+len(lt_viol_lazy) > max_viol_add:
+        all_viol_lazy = [ (gt_viol_lazy_array[ik], True, ik) for ik in gt_viol_lazy ] + \
+                        [ (lt_viol_lazy_array[ik], False, ik) for ik in lt_viol_lazy ]
+        all_viol_lazy.sort(reverse=True)
+        gt_viol_lazy = set(ik for _, gt, ik in all_viol_lazy[:max_viol_add] if gt)
+        lt_viol_lazy = set(ik for _, gt, ik in all_viol_lazy[:max_viol_add] if not gt)
+
+    viol_num = len(gt_viol)+len(lt_viol)
+    monitored_viol_num = len(lt_viol_in_mb)+len(gt_viol_in_mb)
+
+    return viol_num, monitored_viol_num, gt_viol_lazy, lt_viol_lazy
+
+
+## violation checker
+def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str="", PFV=None, PFV_I=None, PFV_K=None):
+    '''
+    checks the branch, interface, and post-contingency flows in the block
+    mb for violations. Returns the branch flows, the interface flows, the
+    number of violations, the number of those which are already monitored,
+    and the (masked) indices of the branches, the indices of the interfaces,
+    and the (masked branch, contingency) index pairs to add at their upper
+    and lower limits
+    '''
+
+    if PFV is None or PFV_I is None or PFV_K is None:
+        PFV, PFV_I, PFV_K = calculate_PFV(mb, PTDF)
 
     ## calculate the lazy violations
     gt_viol_lazy_array = PFV - PTDF.lazy_branch_limits
@@ -224,7 +533,7 @@ def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str=""):
         ## resetting the values for these lines as computed above
         for _ in range(max_viol_add-1):
 
-            ptdf_lin += PTDF.PTDFM_masked[ptdf_idx]
+            ptdf_lin += PTDF.get_masked_ptdf_rows(ptdf_idx)
 
             all_other_violations = list(tracking_gt_viol_lazy + tracking_lt_viol_lazy)
 
@@ -236,7 +545,7 @@ def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str=""):
             ## put this in baseMVA
             other_viols *= baseMVA
 
-            other_viol_rows = PTDF.PTDFM_masked[all_other_violations]
+            other_viol_rows = PTDF.get_masked_ptdf_rows(all_other_violations)
 
             orthogonality = np.absolute(np.dot(other_viol_rows, ptdf_lin))
 
@@ -267,18 +576,34 @@ def check_violations(mb, md, PTDF, max_viol_add, time=None, prepend_str=""):
     viol_num = len(gt_viol)+len(lt_viol)
     monitored_viol_num = len(lt_viol_in_mb)+len(gt_viol_in_mb)
 
-    return PFV, viol_num, monitored_viol_num, gt_viol_lazy, lt_viol_lazy
+    viol_num_I, monitored_viol_num_I, gt_viol_lazy_I, lt_viol_lazy_I = \
+            _check_interface_violations(mb, md, PTDF, PFV_I, max_viol_add, time=time, prepend_str=prepend_str)
+
+    viol_num_C, monitored_viol_num_C, gt_viol_lazy_C, lt_viol_lazy_C = \
+            _check_contingency_violations(mb, md, PTDF, PFV, PFV_K, max_viol_add, time=time, prepend_str=prepend_str)
 
+    viol_num += viol_num_I + viol_num_C
+    monitored_viol_num += monitored_viol_num_I + monitored_viol_num_C
 
-def _generate_branch_remove_message(sense, bn, slack, baseMVA, time):
-    ret_str = "removing line {0} ({1}) from monitored set".format(bn, sense)
+    return PFV, PFV_I, viol_num, monitored_viol_num, gt_viol_lazy, lt_viol_lazy, gt_viol_lazy_I, lt_viol_lazy_I, gt_viol_lazy_C, lt_viol_lazy_C
+
+
+def _generate_branch_remove_message(sense, bn, slack, baseMVA, time, element='line'):
+    ret_str = "removing {0} {1} ({2}) from monitored set".format(element, bn, sense)
     if time is not None:
         ret_str += " at time {}".format(time)
     ret_str += ", flow slack={0}".format(slack*baseMVA)
     return ret_str
 
 ## flow constraint remover
-def remove_inactive(mb, solver, time=None, prepend_str=""):
+def remove_inactive(mb, solver, time=None, prepend_str="", constrs_to_remove=None):
+    '''
+    removes the flow constraints in the block mb which are not
+    active. If constrs_to_remove is a list, the inactive constraints
+    are appended to it instead of being removed from a persistent
+    solver, so they can be removed together with
+    remove_constraints_from_solver
+    '''
     model = mb.model()
     PTDF = mb._PTDF
     ptdf_options = model._ptdf_options
@@ -286,8 +611,6 @@ def remove_inactive(mb, solver, time=None, prepend_str=""):
 
     slack_tol = ptdf_options['active_flow_tol']
 
-    persistent_solver = isinstance(solver, PersistentSolver)
-
     ## get the lines we're monitoring
     gt_idx_monitored = mb._gt_idx_monitored
     lt_idx_monitored = mb._lt_idx_monitored
@@ -313,15 +636,50 @@ def remove_inactive(mb, solver, time=None, prepend_str=""):
             ## remove the index from the lines we're monitoring
             gt_idx_monitored.remove(branchname_index_map[bn])
 
+    if _lazy_interfaces(mb, PTDF):
+        interface_slack_tol = ptdf_options['interface_active_flow_tol']
+        interfacename_index_map = { i_n : i for i, i_n in enumerate(PTDF.interface_keys) }
+
+        for i_n, constr in mb.ineq_pf_interface_lb.items():
+            slack = constr.slack()
+            if interface_slack_tol <= abs(slack):
+                logger.debug(prepend_str+_generate_branch_remove_message('LB', i_n, abs(slack), baseMVA, time, 'interface'))
+                constr_to_remove.append(constr)
+                mb._lt_interface_idx_monitored.remove(interfacename_index_map[i_n])
+
+        for i_n, constr in mb.ineq_pf_interface_ub.items():
+            slack = constr.slack()
+            if interface_slack_tol <= abs(slack):
+                logger.debug(prepend_str+_generate_branch_remove_message('UB', i_n, abs(slack), baseMVA, time, 'interface'))
+                constr_to_remove.append(constr)
+                mb._gt_interface_idx_monitored.remove(interfacename_index_map[i_n])
+
+    if _contingencies(PTDF):
+        contingencyname_index_map = PTDF._contingencyname_to_index_map
+
+        for (cn, bn), constr in mb.ineq_pf_contingency_branch_thermal_lb.items():
+            slack = constr.slack()
+            if slack_tol <= abs(slack):
+                logger.debug(prepend_str+_generate_branch_remove_message('LB', _contingency_name(cn, bn), abs(slack), baseMVA, time))
+                constr_to_remove.append(constr)
+                mb._lt_contingency_idx_monitored.remove((branchname_index_map[bn], contingencyname_index_map[cn]))
+
+        for (cn, bn), constr in mb.ineq_pf_contingency_branch_thermal_ub.items():
+            slack = constr.slack()
+            if slack_tol <= abs(slack):
+                logger.debug(prepend_str+_generate_branch_remove_message('UB', _contingency_name(cn, bn), abs(slack), baseMVA, time))
+                constr_to_remove.append(constr)
+                mb._gt_contingency_idx_monitored.remove((branchname_index_map[bn], contingencyname_index_map[cn]))
+
     msg = prepend_str+"removing {} inactive transmission constraint(s)".format(len(constr_to_remove))
     if time is not None:
         msg += " at time {}".format(time)
     logger.debug(msg)
 
-    for constr in constr_to_remove:
-        if persistent_solver:
-            solver.remove_constraint(constr)
-        del constr
+    if constrs_to_remove is None:
+        remove_constraints_from_solver(solver, constr_to_remove)
+    else:
+        constrs_to_remove.extend(constr_to_remove)
     return len(constr_to_remove)
 
 
@@ -333,8 +691,8 @@ def _generate_flow_viol_warning(sense, mb, bn, flow, limit, baseMVA, time):
     ret_str += ", model_flow={}".format(pe.value(mb.pf[bn])*baseMVA)
     return ret_str
 
-def _generate_flow_monitor_message(sense, bn, flow=None, limit=None, baseMVA=None, time=None):
-    ret_str = "adding line {0} ({1}) to monitored set".format(bn, sense)
+def _generate_flow_monitor_message(sense, bn, flow=None, limit=None, baseMVA=None, time=None, element='line'):
+    ret_str = "adding {0} {1} ({2}) to monitored set".format(element, bn, sense)
     if time is not None:
         ret_str += " at time {}".format(time)
     if flow is not None:
@@ -343,30 +701,44 @@ def _generate_flow_monitor_message(sense, bn, flow=None, limit=None, baseMVA=Non
 
 ## violation adder
 def add_violations(gt_viol_lazy, lt_viol_lazy, PFV, mb, md, solver, ptdf_options,
-                    PTDF, time=None, prepend_str=""):
-
-    model = mb.model()
+                    PTDF, time=None, prepend_str="", constrs_to_add=None,
+                    gt_viol_lazy_I=(), lt_viol_lazy_I=(), PFV_I=None,
+                    gt_viol_lazy_C=(), lt_viol_lazy_C=()):
+    '''
+    adds the flow constraints for the violations gt_viol_lazy and
+    lt_viol_lazy (and the interface violations gt_viol_lazy_I and
+    lt_viol_lazy_I, and the post-contingency violations gt_viol_lazy_C
+    and lt_viol_lazy_C) to the block mb. If constrs_to_add is a list, the
+    new constraints are appended to it instead of being added to
+    a persistent solver, so they can be added together with
+    add_constraints_to_solver
+    '''
 
     baseMVA = md.data['system']['baseMVA']
 
-    persistent_solver = isinstance(solver, PersistentSolver)
-
     ## static information between runs
     rel_ptdf_tol = ptdf_options['rel_ptdf_tol']
     abs_ptdf_tol = ptdf_options['abs_ptdf_tol']
 
-    ## helper for generating pf
-    def _iter_over_viol_set(viol_set):
-        for i in viol_set:
-            bn = PTDF.branches_keys_masked[i]
-            if mb.pf[bn].expr is None:
-                expr = libbranch.get_power_flow_expr_ptdf_approx(mb, bn, PTDF, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
-                mb.pf[bn] = expr
-            yield i, bn
+    ## generate the power flow expressions we need; if
+    ## p_nw is a Var, these are built all at once from
+    ## the PTDF rows
+    new_pf_bns = [ bn for bn in dict.fromkeys(PTDF.branches_keys_masked[i] for i in list(lt_viol_lazy)+list(gt_viol_lazy)) \
+                        if mb.pf[bn].expr is None ]
+    if isinstance(mb.p_nw, pe.Var):
+        exprs = libbranch.get_power_flow_exprs_ptdf_approx(mb, new_pf_bns, PTDF, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+        for bn, expr in zip(new_pf_bns, exprs):
+            mb.pf[bn] = expr
+    else:
+        for bn in new_pf_bns:
+            mb.pf[bn] = libbranch.get_power_flow_expr_ptdf_approx(mb, bn, PTDF, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+
+    new_constrs = list()
 
     constr = mb.ineq_pf_branch_thermal_lb
     lt_viol_in_mb = mb._lt_idx_monitored
-    for i, bn in _iter_over_viol_set(lt_viol_lazy):
+    for i in lt_viol_lazy:
+        bn = PTDF.branches_keys_masked[i]
         thermal_limit = PTDF.branch_limits_array_masked[i]
         if PFV is None:
             logger.debug(prepend_str+_generate_flow_monitor_message('LB', bn, time=time))
@@ -374,12 +746,12 @@ def add_violations(gt_viol_lazy, lt_viol_lazy, PFV, mb, md, solver, ptdf_options
             logger.debug(prepend_str+_generate_flow_monitor_message('LB', bn, PFV[i], -thermal_limit, baseMVA, time))
         constr[bn] = (-thermal_limit, mb.pf[bn], None)
         lt_viol_in_mb.append(i)
-        if persistent_solver:
-            solver.add_constraint(constr[bn])
+        new_constrs.append(constr[bn])
 
     constr = mb.ineq_pf_branch_thermal_ub
     gt_viol_in_mb = mb._gt_idx_monitored
-    for i, bn in _iter_over_viol_set(gt_viol_lazy):
+    for i in gt_viol_lazy:
+        bn = PTDF.branches_keys_masked[i]
         thermal_limit = PTDF.branch_limits_array_masked[i]
         if PFV is None:
             logger.debug(prepend_str+_generate_flow_monitor_message('UB', bn, time=time))
@@ -387,8 +759,134 @@ def add_violations(gt_viol_lazy, lt_viol_lazy, PFV, mb, md, solver, ptdf_options
             logger.debug(prepend_str+_generate_flow_monitor_message('UB', bn, PFV[i], thermal_limit, baseMVA, time))
         constr[bn] = (None, mb.pf[bn], thermal_limit)
         gt_viol_in_mb.append(i)
-        if persistent_solver:
-            solver.add_constraint(constr[bn])
+        new_constrs.append(constr[bn])
+
+    if gt_viol_lazy_I or lt_viol_lazy_I:
+        _add_interface_violations(gt_viol_lazy_I, lt_viol_lazy_I, PFV_I, mb, PTDF, rel_ptdf_tol, abs_ptdf_tol,
+                                  baseMVA, new_constrs, time, prepend_str)
+
+    if gt_viol_lazy_C or lt_viol_lazy_C:
+        _add_contingency_violations(gt_viol_lazy_C, lt_viol_lazy_C, mb, PTDF, rel_ptdf_tol, abs_ptdf_tol,
+                                    new_constrs, time, prepend_str)
+
+    if constrs_to_add is None:
+        add_constraints_to_solver(solver, new_constrs)
+    else:
+        constrs_to_add.extend(new_constrs)
+
+
+def _add_interface_violations(gt_viol_lazy_I, lt_viol_lazy_I, PFV_I, mb, PTDF, rel_ptdf_tol, abs_ptdf_tol,
+                              baseMVA, new_constrs, time, prepend_str):
+    for i in set(gt_viol_lazy_I).union(lt_viol_lazy_I):
+        i_n = PTDF.interface_keys[i]
+        if mb.pfi[i_n].expr is None:
+            mb.pfi[i_n] = libbranch.get_power_flow_interface_expr_ptdf(mb, i_n, PTDF, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+
+    slacks_pos = hasattr(mb, 'pfi_slack_pos')
+    slacks_neg = hasattr(mb, 'pfi_slack_neg')
+
+    constr = mb.ineq_pf_interface_lb
+    lt_viol_in_mb = mb._lt_interface_idx_monitored
+    for i in lt_viol_lazy_I:
+        i_n = PTDF.interface_keys[i]
+        limit = PTDF.interface_min_limits[i]
+        if PFV_I is None:
+            logger.debug(prepend_str+_generate_flow_monitor_message('LB', i_n, time=time, element='interface'))
+        else:
+            logger.debug(prepend_str+_generate_flow_monitor_message('LB', i_n, PFV_I[i], limit, baseMVA, time, element='interface'))
+        expr = mb.pfi[i_n]
+        if slacks_neg and i_n in mb.pfi_slack_neg:
+            expr = expr + mb.pfi_slack_neg[i_n]
+        constr[i_n] = (limit, expr, None)
+        lt_viol_in_mb.append(i)
+        new_constrs.append(constr[i_n])
+
+    constr = mb.ineq_pf_interface_ub
+    gt_viol_in_mb = mb._gt_interface_idx_monitored
+    for i in gt_viol_lazy_I:
+        i_n = PTDF.interface_keys[i]
+        limit = PTDF.interface_max_limits[i]
+        if PFV_I is None:
+            logger.debug(prepend_str+_generate_flow_monitor_message('UB', i_n, time=time, element='interface'))
+        else:
+            logger.debug(prepend_str+_generate_flow_monitor_message('UB', i_n, PFV_I[i], limit, baseMVA, time, element='interface'))
+        expr = mb.pfi[i_n]
+        if slacks_pos and i_n in mb.pfi_slack_pos:
+            expr = expr - mb.pfi_slack_pos[i_n]
+        constr[i_n] = (None, expr, limit)
+        gt_viol_in_mb.append(i)
+        new_constrs.append(constr[i_n])
+
+
+def _contingency_name(cn, bn):
+    return "{0} (contingency {1})".format(bn, cn)
+
+def _add_contingency_violations(gt_viol_lazy_C, lt_viol_lazy_C, mb, PTDF, rel_ptdf_tol, abs_ptdf_tol,
+                                new_constrs, time, prepend_str):
+    ## the post-contingency flow is the pre-contingency flow on the
+    ## branch plus the LODF times the flow on the contingency branch
+    for i, k in set(gt_viol_lazy_C).union(lt_viol_lazy_C):
+        for bn in (PTDF.branches_keys_masked[i], PTDF.contingency_keys[k]):
+            if mb.pf[bn].expr is None:
+                mb.pf[bn] = libbranch.get_power_flow_expr_ptdf_approx(mb, bn, PTDF, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+
+    constr = mb.ineq_pf_contingency_branch_thermal_lb
+    lt_viol_in_mb = mb._lt_contingency_idx_monitored
+    for i, k in lt_viol_lazy_C:
+        bn = PTDF.branches_keys_masked[i]
+        cn = PTDF.contingency_keys[k]
+        thermal_limit = PTDF.contingency_branch_limits_array_masked[i]
+        logger.debug(prepend_str+_generate_flow_monitor_message('LB', _contingency_name(cn, bn), time=time))
+        constr[cn, bn] = (-thermal_limit, mb.pf[bn] + float(PTDF.LODF[i,k])*mb.pf[cn], None)
+        lt_viol_in_mb.append((i,k))
+        new_constrs.append(constr[cn, bn])
+
+    constr = mb.ineq_pf_contingency_branch_thermal_ub
+    gt_viol_in_mb = mb._gt_contingency_idx_monitored
+    for i, k in gt_viol_lazy_C:
+        bn = PTDF.branches_keys_masked[i]
+        cn = PTDF.contingency_keys[k]
+        thermal_limit = PTDF.contingency_branch_limits_array_masked[i]
+        logger.debug(prepend_str+_generate_flow_monitor_message('UB', _contingency_name(cn, bn), time=time))
+        constr[cn, bn] = (None, mb.pf[bn] + float(PTDF.LODF[i,k])*mb.pf[cn], thermal_limit)
+        gt_viol_in_mb.append((i,k))
+        new_constrs.append(constr[cn, bn])
+
+
+def add_contingency_duals(PFD, mb, PTDF, duals):
+    '''
+    adds the duals of the post-contingency flow limits in the block mb
+    to the branch flow duals PFD (in the order of PTDF.branches_keys),
+    so they are included in the congestion component of the LMPs
+    '''
+    if not hasattr(mb, 'ineq_pf_contingency_branch_thermal_lb'):
+        return
+    branchname_index_map = PTDF._branchname_to_index_map
+    for constr_dict in (mb.ineq_pf_contingency_branch_thermal_lb, mb.ineq_pf_contingency_branch_thermal_ub):
+        for (cn, bn), constr in constr_dict.items():
+            dual = pe.value(duals[constr])
+            PFD[branchname_index_map[bn]] += dual
+            PFD[branchname_index_map[cn]] += PTDF.get_contingency_lodf(cn, bn)*dual
+
+
+def add_constraints_to_solver(solver, constrs):
+    '''
+    adds the constraints constrs to solver, if it is persistent
+    '''
+    if not isinstance(solver, PersistentSolver):
+        return
+    for constr in constrs:
+        solver.add_constraint(constr)
+
+
+def remove_constraints_from_solver(solver, constrs):
+    '''
+    removes the constraints constrs from solver, if it is persistent
+    '''
+    if not isinstance(solver, PersistentSolver):
+        return
+    for constr in constrs:
+        solver.remove_constraint(constr)
 
 
 def copy_active_to_next_time(m, b_next, PTDF_next, slacks_ub, slacks_lb):
@@ -413,6 +911,229 @@ def copy_active_to_next_time(m, b_next, PTDF_next, slacks_ub, slacks_lb):
     return None, gt_viol_lazy, lt_viol_lazy
 
 
+class BindingConstraintStore(object):
+    '''
+    Records which flow constraints, as (branch, sense, hour of day),
+    were active in the solutions of earlier lazy PTDF solves, keyed
+    by the network topology (a hash of the branches in service, with
+    their buses and parameters, see _get_topology_keys). A later solve
+    adds these constraints to its monitored set before the first solve,
+    so that it starts from the constraints which were binding before.
+    The hour of day is found from the time indices, see _get_hour_of_day.
+
+    Each solve which records its binding constraints is a run, and the
+    constraints which have not been binding in the last max_age runs
+    are removed, so the store does not grow without bound.
+
+    If file_name is given, the store is read from that (json) file,
+    if it exists, and written to it by write. The store is shared,
+    not copied, when the ptdf_options holding it are copied.
+    '''
+    def __init__(self, file_name=None, max_age=30):
+        self.file_name = file_name
+        self.max_age = max_age
+        self._run = 0
+        ## the last run in which each constraint was binding
+        self._constraints = dict()
+        if file_name is not None and os.path.isfile(file_name):
+            with open(file_name, 'r') as f:
+                data = json.load(f)
+            self._run = data['run']
+            for key, constrs in data['constraints'].items():
+                self._constraints[key] = { (bn, sense, hour) : run for bn, sense, hour, run in constrs }
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def get(self, topology_key, hour):
+        '''
+        the (branch, sense) pairs recorded for this topology and hour
+        '''
+        constrs = self._constraints.get(topology_key, ())
+        return [ (bn, sense) for bn, sense, h in constrs if h == hour ]
+
+    def begin_run(self):
+        '''
+        starts recording the binding constraints of a new solve
+        '''
+        self._run += 1
+
+    def add(self, topology_key, bn, sense, hour):
+        self._constraints.setdefault(topology_key, dict())[(bn, sense, hour)] = self._run
+
+    def prune(self):
+        '''
+        removes the constraints which have not been
+        binding in any of the last max_age runs
+        '''
+        oldest_run = self._run - self.max_age
+        for key in list(self._constraints):
+            constrs = { c : run for c, run in self._constraints[key].items() if run > oldest_run }
+            if constrs:
+                self._constraints[key] = constrs
+            else:
+                del self._constraints[key]
+
+    def write(self):
+        if self.file_name is None:
+            return
+        constraints = { key : sorted([bn, sense, hour, run] for (bn, sense, hour), run in constrs.items())
+                        for key, constrs in self._constraints.items() }
+        with open(self.file_name, 'w') as f:
+            json.dump({ 'run' : self._run, 'constraints' : constraints }, f)
+
+
+class PTDFCache(dict):
+    '''
+    The PTDF matrices of a network, keyed by the branches out of
+    service, to share between the unit commitment models built
+    with ptdf_options['ptdf_cache'] set to it, e.g., the windows of a
+    rolling-horizon simulation. These models should have the same
+    network and (other) ptdf_options. As the BindingConstraintStore,
+    the cache is shared, not copied, with the ptdf_options holding it.
+    '''
+    def __deepcopy__(self, memo):
+        return self
+
+
+def get_binding_constraint_store(ptdf_options):
+    '''
+    the BindingConstraintStore for ptdf_options['binding_constraint_store'],
+    which can be None, a file name, or a BindingConstraintStore
+    '''
+    store = ptdf_options['binding_constraint_store']
+    if store is None or isinstance(store, BindingConstraintStore):
+        return store
+    return BindingConstraintStore(store)
+
+def _get_branches_out_service(m, t):
+    return tuple(l for l in m.TransmissionLines if pe.value(m.LineOutOfService[l,t]))
+
+def _get_topology_keys(m):
+    '''
+    a hash of the branches in service (with their buses and parameters)
+    in each time period of the unit commitment model m, as a dict from
+    time period to key, see data_utils._get_ptdf_cache_key
+    '''
+    buses_keys = tuple(m._buses.keys())
+    reference_bus = pe.value(m.ReferenceBus)
+
+    keys_by_outage = dict()
+    topology_keys = dict()
+    for t in m.TransmissionBlock:
+        branches_out_service = _get_branches_out_service(m, t)
+        if branches_out_service not in keys_by_outage:
+            out_service = set(branches_out_service)
+            branches_in_service = [ l for l in m.TransmissionLines if l not in out_service ]
+            keys_by_outage[branches_out_service] = data_utils._get_ptdf_cache_key(m._branches, m._buses, branches_in_service, buses_keys,
+                                                                                  reference_bus, BasePointType.FLATSTART)
+        topology_keys[t] = keys_by_outage[branches_out_service]
+    return topology_keys
+
+def _get_hour_of_day(m, t):
+    '''
+    the hour of the day of time period t of the unit commitment model m,
+    from its time index, which is either a timestamp (in ISO format) or
+    the number of the time period in the day, starting from 1, as from
+    the Prescient parser. Any other time indices are counted from the
+    first time period of m.
+    '''
+    time_index = m.model_data.data['system']['time_indices'][t - pe.value(m.InitialTime)]
+    try:
+        return datetime.fromisoformat(str(time_index)).hour
+    except ValueError:
+        pass
+    try:
+        period = int(time_index) - 1
+    except (TypeError, ValueError):
+        period = t - pe.value(m.InitialTime)
+    ## the small constant guards against round-off
+    ## for sub-hourly time periods
+    return int(period*pe.value(m.TimePeriodLengthHours) + 1e-6) % 24
+
+def add_monitored_flow_constraints(m, flow_constraints, solver=None, prepend_str=""):
+    '''
+    adds the flow constraints in flow_constraints, a dict from time
+    period to (branch, sense) pairs with sense 'LB' or 'UB', to the
+    monitored set of the TransmissionBlocks of the unit commitment
+    model m, if they are not monitored already
+    '''
+    md = m.model_data
+    ptdf_options = m._ptdf_options
+
+    total_flow_constr_added = 0
+    constrs_to_add = list()
+    for t, constrs in flow_constraints.items():
+        b = m.TransmissionBlock[t]
+        PTDF = b._PTDF
+        branchname_index_map = PTDF.branchname_to_index_masked_map
+
+        ## in case the model was solved before
+        lt_monitored = set(b._lt_idx_monitored)
+        gt_monitored = set(b._gt_idx_monitored)
+
+        lt_viol_lazy = set()
+        gt_viol_lazy = set()
+        for bn, sense in constrs:
+            ## in case the network has changed
+            if bn not in branchname_index_map:
+                continue
+            i = branchname_index_map[bn]
+            if sense == 'LB':
+                if i not in lt_monitored:
+                    lt_viol_lazy.add(i)
+            elif i not in gt_monitored:
+                gt_viol_lazy.add(i)
+
+        add_violations(gt_viol_lazy, lt_viol_lazy, None, b, md, solver, ptdf_options, PTDF, time=t, prepend_str=prepend_str, constrs_to_add=constrs_to_add)
+        total_flow_constr_added += len(gt_viol_lazy) + len(lt_viol_lazy)
+    add_constraints_to_solver(solver, constrs_to_add)
+
+    logger.info(prepend_str+"added {0} flow constraint(s)".format(total_flow_constr_added))
+
+def get_monitored_flow_constraints(m):
+    '''
+    the monitored flow constraints in the TransmissionBlocks of the
+    unit commitment model m, as a dict from time period to
+    (branch, sense) pairs, see add_monitored_flow_constraints
+    '''
+    return { t : [ (bn, 'LB') for bn in b.ineq_pf_branch_thermal_lb ] + \
+                 [ (bn, 'UB') for bn in b.ineq_pf_branch_thermal_ub ]
+             for t, b in m.TransmissionBlock.items() }
+
+def add_stored_binding_constraints(m, store, solver=None, prepend_str=""):
+    '''
+    adds the flow constraints recorded in store for the topology and
+    hour of day of each time period to the monitored set of the
+    TransmissionBlocks of the unit commitment model m, if they
+    are not monitored already
+    '''
+    topology_keys = _get_topology_keys(m)
+    flow_constraints = { t : store.get(topology_keys[t], _get_hour_of_day(m, t))
+                         for t in m.TransmissionBlock }
+    add_monitored_flow_constraints(m, flow_constraints, solver=solver, prepend_str=prepend_str)
+
+def record_binding_constraints(m, store):
+    '''
+    records the active flow constraints in the TransmissionBlocks
+    of the unit commitment model m in store, as a new run
+    '''
+    active_slack_tol = m._ptdf_options['active_flow_tol']
+
+    store.begin_run()
+    topology_keys = _get_topology_keys(m)
+    for t, b in m.TransmissionBlock.items():
+        topology_key = topology_keys[t]
+        hour = _get_hour_of_day(m, t)
+        for bn, constr in b.ineq_pf_branch_thermal_lb.items():
+            if abs(constr.slack()) <= active_slack_tol:
+                store.add(topology_key, bn, 'LB', hour)
+        for bn, constr in b.ineq_pf_branch_thermal_ub.items():
+            if abs(constr.slack()) <= active_slack_tol:
+                store.add(topology_key, bn, 'UB', hour)
+    store.prune()
+
+
 def _binary_var_generator(instance):
     regulation =  hasattr(instance, 'regulation_service')
     if instance.status_vars in ['CA_1bin_vars', 'garver_3bin_vars', 'garver_2bin_vars', 'garver_3bin_relaxed_stop_vars']:
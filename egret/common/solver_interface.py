@@ -10,7 +10,9 @@
 """
 This file includes the solver interfaces for EGRET.
 """
+import time
 import pyomo.opt as po
+from egret.common.log import logger
 from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
 
 
@@ -67,6 +69,61 @@ def _set_options(solver, mipgap=None, timelimit=None, other_options=None):
         for key, opt in other_options.items():
             solver.options[key] = opt
 
+def _get_solver_time(results):
+    '''
+    the solve time reported by the solver in results, or
+    None if the solver does not report it
+    '''
+    for attr in ('wallclock_time', 'time', 'user_time'):
+        solver_time = getattr(results.solver, attr, None)
+        if isinstance(solver_time, (int, float)):
+            return solver_time
+    return None
+
+def _solve_non_persistent(model, solver, solver_tee=True, symbolic_solver_labels=False, warmstart=False, prepend_str=""):
+    '''
+    Solves model with a non-persistent solver, without loading the solution,
+    and logs the time spent in the solver and the time spent outside it
+    (mostly writing the model and reading the results)
+
+    Parameters
+    ----------
+    model : pyomo.environ.ConcreteModel
+        A pyomo ConcreteModel object.
+    solver : pyomo.opt.base.solvers.OptSolver
+        An instanciated (non-persistent) pyomo solver
+    solver_tee : bool (optional)
+        Display solver log. Default is True.
+    symbolic_solver_labels : bool (optional)
+        Use symbolic solver labels. Useful for debugging; default is False.
+    warmstart : bool (optional)
+        If True, and the solver supports it, the current values of the
+        variables are written out and given to the solver as a
+        starting point. Default is False.
+    prepend_str : str (optional)
+        String to prepend to the timing message
+
+    Returns
+    -------
+    pyomo.opt.results.SolverResults : The results object from the pyomo solver
+    '''
+    solve_kwargs = dict()
+    if warmstart and solver.warm_start_capable():
+        solve_kwargs['warmstart'] = True
+
+    start_time = time.time()
+    results = solver.solve(model, tee=solver_tee, symbolic_solver_labels=symbolic_solver_labels,
+                           load_solutions=False, **solve_kwargs)
+    total_time = time.time() - start_time
+
+    solver_time = _get_solver_time(results)
+    if solver_time is None:
+        logger.info(prepend_str+"solve took {0:.2f} seconds".format(total_time))
+    else:
+        logger.info(prepend_str+"solve took {0:.2f} seconds, {1:.2f} in the solver and {2:.2f} writing the model and reading the results".format(total_time, solver_time, max(total_time-solver_time, 0.)))
+
+    return results
+
 def _solve_model(model,
                  solver,
                  mipgap=0.001,
@@ -75,7 +132,8 @@ def _solve_model(model,
                  symbolic_solver_labels = False,
                  options = None,
                  return_solver = False,
-                 vars_to_load = None):
+                 vars_to_load = None,
+                 set_instance = True):
     '''
     Create and solve an Egret power system optimization model
 
@@ -101,6 +159,9 @@ def _solve_model(model,
     vars_to_load : list (optional)
         When supplied, and the solver is persistent, this will just load
         pyomo variables specificed
+    set_instance : bool (optional)
+        If False, and the solver is persistent, the model is assumed to
+        be loaded in (and up to date with) the solver already. Default is True.
 
     Returns
     -------
@@ -133,7 +194,8 @@ def _solve_model(model,
     _set_options(solver, mipgap, timelimit, options)
 
     if isinstance(solver, PersistentSolver):
-        solver.set_instance(model, symbolic_solver_labels=symbolic_solver_labels)
+        if set_instance:
+            solver.set_instance(model, symbolic_solver_labels=symbolic_solver_labels)
         results = solver.solve(model, tee=solver_tee, load_solutions=False, save_results=False)
     else:
         results = solver.solve(model, tee=solver_tee, \
@@ -0,0 +1,203 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+This module reads and writes model_data dictionaries in a binary columnar
+format. The format is a directory (by convention, with the extension
+".egret") containing
+
+* metadata.json : the structure of the model_data dictionary, along with
+  any attributes which are not numeric (e.g., names, cost curves)
+
+* one .npy file for each numeric attribute of each element type. Scalar
+  attributes are stored as 1-D arrays over the elements which have them,
+  and time series as 2-D (element x time) arrays. Numeric time series in
+  data['system'] are stored as 1-D arrays.
+
+The arrays are opened with np.load(mmap_mode='r'), so only the time
+window requested when reading is actually loaded from disk.
+"""
+import os
+import json
+import numpy as np
+
+from egret.data.model_data import _json_default
+
+_METADATA_FILE = 'metadata.json'
+_FORMAT_VERSION = 1
+
+def _is_time_series(att):
+    return isinstance(att, dict) and att.get('data_type') == 'time_series'
+
+def _numeric_array(values):
+    '''
+    returns a numpy array of values if they are all of the same
+    numeric type (bool, int, or float), otherwise returns None
+    '''
+    types = set(type(v) for v in values)
+    if len(types) != 1 or types.pop() not in (bool, int, float):
+        return None
+    return np.array(values)
+
+def _numeric_time_series_array(rows):
+    types = set(type(v) for row in rows for v in row)
+    if len(types) != 1 or types.pop() not in (bool, int, float):
+        return None
+    if len(set(len(row) for row in rows)) != 1:
+        return None
+    return np.array(rows)
+
+def write_model_data_dict(data, dirname):
+    '''
+    Writes the model_data dictionary data to the directory dirname
+
+    Parameters
+    ----------
+    data : dict
+        A model_data dictionary
+    dirname : str
+        The directory to write to, which is created if needed
+    '''
+    os.makedirs(dirname, exist_ok=True)
+
+    ## name the arrays by number, as the element types
+    ## and attributes may not be valid file names
+    array_count = [0]
+    def _save(array):
+        file_name = 'array_{}.npy'.format(array_count[0])
+        array_count[0] += 1
+        np.save(os.path.join(dirname, file_name), array)
+        return file_name
+
+    metadata = { 'format_version' : _FORMAT_VERSION, 'elements' : dict() }
+
+    system = dict()
+    system_arrays = dict()
+    for attr, att in data['system'].items():
+        array = _numeric_array(att['values']) if _is_time_series(att) else None
+        if array is None:
+            system[attr] = att
+        else:
+            system_arrays[attr] = _save(array)
+    metadata['system'] = system
+    metadata['system_arrays'] = system_arrays
+
+    for element_type, elements in data['elements'].items():
+        names = list(elements.keys())
+
+        ## gather the columns
+        indices = dict()
+        values = dict()
+        for i, element in enumerate(elements.values()):
+            for attr, att in element.items():
+                if attr not in indices:
+                    indices[attr] = list()
+                    values[attr] = list()
+                indices[attr].append(i)
+                values[attr].append(att)
+
+        ## attributes are either stored in numeric arrays
+        ## or as json, in which case they are just kept
+        ## on the elements
+        json_elements = [ dict() for _ in names ]
+        arrays = dict()
+        for attr, attr_values in values.items():
+            if all(_is_time_series(att) for att in attr_values):
+                array = _numeric_time_series_array([ att['values'] for att in attr_values ])
+                kind = 'time_series'
+            elif not any(isinstance(att, (dict, list, tuple)) for att in attr_values):
+                array = _numeric_array(attr_values)
+                kind = 'scalar'
+            else:
+                array = None
+
+            if array is None:
+                for i, att in zip(indices[attr], attr_values):
+                    json_elements[i][attr] = att
+                continue
+
+            arrays[attr] = { 'kind' : kind,
+                             'file' : _save(array),
+                             'index' : None if len(indices[attr]) == len(names) else indices[attr],
+                           }
+
+        metadata['elements'][element_type] = { 'names' : names,
+                                               'json' : json_elements,
+                                               'arrays' : arrays,
+                                             }
+
+    with open(os.path.join(dirname, _METADATA_FILE), 'w') as f:
+        ## time series from ModelData.slice_time are views
+        json.dump(metadata, f, default=_json_default)
+
+def _window(time_window):
+    if time_window is None:
+        return slice(None)
+    if isinstance(time_window, slice):
+        return time_window
+    return slice(*time_window)
+
+def create_model_data_dict(dirname, time_window=None):
+    '''
+    Reads a model_data dictionary from the directory dirname
+
+    Parameters
+    ----------
+    dirname : str
+        A directory written by write_model_data_dict
+    time_window : None, slice, or tuple (optional)
+        If not None, only the time periods in this slice (or
+        (start, stop) tuple) of the time indices are loaded
+
+    Returns
+    -------
+        dict : a model_data dictionary
+    '''
+    with open(os.path.join(dirname, _METADATA_FILE), 'r') as f:
+        metadata = json.load(f)
+
+    if metadata['format_version'] != _FORMAT_VERSION:
+        raise Exception("Unrecognized format version {} in {}".format(metadata['format_version'], dirname))
+
+    window = _window(time_window)
+
+    def _load(file_name):
+        return np.load(os.path.join(dirname, file_name), mmap_mode='r')
+
+    def _slice_json_time_series(att):
+        if _is_time_series(att):
+            return { 'data_type' : 'time_series', 'values' : att['values'][window] }
+        return att
+
+    system = { attr : _slice_json_time_series(att) for attr, att in metadata['system'].items() }
+    for attr, file_name in metadata['system_arrays'].items():
+        system[attr] = { 'data_type' : 'time_series', 'values' : _load(file_name)[window].tolist() }
+    if 'time_indices' in system:
+        system['time_indices'] = system['time_indices'][window]
+
+    elements_dict = dict()
+    for element_type, element_metadata in metadata['elements'].items():
+        names = element_metadata['names']
+        elements = [ { attr : _slice_json_time_series(att) for attr, att in element.items() } for element in element_metadata['json'] ]
+
+        for attr, array_metadata in element_metadata['arrays'].items():
+            array = _load(array_metadata['file'])
+            index = array_metadata['index']
+            if index is None:
+                index = range(len(names))
+            if array_metadata['kind'] == 'time_series':
+                for i, row in zip(index, array[:,window].tolist()):
+                    elements[i][attr] = { 'data_type' : 'time_series', 'values' : row }
+            else:
+                for i, value in zip(index, array.tolist()):
+                    elements[i][attr] = value
+
+        elements_dict[element_type] = dict(zip(names, elements))
+
+    return { 'elements' : elements_dict, 'system' : system }
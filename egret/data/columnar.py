@@ -0,0 +1,229 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+This module provides a columnar view of the elements of a single
+element type in a ModelData object, in which each attribute is stored
+as a numpy array indexed by element. Time series attributes are stored
+as 2-D (element x time) arrays. This allows operations over every
+element, such as parameter loading, scaling, and time slicing, to be
+done with vectorized numpy operations.
+"""
+import numpy as np
+
+_SCALAR = 'scalar'
+_TIME_SERIES = 'time_series'
+_OBJECT = 'object'
+
+def _is_time_series(att):
+    return isinstance(att, dict) and att.get('data_type') == 'time_series'
+
+def _attribute_kind(att):
+    if _is_time_series(att):
+        return _TIME_SERIES
+    if isinstance(att, (dict, list, tuple)):
+        return _OBJECT
+    return _SCALAR
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class ElementColumns(object):
+    '''
+    Columnar storage for the elements of a single element type.
+
+    For each attribute we keep the indices of the elements which have
+    that attribute and an array of their values. Scalar attributes are
+    1-D arrays, time series attributes are 2-D (element x time) arrays,
+    and any other attributes (e.g., cost curves) are 1-D object arrays.
+    If an attribute is a time series for some elements but a scalar for
+    others, the scalars are repeated across every time period.
+    '''
+    def __init__(self, elements):
+        '''
+        Creates a new ElementColumns object
+
+        Parameters
+        ----------
+        elements : dict
+            The elements of a single element type, i.e., a dict of
+            element name to element dict, such as dict(md.elements(...))
+        '''
+        self.names = tuple(elements.keys())
+        self._name_to_index = { name : i for i, name in enumerate(self.names) }
+
+        indices = dict()
+        values = dict()
+        kinds = dict()
+        num_time_periods = None
+
+        ## one pass over the element dictionaries
+        for i, element in enumerate(elements.values()):
+            for attr, att in element.items():
+                kind = _attribute_kind(att)
+                if attr not in kinds:
+                    indices[attr] = list()
+                    values[attr] = list()
+                    kinds[attr] = kind
+                elif kinds[attr] != kind:
+                    kinds[attr] = _merge_kinds(kinds[attr], kind)
+                if kind == _TIME_SERIES and num_time_periods is None:
+                    num_time_periods = len(att['values'])
+                indices[attr].append(i)
+                values[attr].append(att)
+
+        self.num_time_periods = num_time_periods
+
+        self._columns = dict()
+        for attr, kind in kinds.items():
+            self._columns[attr] = (kind, np.array(indices[attr], dtype=int), self._to_array(kind, values[attr]))
+
+    def _to_array(self, kind, values):
+        if kind == _TIME_SERIES:
+            ## repeat any scalars across the time periods
+            rows = [ v['values'] if _is_time_series(v) else [v]*self.num_time_periods for v in values ]
+            return np.array(rows)
+        if kind == _OBJECT:
+            return _object_array(values)
+        ## keep mixed types (e.g., numbers and None, or
+        ## bools and floats) as they are
+        types = set(type(v) for v in values)
+        if len(types) > 1 and not types.issubset({int, float}):
+            return _object_array(values)
+        return np.array(values)
+
+    @classmethod
+    def _from_columns(cls, names, num_time_periods, columns):
+        ec = cls.__new__(cls)
+        ec.names = names
+        ec._name_to_index = { name : i for i, name in enumerate(names) }
+        ec.num_time_periods = num_time_periods
+        ec._columns = columns
+        return ec
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, attr):
+        return attr in self._columns
+
+    def attribute_names(self):
+        return tuple(self._columns.keys())
+
+    def index(self, name):
+        '''
+        the index of the element name into this object
+        '''
+        return self._name_to_index[name]
+
+    def is_time_series(self, attr):
+        return self._columns[attr][0] == _TIME_SERIES
+
+    def element_names(self, attr):
+        '''
+        the names of the elements which have the attribute attr,
+        in the same order as the rows of column(attr)
+        '''
+        return tuple(self.names[i] for i in self._columns[attr][1])
+
+    def column(self, attr):
+        '''
+        the array of the values of attr, for those
+        elements listed in element_names(attr)
+        '''
+        return self._columns[attr][2]
+
+    def time_series(self, attr, num_time_periods=None):
+        '''
+        the (element x time) array of the values of attr for those
+        elements listed in element_names(attr). If attr is a scalar
+        attribute, its values are repeated across num_time_periods
+        (by default, the length of the time series in this object)
+        '''
+        kind, _, values = self._columns[attr]
+        if kind == _TIME_SERIES:
+            return values
+        if kind == _OBJECT:
+            raise Exception("Attribute {} is not a scalar or time series".format(attr))
+        if num_time_periods is None:
+            num_time_periods = self.num_time_periods
+        return np.repeat(values[:,np.newaxis], num_time_periods, axis=1)
+
+    def time_series_dict(self, attr, time_periods):
+        '''
+        a dict of (element name, time period) to the value of attr,
+        which can be used to initialize an indexed pyomo Param.
+        The time series values are taken in the order of time_periods.
+        Returns an empty dict if no element has attr.
+        '''
+        if attr not in self._columns:
+            return dict()
+        time_periods = list(time_periods)
+        rows = self.time_series(attr, len(time_periods)).tolist()
+        return { (name, t) : row[i] for name, row in zip(self.element_names(attr), rows) for i, t in enumerate(time_periods) }
+
+    def scale(self, attr, factor):
+        '''
+        multiplies the values of the (numeric) attribute attr by factor
+        '''
+        kind, idx, values = self._columns[attr]
+        self._columns[attr] = (kind, idx, values*factor)
+
+    def at_time_index(self, time_index):
+        '''
+        a new ElementColumns object in which every time series is
+        replaced by its value at time_index
+        '''
+        columns = dict()
+        for attr, (kind, idx, values) in self._columns.items():
+            if kind == _TIME_SERIES:
+                columns[attr] = (_SCALAR, idx, values[:,time_index])
+            else:
+                columns[attr] = (kind, idx, values)
+        return self._from_columns(self.names, None, columns)
+
+    def _iter_values(self, kind, values):
+        if kind == _TIME_SERIES:
+            for row in values.tolist():
+                yield {'data_type':'time_series', 'values':row}
+        elif kind == _OBJECT:
+            yield from values
+        else:
+            yield from values.tolist()
+
+    def attributes(self):
+        '''
+        returns a dictionary arranged by attribute -- element-name -- value,
+        as in ModelData.attributes
+        '''
+        retdict = { 'names' : list(self.names) }
+        for attr, (kind, idx, values) in self._columns.items():
+            retdict[attr] = { self.names[i] : v for i, v in zip(idx, self._iter_values(kind, values)) }
+        return retdict
+
+    def elements(self):
+        '''
+        returns a dictionary of element name to element dict,
+        as in ModelData.data['elements'][element_type]
+        '''
+        elements = { name : dict() for name in self.names }
+        for attr, (kind, idx, values) in self._columns.items():
+            for i, v in zip(idx, self._iter_values(kind, values)):
+                elements[self.names[i]][attr] = v
+        return elements
+
+
+def _merge_kinds(kind_a, kind_b):
+    kinds = {kind_a, kind_b}
+    if kinds == {_SCALAR, _TIME_SERIES}:
+        return _TIME_SERIES
+    return _OBJECT
@@ -12,8 +12,13 @@ This module contains several helper functions and classes that are useful when
 modifying the data dictionary
 """
 import abc
+import os
+import shutil
 import pickle
+import hashlib
+import tempfile
 import numpy as np
+import scipy.sparse as sp
 import egret.model_library.transmission.tx_calc as tx_calc
 
 from egret.model_library.defn import BasePointType, ApproximationType
@@ -49,6 +54,7 @@ def get_ptdf_potentially_from_file(ptdf_options, branches_keys,
 
     if PTDF is not None:
         PTDF._set_lazy_limits(ptdf_options)
+        PTDF._calculate_contingencies(ptdf_options)
 
         ## since it's simple, recalculate the
         ## interfaces from scratch each time
@@ -56,12 +62,51 @@ def get_ptdf_potentially_from_file(ptdf_options, branches_keys,
             interfaces = dict()
         PTDF._calculate_ptdf_interface(interfaces)
 
+        PTDF._set_interface_lazy_limits(ptdf_options)
+
+        PTDF._ptdf_entries_cache = dict()
+
     return PTDF
 
 def write_ptdf_potentially_to_file(ptdf_options, PTDF):
     if ptdf_options['save_to'] is not None:
         pickle.dump(PTDF, open(ptdf_options['save_to'], 'wb'))
 
+def _get_ptdf_cache_key(branches, buses, branches_keys, buses_keys,
+                        reference_bus, base_point):
+    '''
+    Calculates a hash of the data the PTDF matrix depends on, i.e.,
+    the topology, branch parameters, reference bus, and base point,
+    for use as the name of the PTDF matrix in the cache directory
+
+    Parameters
+    ----------
+    branches : dict{}
+    buses : dict{}
+    branches_keys : iterable of branches
+    buses_keys : iterable of buses
+    reference_bus : key value
+    base_point : egret.model_library.defn.BasePointType
+
+    Returns
+    -------
+    str : the hexadecimal digest
+
+    '''
+    key = hashlib.sha256()
+    key.update(repr((reference_bus, str(base_point))).encode())
+    for bn in branches_keys:
+        branch = branches[bn]
+        key.update(repr((bn, branch['from_bus'], branch['to_bus'], branch['branch_type'],
+                         branch['reactance'], branch.get('resistance'),
+                         branch.get('transformer_tap_ratio'), branch.get('transformer_phase_shift'))).encode())
+    for b in buses_keys:
+        if base_point == BasePointType.SOLUTION:
+            key.update(repr((b, buses[b]['vm'], buses[b]['va'])).encode())
+        else:
+            key.update(repr(b).encode())
+    return key.hexdigest()
+
 def _is_consistent_ptdfm(ptdf_mat, branches_keys, buses_keys):
     '''
     Checks the branches and buses keys for agreement when loading
@@ -83,6 +128,15 @@ def _is_consistent_ptdfm(ptdf_mat, branches_keys, buses_keys):
     return ( set(branches_keys) == set(ptdf_mat.branches_keys) and \
              set(buses_keys) == set(ptdf_mat.buses_keys) )
 
+def _add_branch_constant(PFV, const):
+    '''
+    adds the per-branch constant to the flows PFV, which
+    can be a vector or a (branch x time) matrix
+    '''
+    if PFV.ndim == 1:
+        return PFV + const
+    return PFV + const[:,np.newaxis]
+
 class PTDFMatrix(object):
     '''
     This is a helper 
@@ -116,42 +170,246 @@ class PTDFMatrix(object):
         self.branch_limits_array.flags.writeable = False
 
         self._base_point = base_point
+        self._ptdf_method = ptdf_options['ptdf_method']
+        self._cache_dir = ptdf_options['cache_dir']
         self._calculate()
 
         self._set_lazy_limits(ptdf_options)
+        self._calculate_contingencies(ptdf_options)
 
         if interfaces is None:
             interfaces = dict()
         self._calculate_ptdf_interface(interfaces)
 
+        self._set_interface_lazy_limits(ptdf_options)
+
+        self._ptdf_entries_cache = dict()
+
+    ## the arrays stored in the cache directory
+    _cached_arrays = ('PTDFM', 'phi_adjust_array', 'phase_shift_array')
+
+    ## True if the PTDF matrix was loaded from the cache,
+    ## and so its factorization is not calculated yet
+    _factorization_pending = False
+
     def _calculate(self):
+        if self._load_from_cache():
+            return
         self._calculate_ptdf()
         self._calculate_phi_adjust()
         self._calculate_phase_shift()
+        self._save_to_cache()
+
+    def _get_cache_path(self):
+        if self._cache_dir is None or not self._cached_arrays:
+            return None
+        key = _get_ptdf_cache_key(self._branches, self._buses, self.branches_keys, self.buses_keys,
+                                  self._reference_bus, self._base_point)
+        return os.path.join(self._cache_dir, key)
+
+    def _load_from_cache(self):
+        '''
+        memory-map the arrays from the cache directory, if present,
+        so that processes using the same network share the same pages
+        '''
+        cache_path = self._get_cache_path()
+        if cache_path is None or not os.path.isdir(cache_path):
+            return False
+
+        try:
+            arrays = { name : np.load(os.path.join(cache_path, name+'.npy'), mmap_mode='r') for name in self._cached_arrays }
+        except (OSError, ValueError):
+            logger.warning("Error loading PTDF matrix from cache {}, calculating from start".format(cache_path))
+            return False
+
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+        ## the factorization and phi constants are only needed
+        ## for line outages, so they are calculated on the first
+        ## one (see _calculate_pending_factorization)
+        self._factorization = None
+        self._phi_from = None
+        self._phi_to = None
+        self._factorization_pending = True
+
+        return True
+
+    def _save_to_cache(self):
+        '''
+        write the arrays to the cache directory, by writing them to
+        a temporary directory and moving it into place so that
+        other processes never see a partially written entry
+        '''
+        cache_path = self._get_cache_path()
+        if cache_path is None or os.path.isdir(cache_path):
+            return
+
+        os.makedirs(self._cache_dir, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=self._cache_dir)
+        try:
+            for name in self._cached_arrays:
+                np.save(os.path.join(tmp_path, name+'.npy'), getattr(self, name))
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            ## another process may have written this entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
 
     def _calculate_ptdf(self):
         '''
         do the PTDF calculation
         '''
+        self._calculate_factorization(ApproximationType.PTDF)
+
         ## calculate and store the PTDF matrix
         PTDFM = tx_calc.calculate_ptdf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,
-                                        mapping_bus_to_idx=self._busname_to_index_map)
+                                        mapping_bus_to_idx=self._busname_to_index_map,
+                                        ptdf_method=self._ptdf_method, factorization=self._factorization)
 
         self.PTDFM = PTDFM
 
         ## protect the array using numpy
         self.PTDFM.flags.writeable = False
 
+    def _calculate_factorization(self, approximation_type):
+        '''
+        factorize the network matrix, keeping the factorization
+        around for calculations with the same topology
+        '''
+        if self._ptdf_method == 'splu':
+            self._factorization = tx_calc.calculate_ptdf_factorization(self._branches,self._buses,self.branches_keys,self.buses_keys,
+                                                                        self._reference_bus,self._base_point,
+                                                                        mapping_bus_to_idx=self._busname_to_index_map,
+                                                                        approximation_type=approximation_type)
+        else:
+            self._factorization = None
+
+        ## the factorization failed and the user has been warned,
+        ## so fall back to the dense method directly
+        if self._factorization is None:
+            self._ptdf_method = 'dense'
+
+    def _calculate_pending_factorization(self):
+        '''
+        calculate the factorization and phi constants
+        of a PTDF matrix loaded from the cache
+        '''
+        if not self._factorization_pending:
+            return
+        self._factorization_pending = False
+        logger.info("Factorizing the network of the cached PTDF matrix for line outages")
+        self._calculate_factorization(ApproximationType.PTDF)
+        self._phi_from, self._phi_to = self._calculate_phi_from_phi_to()
+
+    def calculate_outage_ptdf(self, branches_out_service, ptdf_options, interfaces=None):
+        '''
+        Calculates the PTDFMatrix for this network with the branches in
+        branches_out_service taken out of service by a low-rank (LODF /
+        Sherman-Morrison-Woodbury) update, instead of from scratch
+
+        Parameters
+        ----------
+        branches_out_service : iterable of branches
+        ptdf_options : dict
+        interfaces : dict, optional
+
+        Returns
+        -------
+        PTDFMatrix, or None if the update cannot be used (e.g., the network
+        was not factorized or the outages island part of the network)
+        '''
+        self._calculate_pending_factorization()
+        if self._factorization is None:
+            return None
+
+        branches_out_service = tuple(branches_out_service)
+        out_rows = [ self._branchname_to_index_map[bn] for bn in branches_out_service ]
+        out_rows_set = set(out_rows)
+        in_rows = np.fromiter((i for i in range(len(self.branches_keys)) if i not in out_rows_set), int)
+
+        factorization = tx_calc.calculate_outage_factorization(self._factorization,self._branches,self._buses,branches_out_service,self.buses_keys,
+                                                               self._base_point, mapping_bus_to_idx=self._busname_to_index_map)
+        if factorization is None:
+            return None
+
+        PTDF = object.__new__(type(self))
+
+        PTDF._branches = self._branches
+        PTDF._buses = self._buses
+        PTDF._reference_bus = self._reference_bus
+        PTDF._base_point = self._base_point
+        PTDF._ptdf_method = self._ptdf_method
+        PTDF._factorization = factorization
+
+        PTDF.branches_keys = tuple(self.branches_keys[i] for i in in_rows)
+        PTDF.buses_keys = self.buses_keys
+        PTDF._branchname_to_index_map = {branch_n : i for i, branch_n in enumerate(PTDF.branches_keys)}
+        PTDF._busname_to_index_map = self._busname_to_index_map
+
+        PTDF.branch_limits_array = self.branch_limits_array[in_rows]
+        PTDF.branch_limits_array.flags.writeable = False
+
+        PTDF._calculate_outage_ptdf(self, in_rows, out_rows)
+
+        ## the phi constants are per branch, so we can just drop
+        ## the columns for the branches out of service
+        PTDF._set_phi_adjust(self._phi_from.tocsc()[:,in_rows], self._phi_to.tocsc()[:,in_rows])
+
+        PTDF.phase_shift_array = self.phase_shift_array[in_rows]
+        PTDF.phase_shift_array.flags.writeable = False
+
+        PTDF._set_lazy_limits(ptdf_options)
+        PTDF._calculate_contingencies(ptdf_options)
+
+        if interfaces is None:
+            interfaces = dict()
+        PTDF._calculate_ptdf_interface(interfaces)
+
+        PTDF._set_interface_lazy_limits(ptdf_options)
+
+        PTDF._ptdf_entries_cache = dict()
+
+        return PTDF
+
+    def _calculate_outage_ptdf(self, base_PTDF, in_rows, out_rows):
+        '''
+        Update the PTDF matrix from base_PTDF using
+        the line outage distribution factors (LODF)
+        '''
+        base_PTDFM = base_PTDF.PTDFM
+
+        ## the PTDF rows for the branches out of service
+        PTDF_K = base_PTDFM[out_rows]
+
+        ## the change in flow on each branch from a
+        ## unit flow on the branches out of service
+        A_K = tx_calc.calculate_adjacency_matrix_transpose(self._branches, [base_PTDF.branches_keys[i] for i in out_rows],
+                                                           self.buses_keys, self._busname_to_index_map)
+        PTDF_A_K = A_K.T.dot(base_PTDFM[in_rows].T).T
+        W = np.eye(len(out_rows)) - A_K.T.dot(PTDF_K.T).T
+
+        LODF = np.linalg.solve(W.T, PTDF_A_K.T).T
+
+        self.PTDFM = base_PTDFM[in_rows] + LODF.dot(PTDF_K)
+
+        ## protect the array using numpy
+        self.PTDFM.flags.writeable = False
+
     def _calculate_ptdf_interface(self, interfaces):
         self.interface_keys = tuple(interfaces.keys())
 
+        ## we only need the PTDF rows for the
+        ## branches which are part of some interface
+        interface_branches = tuple(dict.fromkeys(l for i_n in self.interface_keys for l in interfaces[i_n]['lines']))
+        interface_branch_rows = [ self._branchname_to_index_map[bn] for bn in interface_branches ]
+
         self.PTDFM_I, self.PTDFM_I_const \
                 = tx_calc.calculate_interface_sensitivities(interfaces,
                                             self.interface_keys,
-                                            self.PTDFM,
-                                            self.phase_shift_array,
+                                            self._get_ptdf_rows(interface_branch_rows),
+                                            self.phase_shift_array[interface_branch_rows],
                                             self.phi_adjust_array,
-                                            self._branchname_to_index_map)
+                                            { bn : i for i, bn in enumerate(interface_branches) })
 
         ## protect the array using numpy
         self.PTDFM_I.flags.writeable = False
@@ -160,12 +418,22 @@ class PTDFMatrix(object):
         self._interfacename_to_index_map = \
                 { i_n: idx for idx, i_n in enumerate(self.interface_keys) }
 
+        ## no limit is given by None
+        self.interface_max_limits = np.fromiter((np.inf if interfaces[i_n]['maximum_limit'] is None else interfaces[i_n]['maximum_limit'] for i_n in self.interface_keys), float, count=len(self.interface_keys))
+        self.interface_min_limits = np.fromiter((-np.inf if interfaces[i_n]['minimum_limit'] is None else interfaces[i_n]['minimum_limit'] for i_n in self.interface_keys), float, count=len(self.interface_keys))
+
+        ## protect the array using numpy
+        self.interface_max_limits.flags.writeable = False
+        self.interface_min_limits.flags.writeable = False
+
     def _calculate_phi_from_phi_to(self):
         return tx_calc.calculate_phi_constant(self._branches,self.branches_keys,self.buses_keys,ApproximationType.PTDF, mapping_bus_to_idx=self._busname_to_index_map)
 
     def _calculate_phi_adjust(self):
         phi_from, phi_to = self._calculate_phi_from_phi_to()
-        
+        self._set_phi_adjust(phi_from, phi_to)
+
+    def _set_phi_adjust(self, phi_from, phi_to):
         ## hold onto these for line outages
         self._phi_from = phi_from
         self._phi_to = phi_to
@@ -194,9 +462,9 @@ class PTDFMatrix(object):
             self.branch_mask = np.arange(len(self.branch_limits_array))
             self.branches_keys_masked = self.branches_keys
             self.branchname_to_index_masked_map = self._branchname_to_index_map
-            self.PTDFM_masked = self.PTDFM
             self.phase_shift_array_masked = self.phase_shift_array
             self.branch_limits_array_masked = self.branch_limits_array
+            self._calculate_ptdf_masked()
             return
 
         branches = self._branches
@@ -233,9 +501,15 @@ class PTDFMatrix(object):
         self.branch_mask = np.array(branch_mask)
         self.branches_keys_masked = tuple(self.branches_keys[i] for i in self.branch_mask)
         self.branchname_to_index_masked_map = { bn : i for i,bn in enumerate(self.branches_keys_masked) }
-        self.PTDFM_masked = self.PTDFM[branch_mask]
         self.phase_shift_array_masked = self.phase_shift_array[branch_mask]
         self.branch_limits_array_masked = self.branch_limits_array[branch_mask]
+        self._calculate_ptdf_masked()
+
+    def _calculate_ptdf_masked(self):
+        if self.branches_keys_masked is self.branches_keys:
+            self.PTDFM_masked = self.PTDFM
+        else:
+            self.PTDFM_masked = self.PTDFM[self.branch_mask]
 
     def _set_lazy_limits(self, ptdf_options):
         if ptdf_options['lazy']:
@@ -252,16 +526,199 @@ class PTDFMatrix(object):
             self.lazy_branch_limits = np.minimum(branch_limits*(1+lazy_flow_tol), self.enforced_branch_limits)
 
 
+    def _set_interface_lazy_limits(self, ptdf_options):
+        if ptdf_options['lazy']:
+            rel_flow_tol = ptdf_options['interface_rel_flow_tol']
+            abs_flow_tol = ptdf_options['interface_abs_flow_tol']
+            lazy_flow_tol = ptdf_options['interface_lazy_rel_flow_tol']
+
+            ## interface limits can be negative or infinite,
+            ## so the relative tolerances are on their magnitude
+            abs_max_limits = np.where(np.isfinite(self.interface_max_limits), np.abs(self.interface_max_limits), 0.)
+            abs_min_limits = np.where(np.isfinite(self.interface_min_limits), np.abs(self.interface_min_limits), 0.)
+
+            ## only enforce the relative and absolute, within tollerance
+            self.enforced_interface_max_limits = self.interface_max_limits + np.maximum(abs_max_limits*rel_flow_tol, abs_flow_tol)
+            self.enforced_interface_min_limits = self.interface_min_limits - np.maximum(abs_min_limits*rel_flow_tol, abs_flow_tol)
+            ## make sure the lazy limits are a superset of the enforce limits
+            self.lazy_interface_max_limits = np.minimum(self.interface_max_limits + abs_max_limits*lazy_flow_tol, self.enforced_interface_max_limits)
+            self.lazy_interface_min_limits = np.maximum(self.interface_min_limits - abs_min_limits*lazy_flow_tol, self.enforced_interface_min_limits)
+
+    def _calculate_contingencies(self, ptdf_options):
+        '''
+        calculate the line outage distribution factors (LODF) of the
+        single branch contingencies in ptdf_options['contingencies'],
+        either 'all' or a list of branch names, on the masked branches
+        '''
+        ## the contingencies are screened in the lazy loop
+        if not ptdf_options['lazy']:
+            self.contingency_keys = ()
+            return
+
+        contingencies = ptdf_options['contingencies']
+        if contingencies is None:
+            contingencies = ()
+        elif contingencies == 'all':
+            contingencies = self.branches_keys
+
+        ## branches out of service are not contingencies
+        contingency_keys = [ bn for bn in contingencies if bn in self._branchname_to_index_map ]
+        contingency_rows = np.fromiter((self._branchname_to_index_map[bn] for bn in contingency_keys), int, count=len(contingency_keys))
+
+        ## the change in flow on each branch from a
+        ## unit flow on the contingency branches
+        A_K = tx_calc.calculate_adjacency_matrix_transpose(self._branches, contingency_keys,
+                                                           self.buses_keys, self._busname_to_index_map)
+        PTDF_A_K = self._calculate_ptdf_adjacency(A_K)
+
+        denom = 1. - PTDF_A_K[contingency_rows, np.arange(len(contingency_keys))]
+
+        ## if the denominator vanishes the contingency
+        ## islands part of the network, so we skip it
+        keep = np.abs(denom) > 1e-6
+        for bn in (bn for bn, k in zip(contingency_keys, keep) if not k):
+            logger.debug("contingency {} islands part of the network, skipping".format(bn))
+
+        self.contingency_keys = tuple(bn for bn, k in zip(contingency_keys, keep) if k)
+        self._contingency_rows = contingency_rows[keep]
+        self._contingencyname_to_index_map = { bn : k for k, bn in enumerate(self.contingency_keys) }
+
+        ## LODF[i,k] is the fraction of the pre-contingency flow on
+        ## contingency branch k which shifts to masked branch i
+        self.LODF = PTDF_A_K[self.branch_mask][:,keep] / denom[keep]
+
+        ## after its outage, the contingency branch has no flow
+        for k, bn in enumerate(self.contingency_keys):
+            if bn in self.branchname_to_index_masked_map:
+                self.LODF[self.branchname_to_index_masked_map[bn], k] = -1.
+
+        ## protect the array using numpy
+        self.LODF.flags.writeable = False
+
+        self.contingency_phase_shift_array = self.phase_shift_array[self._contingency_rows]
+        self._calculate_ptdf_contingency()
+
+        ## the post-contingency limits are the emergency ratings, if given
+        branches = self._branches
+        contingency_limits = np.fromiter((branches[bn]['rating_long_term'] if branches[bn].get('rating_emergency') is None \
+                                                else branches[bn]['rating_emergency'] for bn in self.branches_keys_masked),
+                                          float, count=len(self.branches_keys_masked))
+        self.contingency_branch_limits_array_masked = contingency_limits
+
+        rel_flow_tol = ptdf_options['rel_flow_tol']
+        abs_flow_tol = ptdf_options['abs_flow_tol']
+        lazy_flow_tol = ptdf_options['lazy_rel_flow_tol']
+
+        ## as in _set_lazy_limits
+        self.enforced_contingency_branch_limits = np.maximum(contingency_limits*(1+rel_flow_tol), contingency_limits+abs_flow_tol)
+        self.lazy_contingency_branch_limits = np.minimum(contingency_limits*(1+lazy_flow_tol), self.enforced_contingency_branch_limits)
+
+    def _calculate_ptdf_adjacency(self, A_K):
+        return A_K.T.dot(self.PTDFM.T).T
+
+    def _calculate_ptdf_contingency(self):
+        self.PTDFM_K = self.PTDFM[self._contingency_rows]
+
+        ## protect the array using numpy
+        self.PTDFM_K.flags.writeable = False
+
+    def calculate_contingency_PFV(self, NWV):
+        '''
+        calculate the (pre-contingency) power flows on the contingency
+        branches given the net withdrawls (adjusted by phi_adjust_array)
+        '''
+        return _add_branch_constant(self.PTDFM_K.dot(NWV), self.contingency_phase_shift_array)
+
+    def get_contingency_lodf(self, contingency_name, branch_name):
+        return self.LODF[self.branchname_to_index_masked_map[branch_name], self._contingencyname_to_index_map[contingency_name]]
+
+    def _get_ptdf_row(self, row_idx):
+        return self.PTDFM[row_idx]
+
+    def _get_ptdf_rows(self, row_idxs):
+        return self.PTDFM[row_idxs]
+
+    def get_masked_ptdf_rows(self, masked_row_idx):
+        '''
+        get the row(s) of PTDFM_masked at masked_row_idx, which
+        can be an index or a list of indices
+        '''
+        return self.PTDFM_masked[masked_row_idx]
+
+    def get_branch_ptdf_csr(self, branch_names, abs_ptdf_tol=0., rel_ptdf_tol=0., batch_size=512):
+        '''
+        get the rows of the PTDF matrix for the branches branch_names as a
+        csr_matrix, without the entries below max(abs_ptdf_tol, rel_ptdf_tol*
+        (the largest magnitude in the row)), along with the constant term
+        (phase shift and phi adjustment) of each branch's power flow.
+        The rows are thresholded batch_size at a time.
+        '''
+        row_idxs = [ self._branchname_to_index_map[bn] for bn in branch_names ]
+
+        PTDF_csr = [ sp.csr_matrix((0, len(self.buses_keys))) ]
+        consts = np.empty(len(row_idxs))
+        for start in range(0, len(row_idxs), batch_size):
+            stop = min(start+batch_size, len(row_idxs))
+            PTDF_rows = self._get_ptdf_rows(row_idxs[start:stop])
+            consts[start:stop] = PTDF_rows.dot(self.phi_adjust_array)
+            PTDF_csr.append(tx_calc.sparsify_sensitivity(PTDF_rows, abs_ptdf_tol, rel_ptdf_tol))
+        consts += self.phase_shift_array[row_idxs]
+
+        return sp.vstack(PTDF_csr, format='csr'), consts
+
+    def get_branch_ptdf_entries(self, branch_names, abs_ptdf_tol=0., rel_ptdf_tol=0.):
+        '''
+        get, for each branch in branch_names, the bus indices and the
+        coefficients of its thresholded PTDF row (as in get_branch_ptdf_csr)
+        and the constant term of its power flow. These are cached for each
+        pair of thresholds, so the time periods which share this PTDF matrix
+        only calculate them once.
+        '''
+        cache = self._ptdf_entries_cache.setdefault((abs_ptdf_tol, rel_ptdf_tol), dict())
+
+        missing = [ bn for bn in dict.fromkeys(branch_names) if bn not in cache ]
+        if missing:
+            PTDF_csr, consts = self.get_branch_ptdf_csr(missing, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+            indptr = PTDF_csr.indptr
+            for k, (bn, const) in enumerate(zip(missing, consts.tolist())):
+                start, end = indptr[k], indptr[k+1]
+                cache[bn] = (PTDF_csr.indices[start:end], PTDF_csr.data[start:end], const)
+
+        return [ cache[bn] for bn in branch_names ]
+
+    def calculate_PFV(self, NWV):
+        '''
+        calculate the power flows on all branches given the
+        net withdrawls (adjusted by phi_adjust_array)
+        '''
+        return _add_branch_constant(self.PTDFM.dot(NWV), self.phase_shift_array)
+
+    def calculate_masked_PFV(self, NWV):
+        '''
+        calculate the power flows on the masked branches given the
+        net withdrawls (adjusted by phi_adjust_array). NWV can
+        also be a (bus x time) matrix, in which case the flows are
+        a (branch x time) matrix
+        '''
+        return _add_branch_constant(self.PTDFM_masked.dot(NWV), self.phase_shift_array_masked)
+
+    def calculate_LMPC(self, PFD):
+        '''
+        calculate the congestion component of the LMPs given
+        the duals on the branch flow limits
+        '''
+        return -self.PTDFM.T.dot(PFD)
+
     def get_branch_ptdf_iterator(self, branch_name):
         row_idx = self._branchname_to_index_map[branch_name]
         ## get the row slice
-        PTDF_row = self.PTDFM[row_idx]
+        PTDF_row = self._get_ptdf_row(row_idx)
         yield from zip(self.buses_keys, PTDF_row)
 
     def get_branch_ptdf_abs_max(self, branch_name):
         row_idx = self._branchname_to_index_map[branch_name]
         ## get the row slice
-        PTDF_row = self.PTDFM[row_idx]
+        PTDF_row = self._get_ptdf_row(row_idx)
         return np.abs(PTDF_row).max()
 
     def get_branch_phase_shift(self, branch_name):
@@ -273,12 +730,20 @@ class PTDFMatrix(object):
     def get_branch_phi_adj(self, branch_name):
         row_idx = self._branchname_to_index_map[branch_name]
         ## get the row slice
-        PTDF_row = self.PTDFM[row_idx]
+        PTDF_row = self._get_ptdf_row(row_idx)
         return PTDF_row.dot(self.phi_adjust_array)
 
     def bus_iterator(self):
         yield from self.buses_keys
 
+    def calculate_PFV_I(self, NWV):
+        '''
+        the interface flows for the net withdrawals NWV, which
+        should not include the phi adjustments (these are
+        already in PTDFM_I_const)
+        '''
+        return _add_branch_constant(self.PTDFM_I.dot(NWV), self.PTDFM_I_const)
+
     def get_interface_const(self, interface_name):
         return self.PTDFM_I_const[self._interfacename_to_index_map[interface_name]]
 
@@ -295,6 +760,244 @@ class PTDFMatrix(object):
         yield from zip(self.buses_keys, PTDF_I_row)
 
 
+class LazyPTDFMatrix(PTDFMatrix):
+    '''
+    A PTDFMatrix which holds onto the factorization of the network
+    matrix and only calculates (and caches) the rows of the PTDF matrix
+    as they are requested. Power flows are calculated from a single solve
+    for the bus angles followed by the branch angle differences.
+
+    This is useful for the lazy PTDF formulations on large networks, for
+    which the rows of the monitored branches are all that is needed.
+    '''
+    ## the full PTDF matrix is never calculated, so nothing is cached
+    _cached_arrays = ()
+
+    def _calculate_ptdf(self):
+        '''
+        factorize the network matrix, but do not calculate any rows
+        '''
+        self._calculate_factorization(ApproximationType.PTDF)
+
+        self._J = tx_calc.calculate_branch_angle_sensitivity(self._branches,self._buses,self.branches_keys,self.buses_keys,
+                                                             self._base_point, mapping_bus_to_idx=self._busname_to_index_map)
+
+        self._ptdf_rows = dict()
+
+        ## if the factorization failed (e.g., the network is disconnected),
+        ## we just calculate the whole PTDF matrix densely
+        if self._factorization is None:
+            self._dense_PTDFM = tx_calc.calculate_ptdf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,
+                                                       mapping_bus_to_idx=self._busname_to_index_map, ptdf_method='dense')
+            self._dense_PTDFM.flags.writeable = False
+        else:
+            self._dense_PTDFM = None
+
+    def _calculate_outage_ptdf(self, base_PTDF, in_rows, out_rows):
+        '''
+        The rows will be calculated from the updated factorization
+        '''
+        self._J = base_PTDF._J[in_rows]
+        self._ptdf_rows = dict()
+        self._dense_PTDFM = None
+
+    def _calculate_ptdf_masked(self):
+        self._J_masked = self._J[self.branch_mask]
+
+    def _calculate_ptdf_adjacency(self, A_K):
+        if self._dense_PTDFM is not None:
+            return A_K.T.dot(self._dense_PTDFM.T).T
+        return self._J.dot(self._factorization.solve(A_K.toarray()))
+
+    def _calculate_ptdf_contingency(self):
+        ## the flows are calculated from the bus angles
+        pass
+
+    def calculate_contingency_PFV(self, NWV):
+        return self.calculate_PFV(NWV)[self._contingency_rows]
+
+    @property
+    def PTDFM(self):
+        '''
+        The full PTDF matrix. This calculates every row, so it should only
+        be used when the full matrix is actually needed.
+        '''
+        return self._get_ptdf_rows(list(range(len(self.branches_keys))))
+
+    @property
+    def PTDFM_masked(self):
+        '''
+        The PTDF matrix for the masked branches. This calculates every row,
+        so it should only be used when the full matrix is actually needed.
+        '''
+        return self._get_ptdf_rows(list(self.branch_mask))
+
+    def _calculate_ptdf_rows(self, row_idxs):
+        missing_rows = [ r for r in dict.fromkeys(row_idxs) if r not in self._ptdf_rows ]
+        if not missing_rows:
+            return
+
+        if self._dense_PTDFM is None:
+            PTDF_rows = self._factorization.sensitivity(self._J[missing_rows])
+        else:
+            PTDF_rows = self._dense_PTDFM[missing_rows]
+
+        ## protect the array using numpy
+        PTDF_rows.flags.writeable = False
+
+        for r, PTDF_row in zip(missing_rows, PTDF_rows):
+            self._ptdf_rows[r] = PTDF_row
+
+    def _get_ptdf_row(self, row_idx):
+        if row_idx not in self._ptdf_rows:
+            self._calculate_ptdf_rows((row_idx,))
+        return self._ptdf_rows[row_idx]
+
+    def _get_ptdf_rows(self, row_idxs):
+        self._calculate_ptdf_rows(row_idxs)
+        PTDF_rows = np.empty((len(row_idxs), len(self.buses_keys)))
+        for i, r in enumerate(row_idxs):
+            PTDF_rows[i] = self._ptdf_rows[r]
+        return PTDF_rows
+
+    def get_masked_ptdf_rows(self, masked_row_idx):
+        if isinstance(masked_row_idx, (list, tuple, np.ndarray)):
+            return self._get_ptdf_rows(self.branch_mask[masked_row_idx])
+        return self._get_ptdf_row(self.branch_mask[masked_row_idx])
+
+    def _calculate_va(self, NWV):
+        return self._factorization.solve(NWV)
+
+    def calculate_PFV(self, NWV):
+        if self._dense_PTDFM is not None:
+            return _add_branch_constant(self._dense_PTDFM.dot(NWV), self.phase_shift_array)
+        return _add_branch_constant(self._J.dot(self._calculate_va(NWV)), self.phase_shift_array)
+
+    def calculate_masked_PFV(self, NWV):
+        if self._dense_PTDFM is not None:
+            return _add_branch_constant(self._dense_PTDFM[self.branch_mask].dot(NWV), self.phase_shift_array_masked)
+        return _add_branch_constant(self._J_masked.dot(self._calculate_va(NWV)), self.phase_shift_array_masked)
+
+    def calculate_LMPC(self, PFD):
+        if self._dense_PTDFM is not None:
+            return -self._dense_PTDFM.T.dot(PFD)
+        return -self._factorization.solve_transpose(self._J.T.dot(PFD))
+
+
+class SparsePTDFMatrix(PTDFMatrix):
+    '''
+    A PTDFMatrix which stores PTDFM (and so PTDFM_masked) and PTDFM_I as
+    scipy.sparse.csr_matrix, dropping the entries below the thresholds
+    ptdf_options['abs_ptdf_tol'] and ptdf_options['rel_ptdf_tol'] as the
+    matrix is calculated. These entries are left out of the power flow
+    expressions anyway, so the flow constraints are unchanged, but the
+    memory needed for large networks can be reduced by an order of
+    magnitude or more. If ptdf_options['ptdf_float32'] is True, the
+    entries are further stored in single precision.
+    '''
+    ## the cache directory only holds dense arrays
+    _cached_arrays = ()
+
+    def __init__(self, branches, buses, reference_bus, base_point,
+                        ptdf_options, branches_keys = None, buses_keys = None,
+                        interfaces = None):
+        self._abs_ptdf_tol = ptdf_options['abs_ptdf_tol']
+        self._rel_ptdf_tol = ptdf_options['rel_ptdf_tol']
+        self._dtype = np.float32 if ptdf_options['ptdf_float32'] else np.float64
+
+        super().__init__(branches, buses, reference_bus, base_point, ptdf_options,
+                         branches_keys=branches_keys, buses_keys=buses_keys,
+                         interfaces=interfaces)
+
+    def _sparsify(self, PTDF_rows):
+        return tx_calc.sparsify_sensitivity(PTDF_rows, self._abs_ptdf_tol, self._rel_ptdf_tol, self._dtype)
+
+    def _calculate_ptdf(self):
+        '''
+        do the PTDF calculation, thresholding the rows in batches
+        '''
+        self._calculate_factorization(ApproximationType.PTDF)
+
+        if self._factorization is None:
+            PTDFM = self._sparsify(tx_calc.calculate_ptdf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,
+                                                          mapping_bus_to_idx=self._busname_to_index_map, ptdf_method='dense'))
+        else:
+            J = tx_calc.calculate_branch_angle_sensitivity(self._branches,self._buses,self.branches_keys,self.buses_keys,
+                                                           self._base_point, mapping_bus_to_idx=self._busname_to_index_map)
+            PTDFM = self._factorization.sparse_sensitivity(J, self._abs_ptdf_tol, self._rel_ptdf_tol, self._dtype)
+
+        self.PTDFM = PTDFM
+
+    def _calculate_outage_ptdf(self, base_PTDF, in_rows, out_rows, batch_size=512):
+        '''
+        Update the PTDF matrix from base_PTDF using the line outage
+        distribution factors (LODF), thresholding the rows in batches
+        '''
+        self._abs_ptdf_tol = base_PTDF._abs_ptdf_tol
+        self._rel_ptdf_tol = base_PTDF._rel_ptdf_tol
+        self._dtype = base_PTDF._dtype
+
+        base_PTDFM = base_PTDF.PTDFM[in_rows]
+
+        ## the PTDF rows for the branches out of service
+        PTDF_K = base_PTDF.PTDFM[out_rows].toarray()
+
+        ## the change in flow on each branch from a
+        ## unit flow on the branches out of service
+        A_K = tx_calc.calculate_adjacency_matrix_transpose(self._branches, [base_PTDF.branches_keys[i] for i in out_rows],
+                                                           self.buses_keys, self._busname_to_index_map)
+        PTDF_A_K = A_K.T.dot(base_PTDFM.T).T.toarray()
+        W = np.eye(len(out_rows)) - A_K.T.dot(PTDF_K.T).T
+
+        LODF = np.linalg.solve(W.T, PTDF_A_K.T).T
+
+        PTDFM = [ sp.csr_matrix((0, len(self.buses_keys)), dtype=self._dtype) ]
+        for start in range(0, len(in_rows), batch_size):
+            stop = min(start+batch_size, len(in_rows))
+            PTDFM.append(self._sparsify(base_PTDFM[start:stop].toarray() + LODF[start:stop].dot(PTDF_K)))
+        self.PTDFM = sp.vstack(PTDFM, format='csr')
+
+    def _calculate_ptdf_interface(self, interfaces):
+        super()._calculate_ptdf_interface(interfaces)
+        self.PTDFM_I = self._sparsify(self.PTDFM_I)
+
+    def _calculate_ptdf_adjacency(self, A_K):
+        return A_K.T.dot(self.PTDFM.T).T.toarray()
+
+    def _calculate_ptdf_contingency(self):
+        self.PTDFM_K = self.PTDFM[self._contingency_rows]
+
+    def _get_ptdf_row(self, row_idx):
+        return self.PTDFM[row_idx].toarray()[0]
+
+    def _get_ptdf_rows(self, row_idxs):
+        return self.PTDFM[row_idxs].toarray()
+
+    def get_masked_ptdf_rows(self, masked_row_idx):
+        if isinstance(masked_row_idx, (list, tuple, np.ndarray)):
+            return self.PTDFM_masked[masked_row_idx].toarray()
+        return self.PTDFM_masked[masked_row_idx].toarray()[0]
+
+    def _row_iterator(self, PTDF_row):
+        ## only the entries above the thresholds
+        buses_keys = self.buses_keys
+        yield from zip((buses_keys[j] for j in PTDF_row.indices.tolist()), PTDF_row.data.tolist())
+
+    def get_branch_ptdf_iterator(self, branch_name):
+        yield from self._row_iterator(self.PTDFM[self._branchname_to_index_map[branch_name]])
+
+    def get_branch_ptdf_abs_max(self, branch_name):
+        PTDF_row = self.PTDFM[self._branchname_to_index_map[branch_name]]
+        return np.abs(PTDF_row.data).max(initial=0.)
+
+    def get_interface_ptdf_abs_max(self, interface_name):
+        PTDF_I_row = self.PTDFM_I[self._interfacename_to_index_map[interface_name]]
+        return np.abs(PTDF_I_row.data).max(initial=0.)
+
+    def get_interface_ptdf_iterator(self, interface_name):
+        yield from self._row_iterator(self.PTDFM_I[self._interfacename_to_index_map[interface_name]])
+
+
 class PTDFLossesMatrix(PTDFMatrix):
 
     def _calculate(self):
@@ -305,8 +1008,11 @@ class PTDFLossesMatrix(PTDFMatrix):
         self._calculate_losses_phase_shift()
 
     def _calculate_ptdf(self):
+        self._calculate_factorization(ApproximationType.PTDF_LOSSES)
+
         ptdf_r, ldf, ldf_c = tx_calc.calculate_ptdf_ldf(self._branches,self._buses,self.branches_keys,self.buses_keys,self._reference_bus,self._base_point,\
-                                                        mapping_bus_to_idx=self._busname_to_index_map)
+                                                        mapping_bus_to_idx=self._busname_to_index_map,
+                                                        ptdf_method=self._ptdf_method, factorization=self._factorization)
 
         self.PTDFM = ptdf_r
         self.LDF = ldf
@@ -317,6 +1023,10 @@ class PTDFLossesMatrix(PTDFMatrix):
         self.LDF.flags.writeable = False
         self.LDF_C.flags.writeable = False
 
+    def calculate_outage_ptdf(self, branches_out_service, ptdf_options, interfaces=None):
+        ## low-rank updates are not implemented for the losses matrices
+        return None
+
     def _calculate_phi_from_phi_to(self):
         return tx_calc.calculate_phi_constant(self._branches,self.branches_keys,self.buses_keys,ApproximationType.PTDF_LOSSES, mapping_bus_to_idx=self._busname_to_index_map)
 
@@ -122,10 +122,98 @@ nested dictionary structure.
     * Document the data-types for attributes
 
 """
+import os
 import copy as cp
 import logging
+import math
+import itertools
+from collections.abc import Sequence
 logger = logging.getLogger('egret.model_data')
 
+
+class TimeSeriesView(Sequence):
+    """
+    A read-only view of the values[start:stop] of a time series, which
+    does not copy the underlying list. These are used for the time series
+    values of a ModelData object created by :py:meth:`ModelData.slice_time`,
+    and behave as a list that cannot be modified in place.
+    """
+    __slots__ = ('_values', '_start', '_stop')
+
+    def __init__(self, values, start, stop):
+        ## views of views refer back to the original list
+        if isinstance(values, TimeSeriesView):
+            start += values._start
+            stop += values._start
+            values = values._values
+        self._values = values
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step == 1:
+                return TimeSeriesView(self, start, max(start, stop))
+            return list(self)[idx]
+        if idx < 0:
+            idx += len(self)
+        if not (0 <= idx < len(self)):
+            raise IndexError("TimeSeriesView index out of range")
+        return self._values[self._start + idx]
+
+    def __iter__(self):
+        return itertools.islice(self._values, self._start, self._stop)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, TimeSeriesView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(list(self))
+
+    ## copies and pickles are just lists
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return cp.deepcopy(list(self), memo)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _base_values(values):
+    """
+    The underlying list of values, if values is a TimeSeriesView
+    """
+    if isinstance(values, TimeSeriesView):
+        return values._values
+    return values
+
+def _isclose_values(values, other_values):
+    """
+    If the values in values and other_values are equal, up to
+    the round-off of, e.g., scaling them to p.u. and back
+    """
+    for value, other_value in zip(values, other_values):
+        if value == other_value:
+            continue
+        if isinstance(value, float) and isinstance(other_value, (int, float)) and \
+                math.isclose(value, other_value, rel_tol=1e-9, abs_tol=1e-12):
+            continue
+        return False
+    return True
+
+def _json_default(obj):
+    if isinstance(obj, TimeSeriesView):
+        return list(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
 class ModelData(object):
     @staticmethod
     def empty_model_data_dict():
@@ -153,9 +241,11 @@ class ModelData(object):
             self.data = data
         else:
             self.data = ModelData.empty_model_data_dict()
+        ## the time series lists created by splice_results, by id
+        self._spliced_values = dict()
 
     @classmethod
-    def read(cls, filename, file_type=None):
+    def read(cls, filename, file_type=None, time_window=None):
         """
         Reads data from a file into a new ModelData object
 
@@ -165,16 +255,22 @@ class ModelData(object):
             The path to the file
         file_type : None,str (optional)
             The specification of the file_type. Valid values are 'json', 'json.gz' for json-ed
-            EGRET ModelData objects, 'm' for MATPOWER files, 'dat' for Prescient data files, and
+            EGRET ModelData objects, 'egret' for the binary columnar format written by
+            :py:meth:`write`, 'm' for MATPOWER files, 'dat' for Prescient data files, and
             'pglib-uc' for json files from pglib-uc. If None, the file type is inferred from the
-            extension.
+            extension (or, for the binary columnar format, the contents of the directory).
+        time_window : None, slice, or tuple (optional)
+            Only for file_type 'egret'. If not None, only the time periods in this slice
+            (or (start, stop) tuple) of the time indices are loaded from disk.
         """
-        valid_file_types = ['json', 'json.gz', 'm', 'dat', 'pglib-uc']
+        valid_file_types = ['json', 'json.gz', 'egret', 'm', 'dat', 'pglib-uc']
         if file_type is not None and file_type not in valid_file_types:
             raise Exception("Unrecognized file_type {}. Valid file types are {}".format(file_type, valid_file_types))
         elif file_type is None:
             ## identify the file type
-            if filename[-5:] == '.json':
+            if os.path.isdir(filename):
+                file_type = 'egret'
+            elif filename[-5:] == '.json':
                 file_type = 'json'
             elif filename[-8:] == '.json.gz':
                 file_type = 'json.gz'
@@ -185,10 +281,16 @@ class ModelData(object):
             else:
                 raise Exception("Could not infer type of file {} from its extension!".format(filename))
 
+        if time_window is not None and file_type != 'egret':
+            raise Exception("time_window is only supported for file_type 'egret', not {}".format(file_type))
+
         if file_type == 'json':
             import json
             with open(filename) as f:
                 data = json.load(f)
+        elif file_type == 'egret':
+            from egret.data.binary_format import create_model_data_dict
+            data = create_model_data_dict(filename, time_window=time_window)
         elif file_type == 'json.gz':
             import json
             import gzip
@@ -297,26 +399,76 @@ class ModelData(object):
 
         return retdict
 
-    def clone(self):
+    def columns(self, element_type, **kwargs):
+        """
+        Returns a columnar view of the modeling elements of a particular element type
+        (and, if requested, other sub-attributes), in which each attribute is stored as
+        a numpy array and each time series as a 2-D (element x time) numpy array.
+
+        This is built from the underlying dictionary in a single pass, and is not
+        updated if the dictionary is later modified.
+
+        Parameters
+        ----------
+        element_type : str
+           Desired element type.
+        **kwargs : key=str named arguments
+           Additional arguments provides key=value pairs to test on each element.
+
+        Returns
+        -------
+            egret.data.columnar.ElementColumns
+        """
+        from egret.data.columnar import ElementColumns
+        return ElementColumns(dict(self.elements(element_type=element_type, **kwargs)))
+
+    def clone(self, deep=True):
         """
         Create a copy of this ModelData object using a deep copy on the underlying dictionary
 
+        Parameters
+        ----------
+        deep : bool (optional)
+            If False, only the dictionaries in the underlying dictionary are
+            copied, and the other values (e.g., the lists of time series values)
+            are shared with this ModelData object. This is much faster for large
+            time series, but attributes of the copy must then be replaced instead
+            of modified in place, e.g.,
+
+            >>> element['p_load']['values'] = new_values  # doctest: +SKIP
+
+            rather than ``element['p_load']['values'][t] = new_value``, as
+            the model builders do. Default is True.
+
         Returns
         -------
             ModelData
         """
-        return ModelData(cp.deepcopy(self.data))
+        if deep:
+            return ModelData(cp.deepcopy(self.data))
+        ## the copy shares the lists splice_results would write into
+        self._spliced_values.clear()
+        return ModelData(_copy_dicts(self.data))
 
-    def clone_in_service(self):
+    def clone_in_service(self, deep=True):
         """
         Create a copy of this ModelData object using a deep copy on the underlying dictionary,
         only returning the elements for which the in_service flag is not set to False
 
+        Parameters
+        ----------
+        deep : bool (optional)
+            If False, only the dictionaries are copied, as in :py:meth:`clone`.
+            Default is True.
+
         Returns
         -------
             ModelData
         """
-        return ModelData(_copy_only_in_service(self.data))
+        if not deep:
+            ## the copy shares the lists splice_results would write into
+            self._spliced_values.clear()
+        return ModelData(_copy_only_in_service(self.data, deep))
 
     def clone_at_timestamp(self, timestamp):
         """
@@ -377,6 +529,102 @@ class ModelData(object):
 
         return mdclone
 
+    def slice_time(self, start, stop):
+        """
+        Create a copy of this ModelData object for the time periods with index
+        start, start+1, ..., stop-1, e.g., for a single window of a rolling-horizon
+        simulation.
+
+        As with :py:meth:`clone` with deep=False, only the dictionaries are copied.
+        The values of every time series (recognized by "data_type"="time_series") are
+        replaced by a read-only :py:class:`TimeSeriesView` of the original values over
+        the requested range, and data['system']['time_indices'] is sliced to match.
+
+        Parameters
+        ----------
+        start : int
+            The index of the first time period in the window
+        stop : int
+            One past the index of the last time period in the window
+
+        Returns
+        -------
+            ModelData
+        """
+        time_indices = self.data['system']['time_indices']
+        start, stop, _ = slice(start, stop).indices(len(time_indices))
+
+        ## the views share the lists splice_results would write into
+        self._spliced_values.clear()
+        mdslice = ModelData(_slice_time_series(self.data, start, stop))
+        mdslice.data['system']['time_indices'] = list(time_indices[start:stop])
+
+        return mdslice
+
+    def splice_results(self, model_data_window, start=None):
+        """
+        Writes the time series in model_data_window, e.g., the results of solving
+        a ModelData object from :py:meth:`slice_time`, back into this ModelData object
+        at the time periods starting from the index start. Time series which this
+        ModelData object already has with the same values over the window (up to
+        round-off, e.g., the input data after scaling to p.u. and back) are skipped,
+        and time series this ModelData object does not have are created, with the values
+        outside the window set to None.
+
+        The first time a time series is written, its values are copied into a new list,
+        as they may be shared with other ModelData objects; later calls write into that
+        list in place, so splicing every window of a long horizon is linear in its length.
+        Once that list is shared in turn (by :py:meth:`clone` or :py:meth:`clone_in_service`
+        with deep=False, or by :py:meth:`slice_time`), the next call copies it again.
+
+        Parameters
+        ----------
+        model_data_window : ModelData
+            The ModelData object for the window
+        start : int or None (optional)
+            The index of the first time period of model_data_window in this ModelData
+            object. If None, it is found from data['system']['time_indices'].
+        """
+        time_indices = self.data['system']['time_indices']
+        if start is None:
+            start = time_indices.index(model_data_window.data['system']['time_indices'][0])
+        num_time_periods = len(time_indices)
+
+        spliced_values = self._spliced_values
+
+        def _splice(node, window_node):
+            for key, att in window_node.items():
+                if not isinstance(att, dict):
+                    continue
+                if 'data_type' in att and att['data_type'] == 'time_series':
+                    values = att['values']
+                    stop = start+len(values)
+                    old_att = node.get(key)
+                    old_values = None
+                    if isinstance(old_att, dict) and old_att.get('data_type') == 'time_series':
+                        old_values = old_att['values']
+                        if id(old_values) not in spliced_values:
+                            ## the window still has the original data
+                            if _base_values(values) is _base_values(old_values) or \
+                                    _isclose_values(values, itertools.islice(old_values, start, stop)):
+                                continue
+                            new_values = list(old_values)
+                        else:
+                            new_values = old_values
+                    else:
+                        new_values = [ None for _ in range(num_time_periods) ]
+                    new_values[start:stop] = values
+                    if new_values is not old_values:
+                        spliced_values[id(new_values)] = new_values
+                        node[key] = {'data_type':'time_series', 'values':new_values}
+                elif 'data_type' not in att:
+                    if key not in node or not isinstance(node[key], dict):
+                        continue
+                    _splice(node[key], att)
+
+        _splice(self.data['elements'], model_data_window.data['elements'])
+        _splice(self.data['system'], model_data_window.data['system'])
+
     def write(self, filename, file_type=None):
         """
         Dumps the ModelData object dict to the specified file.
@@ -389,8 +637,11 @@ class ModelData(object):
         file_type : None
             If specified, the encoding used when writing the file.
             If None, it will be inferred from the file extension.
+            The file_type 'egret' (extension '.egret') writes a
+            directory in the binary columnar format of
+            :py:mod:`egret.data.binary_format`.
         """
-        valid_file_types = ['json', 'json.gz']
+        valid_file_types = ['json', 'json.gz', 'egret']
         if file_type is not None and file_type not in valid_file_types:
             raise Exception("Unrecognized file_type {}. Valid file types are {}".format(file_type, valid_file_types))
         elif file_type is None:
@@ -398,6 +649,8 @@ class ModelData(object):
                 file_type = 'json'
             elif filename[-8:] == '.json.gz':
                 file_type = 'json.gz'
+            elif filename[-6:] == '.egret':
+                file_type = 'egret'
             else:
                 logger.warning("Unrecognized file_type for file {} in ModelData.write, using 'json'".format(filename))
                 file_type = 'json'
@@ -405,12 +658,15 @@ class ModelData(object):
         if file_type == 'json':
             import json
             with open(filename,'w') as f:
-                json.dump(self.data, f)
+                json.dump(self.data, f, default=_json_default)
         elif file_type == 'json.gz':
             import json
             import gzip
             with gzip.open(filename, 'wt') as f:
-                json.dump(self.data, f)
+                json.dump(self.data, f, default=_json_default)
+        elif file_type == 'egret':
+            from egret.data.binary_format import write_model_data_dict
+            write_model_data_dict(self.data, filename)
         logger.debug("ModelData written to {}".format(filename))
 
     def _recurse_into_timestamp(self, old_node, time_index):
@@ -439,7 +695,30 @@ def map_items(func, d):
 def zip_items(dict_lb, dict_ub):
     return {k: (dict_lb[k], dict_ub[k]) for k in dict_lb.keys()}
 
-def _copy_only_in_service(data_dict):
+def _slice_time_series(node, start, stop):
+    """
+    Copies every dictionary in node, replacing the time series
+    values by views over start:stop and sharing the other values
+    """
+    new_node = dict()
+    for key, att in node.items():
+        if isinstance(att, dict):
+            if 'data_type' in att and att['data_type'] == 'time_series':
+                new_node[key] = {'data_type':'time_series', 'values':TimeSeriesView(att['values'], start, stop)}
+            else:
+                new_node[key] = _slice_time_series(att, start, stop)
+        else:
+            new_node[key] = att
+    return new_node
+
+def _copy_dicts(node):
+    """
+    Copies every dictionary in node, sharing the other values
+    """
+    return { key : (_copy_dicts(att) if isinstance(att, dict) else att) for key, att in node.items() }
+
+def _copy_only_in_service(data_dict, deep=True):
+    copy = cp.deepcopy if deep else _copy_dicts
     new_dd = dict()
     for key, value in data_dict.items():
         if key == 'elements':
@@ -453,8 +732,12 @@ def _copy_only_in_service(data_dict):
                     if 'in_service' in element and (not element['in_service']):
                         continue
                     else:
-                        new_element_dict[element_name] = cp.deepcopy(element)
-        else:
+                        new_element_dict[element_name] = copy(element)
+        elif deep:
             new_dd[key] = cp.deepcopy(value)
+        elif isinstance(value, dict):
+            new_dd[key] = _copy_dicts(value)
+        else:
+            new_dd[key] = value
     return new_dd
 
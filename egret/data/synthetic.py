@@ -0,0 +1,475 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+"""
+This module creates synthetic unit commitment instances of any size, for
+stress testing and benchmarking. The instances are deterministic given the
+seed, so runs on the same instance can be compared.
+
+The network is built by placing the buses at random in the unit square,
+connecting each bus to its nearest predecessor (a radial backbone), and
+then meshing it by adding branches between nearby buses which are not yet
+connected. Branch ratings are set from the flows of a nominal dispatch at
+peak load, so some branches will be congested. The thermal fleet is drawn
+from a few technology classes (nuclear, coal, combined cycle, combustion
+turbine) with convex cost curves, and is scaled to a reserve margin over
+the peak load. Loads follow a daily profile, wind has an autocorrelated
+capacity factor, and solar follows the sun.
+"""
+import math
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg
+
+from egret.data.model_data import ModelData
+
+## name, fuel, share of the fleet, p_max range (MW), p_min as a fraction of p_max,
+## hourly ramp rate as a fraction of p_max, min up/down time (hours),
+## marginal cost range ($/MWh), no-load cost ($/h per MW), startup cost ($/MW)
+_THERMAL_CLASSES = [
+    ('NUC', 'N', 0.05, (800., 1200.), 0.90, 0.10, 24, (5., 10.), 1.0, 150.),
+    ('COAL', 'C', 0.25, (200., 700.), 0.40, 0.30, 8, (20., 30.), 2.0, 60.),
+    ('CC', 'G', 0.35, (150., 500.), 0.35, 0.60, 4, (25., 40.), 2.5, 30.),
+    ('CT', 'O', 0.35, (20., 150.), 0.30, 1.00, 1, (45., 90.), 3.0, 10.),
+]
+
+_KV_LEVELS = (345., 230., 138.)
+_KV_SHARES = (0.1, 0.3, 0.6)
+
+def _time_series(values):
+    return { 'data_type' : 'time_series', 'values' : values }
+
+def _hours(num_time_periods, time_period_length_minutes):
+    return (np.arange(num_time_periods) * time_period_length_minutes / 60.) % 24.
+
+def _load_profile(hours):
+    ## a morning shoulder and an evening peak, normalized to a peak of 1
+    profile = 0.6 + 0.15*np.exp(-((hours-9.)/3.)**2) + 0.35*np.exp(-((hours-18.)/3.5)**2)
+    return profile / profile.max()
+
+def _solar_profile(hours):
+    return np.clip(np.sin(np.pi*(hours-6.)/12.), 0., None)
+
+def _wind_profile(rng, num_time_periods, mean):
+    ## AR(1) capacity factor around mean
+    cf = np.empty(num_time_periods)
+    x = mean
+    for t in range(num_time_periods):
+        x = mean + 0.9*(x - mean) + 0.08*rng.randn()
+        cf[t] = x
+    return np.clip(cf, 0., 1.)
+
+def _build_topology(rng, num_buses, num_branches):
+    '''
+    returns the bus coordinates and a list of (from, to) pairs;
+    the first num_buses-1 pairs form a radial (tree) backbone
+    '''
+    xy = rng.rand(num_buses, 2)
+    pairs = list()
+    connected = set()
+    for i in range(1, num_buses):
+        dist = np.hypot(*(xy[:i] - xy[i]).T)
+        j = int(np.argmin(dist))
+        pairs.append((j, i))
+        connected.add((j, i))
+
+    ## mesh the network with branches to nearby buses
+    k_nearest = min(num_buses-1, 6)
+    attempts = 0
+    while len(pairs) < num_branches and attempts < 20*num_branches:
+        attempts += 1
+        i = rng.randint(num_buses)
+        dist = np.hypot(*(xy - xy[i]).T)
+        candidates = np.argsort(dist)[1:k_nearest+1]
+        j = int(candidates[rng.randint(len(candidates))])
+        pair = (min(i,j), max(i,j))
+        if pair in connected:
+            continue
+        pairs.append(pair)
+        connected.add(pair)
+
+    return xy, pairs
+
+def _nominal_flows(num_buses, pairs, reactance, injections, reference):
+    '''
+    DC power flow on the branches for the bus injections
+    '''
+    num_branches = len(pairs)
+    if num_branches == 0:
+        return np.zeros(0)
+    rows = np.repeat(np.arange(num_branches), 2)
+    cols = np.array(pairs).ravel()
+    vals = np.tile([1., -1.], num_branches)
+    A = sp.csr_matrix((vals, (rows, cols)), shape=(num_branches, num_buses))
+    Bd = sp.diags(1./reactance)
+    B = (A.T.dot(Bd).dot(A)).tocsc()
+
+    keep = np.array([ b for b in range(num_buses) if b != reference ], dtype=int)
+    theta = np.zeros(num_buses)
+    if len(keep) > 0:
+        theta[keep] = scipy.sparse.linalg.spsolve(B[keep][:,keep].tocsc(), injections[keep])
+    return Bd.dot(A.dot(theta))
+
+def _piecewise_cost(p_min, p_max, no_load, marginal_cost, num_segments=3):
+    points = np.linspace(p_min, p_max, num_segments+1)
+    ## increasing marginal costs, so the curve is convex
+    costs = [ no_load + marginal_cost*p_min ]
+    for k in range(num_segments):
+        costs.append(costs[-1] + marginal_cost*(1.+0.1*k)*(points[k+1]-points[k]))
+    return { 'data_type' : 'cost_curve',
+             'cost_curve_type' : 'piecewise',
+             'values' : [ [float(p), float(c)] for p, c in zip(points, costs) ],
+           }
+
+def _polynomial_cost(p_max, no_load, marginal_cost):
+    return { 'data_type' : 'cost_curve',
+             'cost_curve_type' : 'polynomial',
+             'values' : { 0 : float(no_load), 1 : float(marginal_cost), 2 : float(0.05*marginal_cost/p_max) },
+           }
+
+def create_model_data_dict(num_buses=30,
+                           num_branches=None,
+                           num_thermal=None,
+                           num_wind=None,
+                           num_solar=None,
+                           num_storage=0,
+                           num_interfaces=0,
+                           num_areas=1,
+                           num_zones=0,
+                           num_time_periods=24,
+                           time_period_length_minutes=60,
+                           peak_load=None,
+                           reserve_margin=1.2,
+                           cost_curve_type='piecewise',
+                           seed=0):
+    '''
+    Creates a synthetic unit commitment model_data dictionary
+
+    Parameters
+    ----------
+    num_buses : int (optional)
+        Number of buses. Default is 30.
+    num_branches : int (optional)
+        Number of branches, at least num_buses-1. If num_buses-1, the
+        network is radial. Default is 1.5*num_buses (meshed).
+    num_thermal : int (optional)
+        Number of thermal generators. Default is num_buses/3.
+    num_wind : int (optional)
+        Number of wind generators. Default is num_buses/10.
+    num_solar : int (optional)
+        Number of solar generators. Default is num_buses/10.
+    num_storage : int (optional)
+        Number of storage units. Default is 0.
+    num_interfaces : int (optional)
+        Number of interfaces, each the set of branches crossing
+        a vertical cut of the network. Default is 0.
+    num_areas : int (optional)
+        Number of areas with a spinning reserve requirement. Default is 1.
+    num_zones : int (optional)
+        Number of zones with a spinning reserve requirement. Like the
+        areas, the zones are vertical strips of the network, so they
+        need not nest within the areas. Default is 0.
+    num_time_periods : int (optional)
+        Number of time periods. Default is 24.
+    time_period_length_minutes : int (optional)
+        Length of each time period. Default is 60.
+    peak_load : float (optional)
+        System peak load in MW. Default is 100 MW per bus.
+    reserve_margin : float (optional)
+        Thermal capacity as a multiple of the peak load. Default is 1.2.
+    cost_curve_type : str (optional)
+        'piecewise' (the default) or 'polynomial' production cost curves
+    seed : int (optional)
+        Seed for the random number generator. Default is 0.
+
+    Returns
+    -------
+        dict : a model_data dictionary
+    '''
+    if num_buses < 1:
+        raise ValueError("num_buses must be positive, num_buses={}".format(num_buses))
+    if num_branches is None:
+        num_branches = int(round(1.5*num_buses)) if num_buses > 2 else num_buses-1
+    if num_branches < num_buses-1:
+        raise ValueError("num_branches must be at least num_buses-1 for a connected network, num_branches={}".format(num_branches))
+    if num_thermal is None:
+        num_thermal = max(1, num_buses//3)
+    if num_wind is None:
+        num_wind = num_buses//10
+    if num_solar is None:
+        num_solar = num_buses//10
+    if peak_load is None:
+        peak_load = 100.*num_buses
+    if cost_curve_type not in ('piecewise', 'polynomial'):
+        raise ValueError("cost_curve_type must be 'piecewise' or 'polynomial', cost_curve_type={}".format(cost_curve_type))
+
+    rng = np.random.RandomState(seed)
+
+    T = num_time_periods
+    hours = _hours(T, time_period_length_minutes)
+    time_indices = [ str(t+1) for t in range(T) ]
+
+    ## buses
+    xy, pairs = _build_topology(rng, num_buses, num_branches)
+    bus_names = [ 'bus{}'.format(i+1) for i in range(num_buses) ]
+    bus_kv = rng.choice(_KV_LEVELS, size=num_buses, p=_KV_SHARES)
+    reference = 0
+
+    ## areas and zones are vertical strips of the unit square
+    bus_area = np.minimum((xy[:,0]*num_areas).astype(int), num_areas-1)
+    if num_zones > 0:
+        bus_zone = np.minimum((xy[:,0]*num_zones).astype(int), num_zones-1)
+
+    buses = dict()
+    for i, b in enumerate(bus_names):
+        buses[b] = { 'base_kv' : float(bus_kv[i]),
+                     'matpower_bustype' : 'ref' if i == reference else 'PQ',
+                     'vm' : 1.0,
+                     'va' : 0.0,
+                     'area' : 'area{}'.format(bus_area[i]+1),
+                   }
+        if num_zones > 0:
+            buses[b]['zone'] = 'zone{}'.format(bus_zone[i]+1)
+
+    ## loads, at about two thirds of the buses
+    load_profile = _load_profile(hours)
+    load_buses = [ i for i in range(num_buses) if rng.rand() < 0.67 ] or [0]
+    load_share = rng.gamma(2., size=len(load_buses))
+    load_share /= load_share.sum()
+
+    loads = dict()
+    bus_peak_load = np.zeros(num_buses)
+    system_load = np.zeros(T)
+    for i, share in zip(load_buses, load_share):
+        p_load = peak_load*share*load_profile*(1. + 0.02*rng.randn(T))
+        bus_peak_load[i] = peak_load*share
+        system_load += p_load
+        loads[bus_names[i]] = { 'bus' : bus_names[i],
+                                'in_service' : True,
+                                'p_load' : _time_series(p_load.tolist()),
+                              }
+
+    ## renewables
+    generators = dict()
+    renewable_capacity = 0.2*peak_load
+    num_renewable = num_wind + num_solar
+    renewable_output = np.zeros(T)
+    renewable_nominal = np.zeros(num_buses)
+    for k in range(num_renewable):
+        wind = k < num_wind
+        i = rng.randint(num_buses)
+        capacity = renewable_capacity/num_renewable*rng.uniform(0.5, 1.5)
+        if wind:
+            cf = _wind_profile(rng, T, rng.uniform(0.25, 0.45))
+            name = 'wind{}'.format(k+1)
+        else:
+            cf = _solar_profile(hours)*rng.uniform(0.7, 1.0)
+            name = 'solar{}'.format(k-num_wind+1)
+        p_max = capacity*cf
+        renewable_output += p_max
+        renewable_nominal[i] += p_max.mean()
+        generators[name] = { 'generator_type' : 'renewable',
+                             'bus' : bus_names[i],
+                             'fuel' : 'W' if wind else 'S',
+                             'in_service' : True,
+                             'p_min' : _time_series([0.]*T),
+                             'p_max' : _time_series(p_max.tolist()),
+                             'area' : buses[bus_names[i]]['area'],
+                           }
+
+    ## thermal generators, by class
+    class_counts = [ int(math.floor(share*num_thermal)) for _, _, share, *_ in _THERMAL_CLASSES ]
+    ## give any remainder to the peakers
+    class_counts[-1] += num_thermal - sum(class_counts)
+
+    thermal = list()
+    for (cls, fuel, _, p_max_range, p_min_frac, ramp_frac, min_ud, mc_range, no_load_per_mw, su_per_mw), count \
+            in zip(_THERMAL_CLASSES, class_counts):
+        for _ in range(count):
+            thermal.append({ 'class' : cls,
+                             'fuel' : fuel,
+                             'p_max' : rng.uniform(*p_max_range),
+                             'p_min_frac' : p_min_frac,
+                             'ramp_frac' : ramp_frac,
+                             'min_ud' : min_ud,
+                             'marginal_cost' : rng.uniform(*mc_range),
+                             'no_load_per_mw' : no_load_per_mw,
+                             'su_per_mw' : su_per_mw,
+                             'bus' : rng.randint(num_buses),
+                           })
+
+    ## scale the fleet to the reserve margin
+    scale = reserve_margin*peak_load / sum(g['p_max'] for g in thermal)
+
+    ## commit in merit order at t=0
+    merit_order = sorted(range(len(thermal)), key=lambda k : thermal[k]['marginal_cost'])
+    net_load_0 = max(system_load[0] - renewable_output[0], 0.)
+    committed_capacity = 0.
+    for k in merit_order:
+        g = thermal[k]
+        g['p_max'] *= scale
+        g['p_min'] = g['p_min_frac']*g['p_max']
+        g['on'] = committed_capacity < 1.1*net_load_0 or g['class'] == 'NUC'
+        if g['on']:
+            committed_capacity += g['p_max']
+    ## dispatch the committed units in merit order at t=0
+    remaining = net_load_0 - sum(g['p_min'] for g in thermal if g['on'])
+    for k in merit_order:
+        g = thermal[k]
+        if not g['on']:
+            g['p_0'] = 0.
+            continue
+        extra = min(max(remaining, 0.), g['p_max']-g['p_min'])
+        g['p_0'] = g['p_min'] + extra
+        remaining -= extra
+
+    thermal_injection = np.zeros(num_buses)
+    for k, g in enumerate(thermal):
+        p_max = g['p_max']
+        p_min = g['p_min']
+        ramp = max(g['ramp_frac']*p_max, 1.)
+        min_ud = g['min_ud']
+        marginal_cost = g['marginal_cost']
+        no_load = g['no_load_per_mw']*p_max
+        hot_start = g['su_per_mw']*p_max
+        thermal_injection[g['bus']] += p_max/reserve_margin
+
+        gen = { 'generator_type' : 'thermal',
+                'bus' : bus_names[g['bus']],
+                'fuel' : g['fuel'],
+                'in_service' : True,
+                'p_min' : float(p_min),
+                'p_max' : float(p_max),
+                'ramp_up_60min' : float(ramp),
+                'ramp_down_60min' : float(ramp),
+                'startup_capacity' : float(min(p_min + ramp/2., p_max)),
+                'shutdown_capacity' : float(min(p_min + ramp/2., p_max)),
+                'min_up_time' : min_ud,
+                'min_down_time' : min_ud,
+                'initial_status' : min_ud if g['on'] else -min_ud,
+                'initial_p_output' : float(g['p_0']),
+                'startup_cost' : [ [min_ud, float(hot_start)],
+                                   [min_ud+4, float(1.5*hot_start)],
+                                   [min_ud+12, float(2.*hot_start)] ],
+                'shutdown_cost' : 0.,
+                'area' : buses[bus_names[g['bus']]]['area'],
+                'zone' : buses[bus_names[g['bus']]].get('zone', 'None'),
+              }
+        if cost_curve_type == 'piecewise':
+            gen['p_cost'] = _piecewise_cost(p_min, p_max, no_load, marginal_cost)
+        else:
+            gen['p_cost'] = _polynomial_cost(p_max, no_load, marginal_cost)
+        generators['{}_{}'.format(g['class'], k+1)] = gen
+
+    ## storage
+    storage = dict()
+    for k in range(num_storage):
+        i = rng.randint(num_buses)
+        power = 0.05*peak_load/max(num_storage,1)*rng.uniform(0.5, 1.5)
+        storage['storage{}'.format(k+1)] = { 'bus' : bus_names[i],
+                                             'in_service' : True,
+                                             'energy_capacity' : float(4.*power),
+                                             'max_discharge_rate' : float(power),
+                                             'max_charge_rate' : float(power),
+                                             'ramp_up_output_60min' : float(power),
+                                             'ramp_down_output_60min' : float(power),
+                                             'ramp_up_input_60min' : float(power),
+                                             'ramp_down_input_60min' : float(power),
+                                             'charge_efficiency' : 0.9,
+                                             'retention_rate_60min' : 0.999,
+                                             'initial_state_of_charge' : 0.5,
+                                           }
+
+    ## branches, with reactance by length and ratings
+    ## from the flows of a nominal peak dispatch
+    branch_kv = np.array([ min(bus_kv[i], bus_kv[j]) for i, j in pairs ])
+    length = np.array([ np.hypot(*(xy[i]-xy[j])) for i, j in pairs ])
+    reactance = np.maximum(length, 0.01) * (0.1*345./branch_kv) * rng.uniform(0.8, 1.2, size=len(pairs))
+
+    injections = thermal_injection + renewable_nominal - bus_peak_load
+    ## balance at the reference bus
+    injections[reference] -= injections.sum()
+    flows = _nominal_flows(num_buses, pairs, reactance, injections/100., reference)*100.
+    min_rating = 0.02*peak_load
+    rating = np.maximum(np.abs(flows)*rng.uniform(0.9, 2.0, size=len(pairs)), min_rating)
+
+    branch_names = [ 'branch{}'.format(l+1) for l in range(len(pairs)) ]
+    branches = dict()
+    for l, (i, j) in enumerate(pairs):
+        branches[branch_names[l]] = { 'from_bus' : bus_names[i],
+                                      'to_bus' : bus_names[j],
+                                      'in_service' : True,
+                                      'branch_type' : 'line',
+                                      'resistance' : 0.,
+                                      'reactance' : float(reactance[l]),
+                                      'charging_susceptance' : 0.,
+                                      'rating_long_term' : float(rating[l]),
+                                      'rating_emergency' : float(1.2*rating[l]),
+                                      'angle_diff_min' : -90.,
+                                      'angle_diff_max' : 90.,
+                                    }
+
+    ## interfaces, the branches crossing vertical cuts
+    interfaces = dict()
+    for k in range(num_interfaces):
+        cut = (k+1.)/(num_interfaces+1.)
+        lines = list()
+        orientation = list()
+        for l, (i, j) in enumerate(pairs):
+            if (xy[i,0] < cut) != (xy[j,0] < cut):
+                lines.append(branch_names[l])
+                orientation.append(1 if xy[i,0] < cut else -1)
+        if not lines:
+            continue
+        limit = 0.8*sum(branches[l]['rating_long_term'] for l in lines)
+        interfaces['interface{}'.format(k+1)] = { 'lines' : lines,
+                                                  'line_orientation' : orientation,
+                                                  'maximum_limit' : float(limit),
+                                                  'minimum_limit' : float(-limit),
+                                                  'violation_penalty' : 1000.,
+                                                }
+
+    ## reserve requirements
+    areas = dict()
+    for a in range(num_areas):
+        area_load = sum(np.array(loads[bus_names[i]]['p_load']['values']) for i in load_buses if bus_area[i] == a)
+        areas['area{}'.format(a+1)] = { 'spinning_reserve_requirement' : _time_series((0.03*np.asarray(area_load)*np.ones(T)).tolist()) }
+    zones = dict()
+    for z in range(num_zones):
+        zone_load = sum(np.array(loads[bus_names[i]]['p_load']['values']) for i in load_buses if bus_zone[i] == z)
+        zones['zone{}'.format(z+1)] = { 'spinning_reserve_requirement' : _time_series((0.02*np.asarray(zone_load)*np.ones(T)).tolist()) }
+
+    system = { 'time_indices' : time_indices,
+               'time_period_length_minutes' : time_period_length_minutes,
+               'load_mismatch_cost' : 1000.,
+               'reserve_shortfall_cost' : 1000.,
+               'baseMVA' : 100.,
+               'reference_bus' : bus_names[reference],
+               'reference_bus_angle' : 0.,
+               'reserve_requirement' : _time_series((0.05*system_load).tolist()),
+             }
+
+    return { 'system' : system,
+             'elements' : { 'bus' : buses,
+                            'load' : loads,
+                            'branch' : branches,
+                            'interface' : interfaces,
+                            'generator' : generators,
+                            'storage' : storage,
+                            'area' : areas,
+                            'zone' : zones,
+                          },
+           }
+
+def create_ModelData(**kwargs):
+    '''
+    Creates a synthetic unit commitment ModelData object; the keyword
+    arguments are those of create_model_data_dict
+    '''
+    return ModelData(create_model_data_dict(**kwargs))
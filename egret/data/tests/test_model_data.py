@@ -161,12 +161,63 @@ def test_attributes():
     }
     assert attr == attr_cmp
 
+def test_columns():
+    md = ModelData(testdata)
+
+    gen_columns = md.columns(element_type='generator')
+    assert gen_columns.names == ('G1', 'G2')
+    assert gen_columns.column('pg').tolist() == [100.0, 200.0]
+    assert gen_columns.attributes() == md.attributes(element_type='generator')
+    assert gen_columns.elements() == md.data['elements']['generator']
+
+    gen_columns = md.columns(element_type='generator', generator_type='thermal')
+    assert gen_columns.names == ('G1',)
+
+    load_columns = md.columns(element_type='load')
+    assert load_columns.is_time_series('Pl')
+    assert load_columns.time_series('Pl').tolist() == [[11.0, 111.0, 111.1]]
+    assert load_columns.time_series('Ql').tolist() == [[11.0, 11.0, 11.0]]
+    assert load_columns.time_series_dict('Pl', [1, 2, 3]) == {('L1', 1): 11.0, ('L1', 2): 111.0, ('L1', 3): 111.1}
+    assert load_columns.attributes() == md.attributes(element_type='load')
+
+    load_columns_at_time = load_columns.at_time_index(2)
+    assert load_columns_at_time.column('Pl').tolist() == [111.1]
+
+    load_columns.scale('Pl', 0.1)
+    assert load_columns.time_series('Pl')[0].tolist() == pytest.approx([1.1, 11.1, 11.11])
+    ## the underlying dictionary is not modified
+    assert md.data['elements']['load']['L1']['Pl']['values'] == [11.0, 111.0, 111.1]
+
 def test_clone():
     md = ModelData(testdata)
     cmd = md.clone()
 
     assert md.data == cmd.data
 
+def test_clone_is_deep():
+    md = ModelData(testdata)
+    cmd = md.clone()
+    icmd = md.clone_in_service()
+
+    cmd.data['elements']['load']['L1']['Pl']['values'][0] = 0.
+    icmd.data['elements']['load']['L1']['Pl']['values'][1] = 0.
+    assert md.data['elements']['load']['L1']['Pl']['values'] == [11.0, 111.0, 111.1]
+
+def test_clone_shares_values():
+    md = ModelData(testdata)
+    cmd = md.clone(deep=False)
+
+    assert cmd.data['elements']['load']['L1'] is not md.data['elements']['load']['L1']
+    assert cmd.data['elements']['load']['L1']['Pl']['values'] is md.data['elements']['load']['L1']['Pl']['values']
+
+    cmd.data['elements']['load']['L1']['Pl']['values'] = [0., 0., 0.]
+    cmd.data['elements']['generator']['G1']['pg'] = 0.
+    assert md.data['elements']['load']['L1']['Pl']['values'] == [11.0, 111.0, 111.1]
+    assert md.data['elements']['generator']['G1']['pg'] == 100.0
+
+    icmd = md.clone_in_service(deep=False)
+    assert icmd.data['elements']['load']['L1']['Pl']['values'] is md.data['elements']['load']['L1']['Pl']['values']
+
 def test_clone_at_timestamp():
     md = ModelData(testdata)
     cloned_md = md.clone_at_timestamp(2.0)
@@ -177,6 +228,60 @@ def test_clone_at_timestamp():
 
     assert cloned_md.data == comparison_md.data
 
+def test_slice_time():
+    md = ModelData(testdata)
+    md_window = md.slice_time(1, 3)
+
+    assert md_window.data['system']['time_indices'] == [1.0, 2.0]
+    assert md_window.data['elements']['load']['L1']['Pl']['values'] == [111.0, 111.1]
+    assert md_window.data['elements']['generator'] == md.data['elements']['generator']
+
+    md_point = md_window.clone_at_timeindex(1)
+    assert md_point.data['elements']['load']['L1']['Pl'] == 111.1
+
+    ## write some results for the window back
+    md_window.data['elements']['generator']['G1']['pg'] = {'data_type':'time_series', 'values':[1., 2.]}
+    md_window.data['elements']['load']['L1']['p_shed'] = {'data_type':'time_series', 'values':[0., 3.]}
+
+    md_splice = md.clone()
+    pl_values = md_splice.data['elements']['load']['L1']['Pl']['values']
+    md_splice.splice_results(md_window)
+
+    assert md_splice.data['elements']['generator']['G1']['pg']['values'] == [None, 1., 2.]
+    assert md_splice.data['elements']['load']['L1']['p_shed']['values'] == [None, 0., 3.]
+    assert md_splice.data['elements']['load']['L1']['Pl']['values'] is pl_values
+    assert md.data['elements']['generator']['G1']['pg'] == 100.0
+
+    ## the input data, with round-off from scaling to p.u. and back, is skipped
+    md_window.data['elements']['load']['L1']['Pl'] = {'data_type':'time_series', 'values':[ (v/3.)*3. for v in [111.0, 111.1] ]}
+    md_splice.splice_results(md_window)
+    assert md_splice.data['elements']['load']['L1']['Pl']['values'] is pl_values
+
+    ## the results are written in place once they are copied
+    pg_values = md_splice.data['elements']['generator']['G1']['pg']['values']
+    md_first = md.slice_time(0, 1)
+    md_first.data['elements']['generator']['G1']['pg'] = {'data_type':'time_series', 'values':[0.5]}
+    md_splice.splice_results(md_first)
+    assert md_splice.data['elements']['generator']['G1']['pg']['values'] is pg_values
+    assert pg_values == [0.5, 1., 2.]
+
+def test_splice_after_shallow_clone():
+    md = ModelData(testdata)
+    md_window = md.slice_time(1, 2)
+    md_window.data['elements']['generator']['G1']['pg'] = {'data_type':'time_series', 'values':[1.]}
+
+    md_splice = md.clone()
+    md_splice.splice_results(md_window, 0)
+    md_clone = md_splice.clone(deep=False)
+    md_slice = md_splice.slice_time(0, 2)
+
+    ## the copies keep their values when the next window is spliced
+    md_window.data['elements']['generator']['G1']['pg'] = {'data_type':'time_series', 'values':[9.]}
+    md_splice.splice_results(md_window, 1)
+    assert md_splice.data['elements']['generator']['G1']['pg']['values'] == [1., 9., None]
+    assert md_clone.data['elements']['generator']['G1']['pg']['values'] == [1., None, None]
+    assert md_slice.data['elements']['generator']['G1']['pg']['values'] == [1., None]
+
 def test_json_read_write():
     md = ModelData(testdata)
     md.write('testdata.json')
@@ -192,3 +297,29 @@ def test_json_gz_read_write():
     md_read = ModelData.read('testdata.json.gz')
 
     assert md.data == md_read.data
+
+def test_egret_read_write():
+    md = ModelData(testdata)
+    md.write('testdata.egret')
+
+    md_read = ModelData.read('testdata.egret')
+
+    assert md.data == md_read.data
+
+    md_read = ModelData.read('testdata.egret', time_window=(1,3))
+
+    assert md_read.data['system']['time_indices'] == [1.0, 2.0]
+    assert md_read.data['elements']['load']['L1']['Pl']['values'] == [111.0, 111.1]
+    assert md_read.data['elements']['generator'] == md.data['elements']['generator']
+
+def test_egret_write_slice_time():
+    md = ModelData(testdata).clone()
+    ## mixed types, so this time series is written as json
+    md.data['system']['reserve_requirement'] = {'data_type':'time_series', 'values':[1, 2.5, 'x']}
+    md.slice_time(1, 3).write('testdata_slice.egret')
+
+    md_read = ModelData.read('testdata_slice.egret')
+
+    assert md_read.data['system']['time_indices'] == [1.0, 2.0]
+    assert md_read.data['system']['reserve_requirement']['values'] == [2.5, 'x']
+    assert md_read.data['elements']['load']['L1']['Pl']['values'] == [111.0, 111.1]
@@ -0,0 +1,82 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+import pytest
+from egret.data.synthetic import create_model_data_dict, create_ModelData
+
+def _connected(data):
+    buses = data['elements']['bus']
+    neighbors = { b : set() for b in buses }
+    for branch in data['elements']['branch'].values():
+        neighbors[branch['from_bus']].add(branch['to_bus'])
+        neighbors[branch['to_bus']].add(branch['from_bus'])
+    start = next(iter(buses))
+    seen = {start}
+    stack = [start]
+    while stack:
+        for n in neighbors[stack.pop()]:
+            if n not in seen:
+                seen.add(n)
+                stack.append(n)
+    return len(seen) == len(buses)
+
+def test_synthetic_deterministic():
+    kwargs = { 'num_buses' : 40, 'num_storage' : 2, 'num_interfaces' : 2, 'num_areas' : 2, 'num_zones' : 3 }
+    assert create_model_data_dict(seed=3, **kwargs) == create_model_data_dict(seed=3, **kwargs)
+    assert create_model_data_dict(seed=3, **kwargs) != create_model_data_dict(seed=4, **kwargs)
+
+def test_synthetic_sizes():
+    data = create_model_data_dict(num_buses=50, num_branches=70, num_thermal=20, num_wind=4, num_solar=3,
+                                  num_storage=2, num_interfaces=2, num_areas=2, num_time_periods=48,
+                                  time_period_length_minutes=30)
+    elements = data['elements']
+    assert len(elements['bus']) == 50
+    assert len(elements['branch']) == 70
+    assert len(elements['storage']) == 2
+    assert len(elements['area']) == 2
+    assert 0 < len(elements['interface']) <= 2
+    gen_types = [ g['generator_type'] for g in elements['generator'].values() ]
+    assert gen_types.count('thermal') == 20
+    assert gen_types.count('renewable') == 7
+    assert len(data['system']['time_indices']) == 48
+    for load in elements['load'].values():
+        assert len(load['p_load']['values']) == 48
+    assert _connected(data)
+
+def test_synthetic_radial():
+    data = create_model_data_dict(num_buses=25, num_branches=24)
+    assert len(data['elements']['branch']) == 24
+    assert _connected(data)
+
+def test_synthetic_thermal_data():
+    data = create_model_data_dict(num_buses=30, num_thermal=15)
+    for g in data['elements']['generator'].values():
+        if g['generator_type'] != 'thermal':
+            continue
+        assert 0 <= g['p_min'] <= g['p_max']
+        if g['initial_status'] > 0:
+            assert g['p_min'] <= g['initial_p_output'] <= g['p_max']
+        else:
+            assert g['initial_p_output'] == 0.
+        assert g['startup_cost'][0][0] == g['min_down_time']
+        points = [ p for p, _ in g['p_cost']['values'] ]
+        assert points[0] == g['p_min'] and points[-1] == g['p_max']
+
+def test_synthetic_bad_arguments():
+    with pytest.raises(ValueError):
+        create_model_data_dict(num_buses=10, num_branches=5)
+    with pytest.raises(ValueError):
+        create_model_data_dict(cost_curve_type='quadratic')
+
+def test_synthetic_uc_model():
+    from egret.models.unit_commitment import create_tight_unit_commitment_model
+    md = create_ModelData(num_buses=20, num_storage=1, num_interfaces=1, num_time_periods=6)
+    model = create_tight_unit_commitment_model(md)
+    assert len(model.TimePeriods) == 6
+    assert len(model.ThermalGenerators) == 6
@@ -527,32 +527,69 @@ def get_power_flow_expr_ptdf_approx(model, branch_name, PTDF, rel_ptdf_tol=None,
     if abs_ptdf_tol is None:
         abs_ptdf_tol = 0.
 
-    const = PTDF.get_branch_phase_shift(branch_name) + PTDF.get_branch_phi_adj(branch_name)
+    ## the thresholded PTDF row is cached on the PTDF
+    ## matrix, and so shared by the models which use it
+    indices, coefs, const = PTDF.get_branch_ptdf_entries((branch_name,), abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)[0]
 
-    max_coef = PTDF.get_branch_ptdf_abs_max(branch_name)
-
-    ptdf_tol = max(abs_ptdf_tol, rel_ptdf_tol*max_coef) 
-    ## NOTE: It would be easy to hold on to the 'ptdf' dictionary here,
-    ##       if we wanted to
     m_p_nw = model.p_nw
     ## if model.p_nw is Var, we can use LinearExpression
     ## to build these dense constraints much faster
     if isinstance(m_p_nw, pe.Var):
-        coef_list = list()
-        var_list = list()
-        for bus_name, coef in PTDF.get_branch_ptdf_iterator(branch_name):
-            if abs(coef) >= ptdf_tol:
-                coef_list.append(coef)
-                var_list.append(m_p_nw[bus_name])
-
-        lin_expr_list = [const] + coef_list + var_list 
+        p_nw_list = _get_p_nw_list(model, PTDF)
+        lin_expr_list = [const] + coefs.tolist() + [ p_nw_list[j] for j in indices.tolist() ]
         expr = LinearExpression(lin_expr_list)
     else:
-        expr = quicksum( (coef*m_p_nw[bus_name] for bus_name, coef in PTDF.get_branch_ptdf_iterator(branch_name) if abs(coef) >= ptdf_tol), start=const, linear=True)
+        buses_keys = PTDF.buses_keys
+        expr = quicksum( (coef*m_p_nw[buses_keys[j]] for j, coef in zip(indices.tolist(), coefs.tolist())), start=const, linear=True)
 
     return expr
 
 
+def _get_p_nw_list(model, PTDF):
+    """
+    The list of the p_nw variables of model in the order of
+    PTDF.buses_keys, which is kept on the model so the lookup
+    is only done once
+    """
+    buses_keys, p_nw_list = getattr(model, '_p_nw_list', (None, None))
+    if buses_keys is not PTDF.buses_keys:
+        m_p_nw = model.p_nw
+        p_nw_list = [ m_p_nw[bus_name] for bus_name in PTDF.buses_keys ]
+        model._p_nw_list = (PTDF.buses_keys, p_nw_list)
+    return p_nw_list
+
+
+def get_power_flow_exprs_ptdf_approx(model, branch_names, PTDF, rel_ptdf_tol=None, abs_ptdf_tol=None):
+    """
+    Create the pyomo power flow expressions for the branches
+    branch_names. The PTDF rows not already cached on PTDF are
+    thresholded together into a sparse CSR matrix, from which the
+    coefficients of each LinearExpression are taken directly.
+    Requires model.p_nw to be a Var.
+    """
+
+    if rel_ptdf_tol is None:
+        rel_ptdf_tol = 0.
+    if abs_ptdf_tol is None:
+        abs_ptdf_tol = 0.
+
+    branch_names = list(branch_names)
+    if not branch_names:
+        return list()
+
+    entries = PTDF.get_branch_ptdf_entries(branch_names, abs_ptdf_tol=abs_ptdf_tol, rel_ptdf_tol=rel_ptdf_tol)
+
+    ## one lookup of the p_nw variables for every row
+    p_nw_list = _get_p_nw_list(model, PTDF)
+
+    exprs = list()
+    for indices, coefs, const in entries:
+        var_list = [ p_nw_list[j] for j in indices.tolist() ]
+        exprs.append(LinearExpression([const] + coefs.tolist() + var_list))
+
+    return exprs
+
+
 def declare_eq_branch_power_ptdf_approx(model, index_set, PTDF, rel_ptdf_tol=None, abs_ptdf_tol=None):
     """
     Create the equality constraints or expressions for power (from PTDF 
@@ -571,10 +608,14 @@ def declare_eq_branch_power_ptdf_approx(model, index_set, PTDF, rel_ptdf_tol=Non
         if not isinstance(m.pf, pe.Expression):
             raise Exception("Unrecognized type for m.pf", m.pf.pprint())
 
-    for branch_name in con_set:
-        expr = \
-            get_power_flow_expr_ptdf_approx(m, branch_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
+    ## if model.p_nw is Var, we can build all the
+    ## LinearExpressions at once from the PTDF matrix
+    if isinstance(m.p_nw, pe.Var):
+        exprs = get_power_flow_exprs_ptdf_approx(m, con_set, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol)
+    else:
+        exprs = (get_power_flow_expr_ptdf_approx(m, branch_name, PTDF, rel_ptdf_tol=rel_ptdf_tol, abs_ptdf_tol=abs_ptdf_tol) for branch_name in con_set)
 
+    for branch_name, expr in zip(con_set, exprs):
         if pf_is_var:
             m.eq_pf_branch[branch_name] = \
                 m.pf[branch_name] == expr
@@ -775,6 +816,18 @@ def declare_ineq_p_branch_thermal_lbub(model, index_set,
                 m.pf[branch_name] <= p_thermal_limits[branch_name]
 
 
+def declare_ineq_p_contingency_branch_thermal_lbub(model):
+    """
+    Create the (blank) inequality constraints for the post-contingency
+    branch thermal limits, indexed by (contingency, branch). There is one
+    for every pair of branches, so these are only populated lazily.
+    """
+    m = model
+
+    m.ineq_pf_contingency_branch_thermal_lb = pe.Constraint(pe.Any)
+    m.ineq_pf_contingency_branch_thermal_ub = pe.Constraint(pe.Any)
+
+
 def declare_ineq_angle_diff_branch_lbub(model, index_set,
                                         branches,
                                         coordinate_type=CoordinateType.POLAR):
@@ -816,7 +869,8 @@ def declare_ineq_p_interface_lbub(model, index_set, interfaces):
     Create the inequality constraints for the interface limits
     based on the power variables or expressions.
 
-    p_interface_limits should be (lower, upper) tuple
+    p_interface_limits should be (lower, upper) tuple. If interfaces
+    is None, the constraints are declared but not populated
     """
     m = model
     con_set = decl.declare_set('_con_ineq_p_interface_lbub',
@@ -825,6 +879,9 @@ def declare_ineq_p_interface_lbub(model, index_set, interfaces):
     m.ineq_pf_interface_lb = pe.Constraint(con_set)
     m.ineq_pf_interface_ub = pe.Constraint(con_set)
 
+    if interfaces is None:
+        return
+
     slacks_pos = hasattr(m, 'pfi_slack_pos')
     slacks_neg = hasattr(m, 'pfi_slack_neg')
     if slacks_pos != slacks_neg:
@@ -12,8 +12,10 @@ This module collects some helper functions useful for performing
 different computations for transmission models
 """
 import math
+import threading
 import numpy as np
 import scipy as sp
+import scipy.sparse.linalg
 from math import cos, sin
 from egret.model_library.defn import BasePointType, ApproximationType
 from egret.common.log import logger
@@ -548,7 +550,361 @@ def _calculate_pfl_constant(branches,buses,index_set_branch,base_point=BasePoint
     return pfl_constant
 
 
-def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.FLATSTART,sparse_index_set_branch=None,mapping_bus_to_idx=None):
+class SensitivityFactorization(object):
+    '''
+    Sparse LU factorization of the network matrix M = A@J (or A@J + 0.5*AA@L
+    when considering losses) with the reference bus row and column removed.
+
+    Solving against this factorization is equivalent to multiplying by the
+    bus-by-bus block of the inverse of the bordered matrix J0 used in the
+    dense calculation, whose reference bus row and column are zero.
+    '''
+    def __init__(self, M, ref_bus_idx):
+        self.len_bus = M.shape[0]
+        self.ref_bus_idx = ref_bus_idx
+
+        non_ref_mask = np.ones(self.len_bus, dtype=bool)
+        non_ref_mask[ref_bus_idx] = False
+        self._non_ref_idx = np.nonzero(non_ref_mask)[0]
+
+        M = M.tocsr()
+        self._M_reduced = M[self._non_ref_idx][:,self._non_ref_idx].tocsc()
+        self._factorize()
+
+    def _factorize(self):
+        ## SuperLU objects are not thread-safe, so the
+        ## solves against them are serialized
+        self._lock = threading.Lock()
+        if self._M_reduced.shape[0] == 0:
+            self._lu = None
+        else:
+            self._lu = sp.sparse.linalg.splu(self._M_reduced)
+
+    ## SuperLU objects cannot be pickled, so we refactorize when loaded
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lu']
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._factorize()
+
+    def _solve(self, b, trans):
+        b = np.asarray(b, dtype=float)
+        x = np.zeros(b.shape)
+        if self._lu is not None:
+            with self._lock:
+                x[self._non_ref_idx] = self._lu.solve(np.ascontiguousarray(b[self._non_ref_idx]), trans=trans)
+        return x
+
+    def solve(self, b):
+        '''
+        Solves M x = b for x, with the reference bus angle fixed at 0.
+        b can be a vector of length len_bus or a (len_bus, k) array.
+        '''
+        return self._solve(b, 'N')
+
+    def solve_transpose(self, b):
+        '''
+        Solves M^T x = b for x, with the reference bus angle fixed at 0.
+        b can be a vector of length len_bus or a (len_bus, k) array.
+        '''
+        return self._solve(b, 'T')
+
+    def sensitivity(self, J, batch_size=512):
+        '''
+        Calculates the dense matrix J@SENSI, where SENSI is the
+        inverse of the reduced network matrix, by batched
+        triangular solves against the factorization
+
+        Parameters
+        ----------
+        J: scipy.sparse matrix
+            The (row x bus) matrix to multiply (e.g., J11 or L11)
+        batch_size: int
+            The number of rows of J to solve for simultaneously
+        '''
+        J = J.tocsr()
+        _len_row = J.shape[0]
+        SENS = np.empty((_len_row, self.len_bus))
+        for start in range(0, _len_row, batch_size):
+            stop = min(start+batch_size, _len_row)
+            SENS[start:stop] = self.solve_transpose(J[start:stop].T.toarray()).T
+        return SENS
+
+    def sparse_sensitivity(self, J, abs_tol, rel_tol, dtype=np.float64, batch_size=512):
+        '''
+        Calculates J@SENSI as in sensitivity, but thresholds each
+        batch of rows with sparsify_sensitivity as it is calculated,
+        so the dense matrix is never held in memory
+
+        Parameters
+        ----------
+        J: scipy.sparse matrix
+            The (row x bus) matrix to multiply (e.g., J11 or L11)
+        abs_tol: float
+            The absolute threshold for the entries
+        rel_tol: float
+            The threshold for the entries relative to the largest
+            (in magnitude) entry in their row
+        dtype: numpy dtype
+            The dtype of the returned matrix
+        batch_size: int
+            The number of rows of J to solve for simultaneously
+        '''
+        J = J.tocsr()
+        _len_row = J.shape[0]
+        SENS = [ sp.sparse.csr_matrix((0, self.len_bus), dtype=dtype) ]
+        for start in range(0, _len_row, batch_size):
+            stop = min(start+batch_size, _len_row)
+            SENS.append(sparsify_sensitivity(self.solve_transpose(J[start:stop].T.toarray()).T, abs_tol, rel_tol, dtype))
+        return sp.sparse.vstack(SENS, format='csr')
+
+
+def sparsify_sensitivity(SENS, abs_tol, rel_tol, dtype=np.float64):
+    '''
+    Drops the entries of each row of the dense matrix SENS with magnitude
+    below max(abs_tol, rel_tol*(the largest magnitude in the row)), which
+    is the threshold used when building PTDF power flow expressions,
+    and returns the result as a scipy.sparse.csr_matrix of dtype
+    '''
+    abs_SENS = np.abs(SENS)
+    tols = np.maximum(abs_tol, rel_tol*abs_SENS.max(axis=1, initial=0.))
+    return sp.sparse.csr_matrix(np.where(abs_SENS >= tols[:,np.newaxis], SENS, 0.), dtype=dtype)
+
+
+class SensitivityFactorizationUpdate(SensitivityFactorization):
+    '''
+    Low-rank (Sherman-Morrison-Woodbury) update of a SensitivityFactorization
+    for the network matrix M - U@V, where U@V is the contribution of the
+    branches taken out of service. If S is the inverse of M, then
+
+        (M - U@V)^{-1} = S + S@U@(I - V@S@U)^{-1}@V@S
+
+    so only k solves against the original factorization are needed
+    for k branches out of service.
+    '''
+    def __init__(self, factorization, U, V):
+        self.len_bus = factorization.len_bus
+        self.ref_bus_idx = factorization.ref_bus_idx
+
+        self._factorization = factorization
+        self._U = U.tocsr()
+        self._V = V.tocsr()
+
+        self._SU = factorization.solve(self._U.toarray())
+        self._VS = factorization.solve_transpose(self._V.T.toarray()).T
+
+        W = np.eye(self._V.shape[0]) - self._V.dot(self._SU)
+
+        ## if W is singular the outages island part of the network
+        if np.linalg.cond(W) > 1e12:
+            raise np.linalg.LinAlgError("Branch outages result in a singular network matrix")
+        self._W_inv = np.linalg.inv(W)
+
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def solve(self, b):
+        x = self._factorization.solve(b)
+        return x + self._SU.dot(self._W_inv.dot(self._V.dot(x)))
+
+    def solve_transpose(self, b):
+        y = self._factorization.solve_transpose(b)
+        return y + self._VS.T.dot(self._W_inv.T.dot(self._U.T.dot(y)))
+
+
+def calculate_outage_factorization(factorization,branches,buses,index_set_branch_out,index_set_bus,base_point=BasePointType.FLATSTART,mapping_bus_to_idx=None):
+    """
+    Calculates a low-rank update of a factorization from calculate_ptdf_factorization
+    which removes the branches in index_set_branch_out from the network
+    Parameters
+    ----------
+    factorization: SensitivityFactorization
+        The factorization for the network with every branch in service
+    branches: dict{}
+        The dictionary of branches for the test case
+    buses: dict{}
+        The dictionary of buses for the test case
+    index_set_branch_out: list
+        The list of keys for branches out of service
+    index_set_bus: list
+        The list of keys for buses for the test case
+    base_point: egret.model_library_defn.BasePointType
+        The base-point type for calculating the network matrix
+    mapping_bus_to_idx: dict
+        A map from bus names to indices for matrix construction. If None,
+        will be inferred from index_set_bus.
+
+    Returns
+    -------
+    SensitivityFactorizationUpdate or None if the outages island part
+    of the network
+    """
+    if mapping_bus_to_idx is None:
+        mapping_bus_to_idx = {bus_n: i for i, bus_n in enumerate(index_set_bus)}
+
+    U = calculate_adjacency_matrix_transpose(branches,index_set_branch_out,index_set_bus,mapping_bus_to_idx)
+    V = _calculate_J11(branches,buses,index_set_branch_out,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF)
+
+    try:
+        return SensitivityFactorizationUpdate(factorization, U, V)
+    except np.linalg.LinAlgError:
+        logger.warning("Branches {} out of service result in a singular network matrix".format(index_set_branch_out))
+        return None
+
+
+def _calculate_network_matrix(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type):
+    '''
+    Calculates the sparse matrices J, L (None unless considering losses),
+    A, and the network matrix M used in the PTDF calculations
+    '''
+    A = calculate_adjacency_matrix_transpose(branches,index_set_branch,index_set_bus,mapping_bus_to_idx)
+    if approximation_type == ApproximationType.PTDF:
+        J = _calculate_J11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF)
+        L = None
+        M = A@J
+    elif approximation_type == ApproximationType.PTDF_LOSSES:
+        J = _calculate_J11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF_LOSSES)
+        L = _calculate_L11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point)
+        AA = calculate_absolute_adjacency_matrix(A)
+        M1 = A@J
+        M2 = AA@L
+        M = M1 + 0.5 * M2
+    else:
+        raise Exception("Unrecognized approximation_type {}".format(approximation_type))
+    return J, L, A, M
+
+
+def _factorize_network_matrix(M, ref_bus_idx, connected):
+    '''
+    Returns a SensitivityFactorization of M, or None if the
+    network is disconnected or M is singular
+    '''
+    if not connected:
+        logger.warning("Using pseudo-inverse method as network is disconnected")
+        return None
+    try:
+        return SensitivityFactorization(M, ref_bus_idx)
+    except RuntimeError:
+        logger.warning("Matrix not invertible. Calculating pseudo-inverse instead.")
+        return None
+
+
+def _calculate_bordered_matrix(M, ref_bus_idx):
+    '''
+    Calculates the matrix J0, which is M bordered by the
+    reference bus row and column
+    '''
+    _len_bus = M.shape[0]
+
+    ref_bus_row = sp.sparse.coo_matrix(([1],([0],[ref_bus_idx])), shape=(1,_len_bus))
+    ref_bus_col = sp.sparse.coo_matrix(([1],([ref_bus_idx],[0])), shape=(_len_bus,1))
+
+    return sp.sparse.bmat([[M,ref_bus_col],[ref_bus_row,0]], format='coo')
+
+
+def _calculate_dense_sensitivity(M, ref_bus_idx, connected, warn=True):
+    '''
+    Calculates the inverse of the bordered matrix J0 densely,
+    returning the bus-by-bus block
+    '''
+    J0 = _calculate_bordered_matrix(M, ref_bus_idx)
+
+    ## the resulting matrix after inversion will be fairly dense,
+    ## the scipy documenation recommends using dense for the inversion
+    ## as well
+    if connected:
+        try:
+            SENSI = np.linalg.inv(J0.A)
+        except np.linalg.LinAlgError:
+            if warn:
+                logger.warning("Matrix not invertible. Calculating pseudo-inverse instead.")
+            SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
+    else:
+        if warn:
+            logger.warning("Using pseudo-inverse method as network is disconnected")
+        SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
+    return SENSI[:-1,:-1]
+
+
+def calculate_ptdf_factorization(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.FLATSTART,mapping_bus_to_idx=None,approximation_type=ApproximationType.PTDF):
+    """
+    Calculates a sparse LU factorization of the network matrix which can
+    be passed to calculate_ptdf or calculate_ptdf_ldf, or used to calculate
+    bus angles from injections directly
+    Parameters
+    ----------
+    branches: dict{}
+        The dictionary of branches for the test case
+    buses: dict{}
+        The dictionary of buses for the test case
+    index_set_branch: list
+        The list of keys for branches for the test case
+    index_set_bus: list
+        The list of keys for buses for the test case
+    reference_bus: key value
+        The reference bus key value
+    base_point: egret.model_library_defn.BasePointType
+        The base-point type for calculating the network matrix
+    mapping_bus_to_idx: dict
+        A map from bus names to indices for matrix construction. If None,
+        will be inferred from index_set_bus.
+    approximation_type: egret.model_library_defn.ApproximationType
+        ApproximationType.PTDF for use with calculate_ptdf, or
+        ApproximationType.PTDF_LOSSES for use with calculate_ptdf_ldf
+
+    Returns
+    -------
+    SensitivityFactorization or None if the network is disconnected
+    or the network matrix is singular
+    """
+    if mapping_bus_to_idx is None:
+        mapping_bus_to_idx = {bus_n: i for i, bus_n in enumerate(index_set_bus)}
+
+    _ref_bus_idx = mapping_bus_to_idx[reference_bus]
+
+    connected = check_network_connection(branches, index_set_branch, index_set_bus, mapping_bus_to_idx)
+
+    J, L, A, M = _calculate_network_matrix(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type)
+
+    return _factorize_network_matrix(M, _ref_bus_idx, connected)
+
+
+def calculate_branch_angle_sensitivity(branches,buses,index_set_branch,index_set_bus,base_point=BasePointType.FLATSTART,mapping_bus_to_idx=None):
+    """
+    Calculates the sparse (branch x bus) sensitivity of the real power flows
+    to the voltage angles, such that the PTDF matrix is this matrix times the
+    inverse of the network matrix
+    Parameters
+    ----------
+    branches: dict{}
+        The dictionary of branches for the test case
+    buses: dict{}
+        The dictionary of buses for the test case
+    index_set_branch: list
+        The list of keys for branches for the test case
+    index_set_bus: list
+        The list of keys for buses for the test case
+    base_point: egret.model_library_defn.BasePointType
+        The base-point type for calculating the sensitivities
+    mapping_bus_to_idx: dict
+        A map from bus names to indices for matrix construction. If None,
+        will be inferred from index_set_bus.
+    """
+    if mapping_bus_to_idx is None:
+        mapping_bus_to_idx = {bus_n: i for i, bus_n in enumerate(index_set_bus)}
+
+    J = _calculate_J11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF)
+    return J.tocsr()
+
+
+def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.FLATSTART,sparse_index_set_branch=None,mapping_bus_to_idx=None,ptdf_method='splu',factorization=None):
     """
     Calculates the sensitivity of the voltage angle to real power injections
     Parameters
@@ -571,7 +927,18 @@ def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,b
     mapping_bus_to_idx: dict
         A map from bus names to indices for matrix construction. If None,
         will be inferred from index_set_bus.
+    ptdf_method: str
+        'splu' to calculate the PTDF matrix by a sparse LU factorization of
+        the network matrix, or 'dense' to invert the network matrix densely.
+        If the network is disconnected or the factorization fails, the
+        dense (pseudo-)inverse is used.
+    factorization: SensitivityFactorization
+        A factorization from calculate_ptdf_factorization to use instead
+        of factorizing the network matrix. Ignored if ptdf_method is 'dense'.
     """
+    if ptdf_method not in ('splu', 'dense'):
+        raise Exception("Unrecognized ptdf_method {}. Valid methods are 'splu' and 'dense'".format(ptdf_method))
+
     _len_bus = len(index_set_bus)
 
     if mapping_bus_to_idx is None:
@@ -581,55 +948,55 @@ def calculate_ptdf(branches,buses,index_set_branch,index_set_bus,reference_bus,b
 
     _ref_bus_idx = mapping_bus_to_idx[reference_bus]
 
-    ## check if the network is connected
-    connected = check_network_connection(branches, index_set_branch, index_set_bus, mapping_bus_to_idx)
-
     J = _calculate_J11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF)
-    A = calculate_adjacency_matrix_transpose(branches,index_set_branch,index_set_bus,mapping_bus_to_idx)
-    M = A@J
 
-    ref_bus_row = sp.sparse.coo_matrix(([1],([0],[_ref_bus_idx])), shape=(1,_len_bus))
-    ref_bus_col = sp.sparse.coo_matrix(([1],([_ref_bus_idx],[0])), shape=(_len_bus,1))
- 
-    J0 = sp.sparse.bmat([[M,ref_bus_col],[ref_bus_row,0]], format='coo')
+    warn = True
+    if ptdf_method == 'dense':
+        factorization = None
+    if factorization is None:
+        ## check if the network is connected
+        connected = check_network_connection(branches, index_set_branch, index_set_bus, mapping_bus_to_idx)
+
+        A = calculate_adjacency_matrix_transpose(branches,index_set_branch,index_set_bus,mapping_bus_to_idx)
+        M = A@J
+
+        if ptdf_method == 'splu':
+            factorization = _factorize_network_matrix(M, _ref_bus_idx, connected)
+            ## if this failed the user has already been warned
+            warn = False
 
     if sparse_index_set_branch is None or len(sparse_index_set_branch) == _len_branch:
-        ## the resulting matrix after inversion will be fairly dense,
-        ## the scipy documenation recommends using dense for the inversion
-        ## as well
-        if connected:
-            try:
-                SENSI = np.linalg.inv(J0.A)
-            except np.linalg.LinAlgError:
-                logger.warning("Matrix not invertible. Calculating pseudo-inverse instead.")
-                SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
+        if factorization is not None:
+            PTDF = factorization.sensitivity(J)
         else:
-            logger.warning("Using pseudo-inverse method as network is disconnected")
-            SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
-        SENSI = SENSI[:-1,:-1]
-        PTDF = np.matmul(J.A,SENSI)
+            SENSI = _calculate_dense_sensitivity(M, _ref_bus_idx, connected, warn)
+            PTDF = np.matmul(J.A,SENSI)
     elif len(sparse_index_set_branch) < _len_branch:
-        B = np.array([], dtype=np.int64).reshape(_len_bus + 1,0)
         _sparse_mapping_branch = {i: branch_n for i, branch_n in enumerate(index_set_branch) if branch_n in sparse_index_set_branch}
 
         ## TODO: Maybe just keep the sparse PTDFs as a dict of ndarrays?
         ## Right now the return type depends on the options 
         ## passed in
-        for idx, branch_name in _sparse_mapping_branch.items():
-            b = np.zeros((_len_branch,1))
-            b[idx] = 1
-            _tmp = np.matmul(J.transpose(),b)
-            _tmp = np.vstack([_tmp,0])
-            B = np.concatenate((B,_tmp), axis=1)
         row_idx = list(_sparse_mapping_branch.keys())
         PTDF = sp.sparse.lil_matrix((_len_branch,_len_bus))
-        _ptdf = sp.sparse.linalg.spsolve(J0.transpose().tocsr(), B).T
-        PTDF[row_idx] = _ptdf[:,:-1]
+        if factorization is not None:
+            PTDF[row_idx] = factorization.sensitivity(J.tocsr()[row_idx])
+        else:
+            J0 = _calculate_bordered_matrix(M, _ref_bus_idx)
+            B = np.array([], dtype=np.int64).reshape(_len_bus + 1,0)
+            for idx, branch_name in _sparse_mapping_branch.items():
+                b = np.zeros((_len_branch,1))
+                b[idx] = 1
+                _tmp = J.transpose()@b
+                _tmp = np.vstack([_tmp,0])
+                B = np.concatenate((B,_tmp), axis=1)
+            _ptdf = np.atleast_2d(sp.sparse.linalg.spsolve(J0.transpose().tocsr(), B).T)
+            PTDF[row_idx] = _ptdf[:,:-1]
 
     return PTDF
 
 
-def calculate_ptdf_ldf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.SOLUTION,sparse_index_set_branch=None,mapping_bus_to_idx=None):
+def calculate_ptdf_ldf(branches,buses,index_set_branch,index_set_bus,reference_bus,base_point=BasePointType.SOLUTION,sparse_index_set_branch=None,mapping_bus_to_idx=None,ptdf_method='splu',factorization=None):
     """
     Calculates the sensitivity of the voltage angle to real power injections and losses on the lines. Includes the
     calculation of the constant term for the quadratic losses on the lines.
@@ -652,7 +1019,19 @@ def calculate_ptdf_ldf(branches,buses,index_set_branch,index_set_bus,reference_b
     mapping_bus_to_idx: dict
         A map from bus names to indices for matrix construction. If None,
         will be inferred from index_set_bus.
+    ptdf_method: str
+        'splu' to calculate the PTDF and LDF matrices by a sparse LU
+        factorization of the network matrix, or 'dense' to invert the
+        network matrix densely. If the network is disconnected or the
+        factorization fails, the dense (pseudo-)inverse is used.
+    factorization: SensitivityFactorization
+        A factorization from calculate_ptdf_factorization (with
+        approximation_type=ApproximationType.PTDF_LOSSES) to use instead
+        of factorizing the network matrix. Ignored if ptdf_method is 'dense'.
     """
+    if ptdf_method not in ('splu', 'dense'):
+        raise Exception("Unrecognized ptdf_method {}. Valid methods are 'splu' and 'dense'".format(ptdf_method))
+
     _len_bus = len(index_set_bus)
 
     if mapping_bus_to_idx is None:
@@ -662,8 +1041,6 @@ def calculate_ptdf_ldf(branches,buses,index_set_branch,index_set_bus,reference_b
 
     _ref_bus_idx = mapping_bus_to_idx[reference_bus]
 
-    J = _calculate_J11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,approximation_type=ApproximationType.PTDF_LOSSES)
-    L = _calculate_L11(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point)
     Jc = _calculate_pf_constant(branches,buses,index_set_branch,base_point)
     Lc = _calculate_pfl_constant(branches,buses,index_set_branch,base_point)
 
@@ -673,59 +1050,55 @@ def calculate_ptdf_ldf(branches,buses,index_set_branch,index_set_bus,reference_b
     ## check if the network is connected
     connected = check_network_connection(branches, index_set_branch, index_set_bus, mapping_bus_to_idx)
 
-    A = calculate_adjacency_matrix_transpose(branches,index_set_branch,index_set_bus, mapping_bus_to_idx)
+    J, L, A, M = _calculate_network_matrix(branches,buses,index_set_branch,index_set_bus,mapping_bus_to_idx,base_point,ApproximationType.PTDF_LOSSES)
     AA = calculate_absolute_adjacency_matrix(A)
-    M1 = A@J
-    M2 = AA@L
-    M = M1 + 0.5 * M2
-
-    ref_bus_row = sp.sparse.coo_matrix(([1],([0],[_ref_bus_idx])), shape=(1,_len_bus))
-    ref_bus_col = sp.sparse.coo_matrix(([1],([_ref_bus_idx],[0])), shape=(_len_bus,1))
 
-    J0 = sp.sparse.bmat([[M,ref_bus_col],[ref_bus_row,0]], format='coo')
+    warn = True
+    if ptdf_method == 'dense':
+        factorization = None
+    elif factorization is None:
+        factorization = _factorize_network_matrix(M, _ref_bus_idx, connected)
+        ## if this failed the user has already been warned
+        warn = False
 
     if sparse_index_set_branch is None or len(sparse_index_set_branch) == _len_branch:
-        ## the resulting matrix after inversion will be fairly dense,
-        ## the scipy documenation recommends using dense for the inversion
-        ## as well
-        if connected:
-            try:
-                SENSI = np.linalg.inv(J0.A)
-            except np.linalg.LinAlgError:
-                logger.warning("Matrix not invertible. Calculating pseudo-inverse instead.")
-                SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
+        if factorization is not None:
+            PTDF = factorization.sensitivity(J)
+            LDF = factorization.sensitivity(L)
         else:
-            logger.warning("Using pseudo-inverse method as network is disconnected")
-            SENSI = np.linalg.pinv(J0.A,rcond=1e-7)
-        SENSI = SENSI[:-1,:-1]
-
-        PTDF = np.matmul(J.A, SENSI)
-        LDF = np.matmul(L.A, SENSI)
+            SENSI = _calculate_dense_sensitivity(M, _ref_bus_idx, connected, warn)
+            PTDF = np.matmul(J.A, SENSI)
+            LDF = np.matmul(L.A, SENSI)
     elif len(sparse_index_set_branch) < _len_branch:
-        B_J = np.array([], dtype=np.int64).reshape(_len_bus + 1, 0)
-        B_L = np.array([], dtype=np.int64).reshape(_len_bus + 1, 0)
         _sparse_mapping_branch = {i: branch_n for i, branch_n in enumerate(index_set_branch) if branch_n in sparse_index_set_branch}
 
-        for idx, branch_name in _sparse_mapping_branch.items():
-            b = np.zeros((_len_branch, 1))
-            b[idx] = 1
-
-            _tmp_J = np.matmul(J.transpose(), b)
-            _tmp_J = np.vstack([_tmp_J, 0])
-            B_J = np.concatenate((B_J, _tmp_J), axis=1)
-
-            _tmp_L = np.matmul(L.transpose(), b)
-            _tmp_L = np.vstack([_tmp_L, 0])
-            B_L = np.concatenate((B_L, _tmp_L), axis=1)
-
         row_idx = list(_sparse_mapping_branch.keys())
         PTDF = sp.sparse.lil_matrix((_len_branch, _len_bus))
-        _ptdf = sp.sparse.linalg.spsolve(J0.transpose().tocsr(), B_J).T
-        PTDF[row_idx] = _ptdf[:, :-1]
-
         LDF = sp.sparse.lil_matrix((_len_branch, _len_bus))
-        _ldf = sp.sparselinalg.spsolve(J0.transpose().tocsr(), B_L).T
-        LDF[row_idx] = _ldf[:, :-1]
+        if factorization is not None:
+            PTDF[row_idx] = factorization.sensitivity(J.tocsr()[row_idx])
+            LDF[row_idx] = factorization.sensitivity(L.tocsr()[row_idx])
+        else:
+            J0 = _calculate_bordered_matrix(M, _ref_bus_idx)
+            B_J = np.array([], dtype=np.int64).reshape(_len_bus + 1, 0)
+            B_L = np.array([], dtype=np.int64).reshape(_len_bus + 1, 0)
+            for idx, branch_name in _sparse_mapping_branch.items():
+                b = np.zeros((_len_branch, 1))
+                b[idx] = 1
+
+                _tmp_J = J.transpose()@b
+                _tmp_J = np.vstack([_tmp_J, 0])
+                B_J = np.concatenate((B_J, _tmp_J), axis=1)
+
+                _tmp_L = L.transpose()@b
+                _tmp_L = np.vstack([_tmp_L, 0])
+                B_L = np.concatenate((B_L, _tmp_L), axis=1)
+
+            _ptdf = np.atleast_2d(sp.sparse.linalg.spsolve(J0.transpose().tocsr(), B_J).T)
+            PTDF[row_idx] = _ptdf[:, :-1]
+
+            _ldf = np.atleast_2d(sp.sparse.linalg.spsolve(J0.transpose().tocsr(), B_L).T)
+            LDF[row_idx] = _ldf[:, :-1]
 
     M1 = A@Jc
     M2 = AA@Lc
@@ -351,9 +351,9 @@ def _scale_by_baseMVA(normal_op, inverse_op, element, attr_name, attr, baseMVA):
     if isinstance(attr, dict):
         if 'data_type' in attr and attr['data_type'] == 'time_series':
             op = _get_op(normal_op, inverse_op, attr_name)
-            values_list = attr['values']
-            for time, value in enumerate(values_list):
-                values_list[time] = op( value , baseMVA )
+            ## replace the list, as it may be shared with
+            ## the ModelData object this was cloned from
+            attr['values'] = [ op( value , baseMVA ) for value in attr['values'] ]
         elif 'data_type' in attr and attr['data_type'] == 'cost_curve':
             if attr['cost_curve_type'] == 'polynomial':
                 values_dict = attr['values']
@@ -385,7 +385,7 @@ def _convert_modeldata_pu(model_data, transform_func, inplace):
     if inplace:
         md = model_data
     else:
-        md = model_data.clone()
+        md = model_data.clone(deep=False)
     baseMVA = float(md.data['system']['baseMVA'])
 
     for (attr_type, element_type), attributes in scaled_attributes.items():
@@ -10,6 +10,7 @@
 ## loads and validates input unit commitment data
 from pyomo.environ import *
 import math
+import numpy as np
 from egret.data.model_data import map_items, zip_items
 from egret.model_library.transmission import tx_utils
 from egret.common.log import logger
@@ -69,6 +70,21 @@ def _add_initial_time_periods_on_off_line(model):
     
     model.InitialTimePeriodsOffLine = Param(model.ThermalGenerators, within=NonNegativeIntegers, initialize=initial_time_periods_offline_rule, mutable=True)
 
+def _get_bus_loads(load_columns, bus_names, time_periods):
+    '''
+    the total load at each bus in bus_names, as a dict keyed by
+    (bus, time period), from the columnar view of the loads
+    '''
+    ## sum the loads at each bus for every time period at once
+    bus_to_idx = { b : i for i, b in enumerate(bus_names) }
+    bus_load_array = np.zeros((len(bus_names), len(time_periods)))
+    if load_columns:
+        load_bus = dict(zip(load_columns.element_names('bus'), load_columns.column('bus')))
+        load_bus_idx = [ bus_to_idx[load_bus[l]] for l in load_columns.element_names('p_load') ]
+        np.add.at(bus_load_array, load_bus_idx, load_columns.time_series('p_load', len(time_periods)))
+
+    return { (b,t) : p_load for b, row in zip(bus_names, bus_load_array.tolist()) for t, p_load in zip(time_periods, row) }
+
 @add_model_attr(component_name)
 def load_params(model, model_data):
     
@@ -113,6 +129,10 @@ def load_params(model, model_data):
     interface_attrs = md.attributes(element_type='interface')
     storage_attrs = md.attributes(element_type='storage')
 
+    ## columnar views for the time series data
+    load_columns = md.columns(element_type='load')
+    renewable_gen_columns = md.columns(element_type='generator', generator_type='renewable')
+
 
     inlet_branches_by_bus, outlet_branches_by_bus = \
         tx_utils.inlet_outlet_branches_by_bus(branches, buses)
@@ -292,18 +312,12 @@ def load_params(model, model_data):
     # renewables, interchange schedules, etc. - should probably be modeled
     # explicitly.
 
-    bus_loads = { (b,t) : 0 for b in bus_attrs['names'] for t in model.TimePeriods}
-
-    for lname, load in loads.items():
-        bus = load['bus']
-        load_time = TimeMapper(load['p_load'])
-        for t in model.TimePeriods:
-            bus_loads[bus, t] += load_time(None,t)
+    bus_loads = _get_bus_loads(load_columns, bus_attrs['names'], model.TimePeriods)
     model.Demand = Param(model.Buses, model.TimePeriods, initialize=bus_loads, mutable=True)
     
     def calculate_total_demand(m, t):
         return sum(value(m.Demand[b,t]) for b in sorted(m.Buses))
-    model.TotalDemand = Param(model.TimePeriods, initialize=calculate_total_demand)
+    model.TotalDemand = Param(model.TimePeriods, initialize=calculate_total_demand, mutable=True)
     
     # at this point, a user probably wants to see if they have negative demand.
     def warn_about_negative_demand_rule(m, b, t):
@@ -361,7 +375,7 @@ def load_params(model, model_data):
                                             within=NonNegativeReals,
                                             default=0.0,
                                             mutable=True,
-                                            initialize=TimeMapper(renewable_gen_attrs.get('p_min')))
+                                            initialize=renewable_gen_columns.time_series_dict('p_min', model.TimePeriods))
     
     def maximum_nd_output_validator(m, v, g, t):
        return v >= value(m.MinNondispatchablePower[g,t])
@@ -372,7 +386,7 @@ def load_params(model, model_data):
                                             default=0.0,
                                             mutable=True,
                                             validate=maximum_nd_output_validator,
-                                            initialize=TimeMapper(renewable_gen_attrs.get('p_max')))
+                                            initialize=renewable_gen_columns.time_series_dict('p_max', model.TimePeriods))
     
     #################################################
     # generator ramp up/down rates. units are MW/h. #
@@ -11,6 +11,7 @@
 from pyomo.environ import *
 import math
 
+from concurrent.futures import ProcessPoolExecutor
 from .uc_utils import add_model_attr
 from .power_vars import _add_reactive_power_vars
 from .generation_limits import _add_reactive_limits
@@ -100,6 +101,93 @@ def _setup_interface_slacks(m,block,tm):
                 for i in m.InterfacesWithSlack)
 
 
+def _create_ptdf_matrix(ptdf_options, branches, buses, reference_bus, branches_keys, buses_keys, interfaces):
+    ## NOTE: For now, just use a flat-start for unit commitment
+    if ptdf_options['lazy'] and ptdf_options['lazy_ptdf_rows']:
+        return data_utils.LazyPTDFMatrix(branches, buses, reference_bus, BasePointType.FLATSTART, ptdf_options, branches_keys=branches_keys, buses_keys=buses_keys, interfaces=interfaces)
+    if ptdf_options['sparse_ptdf']:
+        return data_utils.SparsePTDFMatrix(branches, buses, reference_bus, BasePointType.FLATSTART, ptdf_options, branches_keys=branches_keys, buses_keys=buses_keys, interfaces=interfaces)
+    return data_utils.PTDFMatrix(branches, buses, reference_bus, BasePointType.FLATSTART, ptdf_options, branches_keys=branches_keys, buses_keys=buses_keys, interfaces=interfaces)
+
+## the network data shared by the worker processes in _precompute_ptdfs
+_ptdf_worker_data = None
+
+def _init_ptdf_worker(ptdf_options, branches, buses, reference_bus, buses_keys, interfaces):
+    global _ptdf_worker_data
+    _ptdf_worker_data = (ptdf_options, branches, buses, reference_bus, buses_keys, interfaces)
+
+def _calculate_ptdf_worker(branches_in_service):
+    ptdf_options, branches, buses, reference_bus, buses_keys, interfaces = _ptdf_worker_data
+    PTDF = _create_ptdf_matrix(ptdf_options, branches, buses, reference_bus, branches_in_service, buses_keys, interfaces)
+    ## the factorization would be refactorized when unpickled,
+    ## so it is not sent back; these matrices are not used as
+    ## the base for low-rank outage updates
+    PTDF._factorization = None
+    return PTDF
+
+def _precompute_ptdfs(m):
+    '''
+    find the distinct outage patterns over the time horizon and
+    calculate their PTDF matrices up front, computing those which
+    need a full calculation in a pool of ptdf_options['ptdf_workers']
+    processes
+    '''
+    ptdf_options = m._ptdf_options
+
+    workers = ptdf_options['ptdf_workers']
+    if workers is None or workers <= 1:
+        return
+    if ptdf_options['load_from'] is not None:
+        return
+    ## the LazyPTDFMatrix needs its factorization
+    ## to calculate rows, so it is built serially
+    if ptdf_options['lazy'] and ptdf_options['lazy_ptdf_rows']:
+        return
+
+    buses = m._buses
+    branches = m._branches
+    interfaces = m._interfaces
+    buses_idx = tuple(buses.keys())
+    reference_bus = value(m.ReferenceBus)
+
+    outage_patterns = dict.fromkeys( tuple(l for l in m.TransmissionLines if value(m.LineOutOfService[l,t])) \
+                                        for t in m.TimePeriods )
+
+    ## the low-rank updates are cheap, so only those outage
+    ## patterns for which the update fails are calculated in full
+    if ptdf_options['low_rank_outage_update'] and any(outage_patterns):
+        if () not in m._PTDFs:
+            m._PTDFs[()] = _create_ptdf_matrix(ptdf_options, branches, buses, reference_bus, tuple(m.TransmissionLines), buses_idx, interfaces)
+        to_calculate = list()
+        for branches_out_service in outage_patterns:
+            if branches_out_service in m._PTDFs:
+                continue
+            PTDF = m._PTDFs[()].calculate_outage_ptdf(branches_out_service, ptdf_options, interfaces=interfaces)
+            if PTDF is None:
+                to_calculate.append(branches_out_service)
+            else:
+                m._PTDFs[branches_out_service] = PTDF
+    else:
+        to_calculate = [ branches_out_service for branches_out_service in outage_patterns if branches_out_service not in m._PTDFs ]
+
+    ## nothing to gain from a pool
+    if len(to_calculate) < 2:
+        return
+
+    branches_in_service_list = list()
+    for branches_out_service in to_calculate:
+        out_service = set(branches_out_service)
+        branches_in_service_list.append(tuple(l for l in m.TransmissionLines if l not in out_service))
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(to_calculate)),
+                             initializer=_init_ptdf_worker,
+                             initargs=(ptdf_options, branches, buses, reference_bus, buses_idx, interfaces)) as executor:
+        for branches_out_service, PTDF in zip(to_calculate, executor.map(_calculate_ptdf_worker, branches_in_service_list)):
+            ## protect the array using numpy
+            if isinstance(PTDF.PTDFM, np.ndarray):
+                PTDF.PTDFM.flags.writeable = False
+            m._PTDFs[branches_out_service] = PTDF
+
 def _ptdf_dcopf_network_model(block,tm):
     m, gens_by_bus, bus_p_loads, bus_gs_fixed_shunts = \
             _setup_egret_network_model(block, tm)
@@ -146,10 +234,16 @@ def _ptdf_dcopf_network_model(block,tm):
         reference_bus = value(m.ReferenceBus)
 
         PTDF = data_utils.get_ptdf_potentially_from_file(ptdf_options, branches_in_service, buses_idx, interfaces=interfaces)
-        
-        ## NOTE: For now, just use a flat-start for unit commitment
+
+        ## derive the PTDF matrix for this outage pattern from the one
+        ## with every branch in service using a low-rank update
+        if PTDF is None and branches_out_service and ptdf_options['low_rank_outage_update']:
+            if () not in m._PTDFs:
+                m._PTDFs[()] = _create_ptdf_matrix(ptdf_options, branches, buses, reference_bus, tuple(m.TransmissionLines), buses_idx, interfaces)
+            PTDF = m._PTDFs[()].calculate_outage_ptdf(branches_out_service, ptdf_options, interfaces=interfaces)
+
         if PTDF is None:
-            PTDF = data_utils.PTDFMatrix(branches, buses, reference_bus, BasePointType.FLATSTART, ptdf_options, branches_keys=branches_in_service, buses_keys=buses_idx, interfaces=interfaces)
+            PTDF = _create_ptdf_matrix(ptdf_options, branches, buses, reference_bus, branches_in_service, buses_idx, interfaces)
 
         m._PTDFs[branches_out_service] = PTDF
 
@@ -171,6 +265,10 @@ def _ptdf_dcopf_network_model(block,tm):
                                                      )
         ### add helpers for tracking monitored branches
         lpu.add_monitored_branch_tracker(block)
+
+        if ptdf_options['contingencies'] is not None:
+            ### add "blank" post-contingency flow limits
+            libbranch.declare_ineq_p_contingency_branch_thermal_lbub(model=block)
         
     else: ### add all the dense constraints
         p_max = {k: branches[k]['rating_long_term'] for k in branches_in_service}
@@ -190,21 +288,28 @@ def _ptdf_dcopf_network_model(block,tm):
                                                      approximation_type=ApproximationType.PTDF
                                                      )
 
-    ## for now, just add all the interface constraints
-    ## TODO: incorporate into lazy logic
-    ### declare the branch power flow approximation constraints
-    libbranch.declare_eq_interface_power_ptdf_approx(model=block,
-                                                     index_set=interfaces.keys(),
-                                                     PTDF=PTDF,
-                                                     abs_ptdf_tol=abs_ptdf_tol,
-                                                     rel_ptdf_tol=rel_ptdf_tol
-                                                     )
+    if ptdf_options['lazy'] and ptdf_options['lazy_interfaces']:
+        ### add "blank" interface flow limits, which are
+        ### tracked with the monitored branches
+        libbranch.declare_ineq_p_interface_lbub(model=block,
+                                                index_set=interfaces.keys(),
+                                                interfaces=None,
+                                                )
 
-    ### declare the interface flow limits
-    libbranch.declare_ineq_p_interface_lbub(model=block,
-                                            index_set=interfaces.keys(),
-                                            interfaces=interfaces,
-                                            )
+    else: ### add all the interface constraints
+        ### declare the branch power flow approximation constraints
+        libbranch.declare_eq_interface_power_ptdf_approx(model=block,
+                                                         index_set=interfaces.keys(),
+                                                         PTDF=PTDF,
+                                                         abs_ptdf_tol=abs_ptdf_tol,
+                                                         rel_ptdf_tol=rel_ptdf_tol
+                                                         )
+
+        ### declare the interface flow limits
+        libbranch.declare_ineq_p_interface_lbub(model=block,
+                                                index_set=interfaces.keys(),
+                                                interfaces=interfaces,
+                                                )
 
 def _btheta_dcopf_network_model(block,tm):
     m, gens_by_bus, bus_p_loads, bus_gs_fixed_shunts = \
@@ -556,7 +661,10 @@ def copperplate_relaxed_power_flow(model, slacks=True):
                                             'storage_service': None,
                                             })
 def ptdf_power_flow(model, slacks=True):
-    model._PTDFs = dict()
+    ## the PTDF matrices may be shared with other models
+    ptdf_cache = model._ptdf_options['ptdf_cache']
+    model._PTDFs = dict() if ptdf_cache is None else ptdf_cache
+    _precompute_ptdfs(model)
     _add_egret_power_flow(model, _ptdf_dcopf_network_model, reactive_power=False, slacks=slacks)
 
 @add_model_attr(component_name, requires = {'data_loader': None,
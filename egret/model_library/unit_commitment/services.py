@@ -474,15 +474,15 @@ def regulation_services(model, zone_initializer_builder, zone_requirement_getter
     model.RegulationUpCapability = Param(model.AGC_Generators, within=NonNegativeReals, initialize=calculate_regulation_capability_rule)
     model.RegulationDnCapability = Param(model.AGC_Generators, within=NonNegativeReals, initialize=calculate_regulation_capability_rule)
 
-    model.ZonalRegulationUpRequirement = Param(model.RegulationZones, model.TimePeriods, within=NonNegativeReals, 
+    model.ZonalRegulationUpRequirement = Param(model.RegulationZones, model.TimePeriods, within=NonNegativeReals, mutable=True, 
                                                     initialize=zone_requirement_getter('regulation_up_requirement'))
     
-    model.SystemRegulationUpRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, initialize=TimeMapper(system.get('regulation_up_requirement')))
+    model.SystemRegulationUpRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, initialize=TimeMapper(system.get('regulation_up_requirement')))
 
-    model.ZonalRegulationDnRequirement = Param(model.RegulationZones, model.TimePeriods, within=NonNegativeReals,
+    model.ZonalRegulationDnRequirement = Param(model.RegulationZones, model.TimePeriods, within=NonNegativeReals, mutable=True,
                                                     initialize=zone_requirement_getter('regulation_down_requirement'))
 
-    model.SystemRegulationDnRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, initialize=TimeMapper(system.get('regulation_down_requirement')))
+    model.SystemRegulationDnRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, initialize=TimeMapper(system.get('regulation_down_requirement')))
 
     def validate_fixed_reg(m,v,g,t):
         if (v is not None) and (value(m.FixedCommitment[g,t]) is not None):
@@ -620,9 +620,9 @@ def spinning_reserves(model, zone_initializer_builder, zone_requirement_getter,
     model.SpinningReservePrice = Param(model.ThermalGenerators, within=NonNegativeReals, default=0.0, initialize=thermal_gen_attrs.get('spinning_cost'))
     
     # spinning reserve requirements
-    model.ZonalSpinningReserveRequirement = Param(model.SpinningReserveZones, model.TimePeriods, within=NonNegativeReals,
+    model.ZonalSpinningReserveRequirement = Param(model.SpinningReserveZones, model.TimePeriods, within=NonNegativeReals, mutable=True,
                                                         initialize=zone_requirement_getter('spinning_reserve_requirement'))
-    model.SystemSpinningReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, initialize=TimeMapper(system.get('spinning_reserve_requirement')))
+    model.SystemSpinningReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, initialize=TimeMapper(system.get('spinning_reserve_requirement')))
 
     def zonal_spin_bounds(m,rz,t):
         return (0, m.ZonalSpinningReserveRequirement[rz,t])
@@ -717,9 +717,9 @@ def non_spinning_reserves(model, zone_initializer_builder, zone_requirement_gett
                                                     initialize=nspin_gen_attrs['non_spinning_capacity'])
     model.NonSpinningReservePrice = Param(model.NonSpinGenerators, within=NonNegativeReals, default=0.0, initialize=nspin_gen_attrs.get('non_spinning_cost'))
     
-    model.ZonalNonSpinningReserveRequirement = Param(model.NonSpinReserveZones, model.TimePeriods, within=NonNegativeReals, default=0.0,
+    model.ZonalNonSpinningReserveRequirement = Param(model.NonSpinReserveZones, model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0,
                                                         initialize=zone_requirement_getter('non_spinning_reserve_requirement'))
-    model.SystemNonSpinningReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, 
+    model.SystemNonSpinningReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, 
                                                         initialize=TimeMapper(system.get('non_spinning_reserve_requirement')))
 
     def zonal_fast_bounds(m,rz,t):
@@ -825,9 +825,9 @@ def supplemental_reserves(model, zone_initializer_builder, zone_requirement_gett
 
     # Supplemental reserve requirement
 
-    model.ZonalSupplementalReserveRequirement = Param(model.SupplementalReserveZones, model.TimePeriods, within=NonNegativeReals, default=0.0,
+    model.ZonalSupplementalReserveRequirement = Param(model.SupplementalReserveZones, model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0,
                                                         initialize=zone_requirement_getter('supplemental_reserve_requirement'))
-    model.SystemSupplementalReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, 
+    model.SystemSupplementalReserveRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, 
                                                         initialize=TimeMapper(system.get('supplemental_reserve_requirement')))
 
     def zonal_op_bounds(m,rz,t):
@@ -943,13 +943,13 @@ def flexible_ramping_reserves(model, zone_initializer_builder, zone_requirement_
     ## begin flexible_ramp
     model.FlexRampMinutes = Param(within=PositiveReals, default=20.)
 
-    model.ZonalFlexUpRequirement = Param(model.FlexRampZones, model.TimePeriods, within=NonNegativeReals, default=0.0,
+    model.ZonalFlexUpRequirement = Param(model.FlexRampZones, model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0,
                                             initialize=zone_requirement_getter('flexible_ramp_up_requirement'))
-    model.ZonalFlexDnRequirement = Param(model.FlexRampZones, model.TimePeriods, within=NonNegativeReals, default=0.0,
+    model.ZonalFlexDnRequirement = Param(model.FlexRampZones, model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0,
                                             initialize=zone_requirement_getter('flexible_ramp_down_requirement'))
 
-    model.SystemFlexUpRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, initialize=TimeMapper(system.get('flexible_ramp_up_requirement')))
-    model.SystemFlexDnRequirement = Param(model.TimePeriods, within=NonNegativeReals, default=0.0, initialize=TimeMapper(system.get('flexible_ramp_down_requirement')))
+    model.SystemFlexUpRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, initialize=TimeMapper(system.get('flexible_ramp_up_requirement')))
+    model.SystemFlexDnRequirement = Param(model.TimePeriods, within=NonNegativeReals, mutable=True, default=0.0, initialize=TimeMapper(system.get('flexible_ramp_down_requirement')))
 
     def zonal_flex_up_bounds(m, rz, t):
         return (0, m.ZonalFlexUpRequirement[rz,t])
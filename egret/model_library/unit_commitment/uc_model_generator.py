@@ -19,6 +19,7 @@ from egret.model_library.unit_commitment import \
         services, power_balance, reserve_requirement, \
         objective, fuel_supply, fuel_consumption
 from egret.model_library.transmission.tx_utils import scale_ModelData_to_pu
+from egret.common.instrumentation import PerformanceReport
 from collections import namedtuple
 import pyomo.environ as pe
 
@@ -60,7 +61,7 @@ def generate_model( model_data, uc_formulation, relax_binaries=False, ptdf_optio
                                       from model_data
     """
 
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     scale_ModelData_to_pu(md, inplace=True)
     return _generate_model( md, *_get_formulation_from_UCFormulation( uc_formulation ), relax_binaries , ptdf_options )
 
@@ -104,26 +105,40 @@ def _generate_model( model_data,
     ## to relax binaries
     model.relax_binaries = _relax_binaries
 
-    params.load_params(model, model_data)
-    getattr(status_vars, _status_vars)(model)
-    getattr(power_vars, _power_vars)(model)
-    getattr(reserve_vars, _reserve_vars)(model)
-    getattr(non_dispatchable_vars, _non_dispatchable_vars)(model)
-    getattr(generation_limits, _generation_limits)(model)
-    getattr(ramping_limits, _ramping_limits)(model)
-    getattr(production_costs, _production_costs)(model)
-    getattr(uptime_downtime, _uptime_downtime)(model)
-    getattr(startup_costs, _startup_costs)(model)
-    services.storage_services(model)
-    services.ancillary_services(model)
-    getattr(power_balance, _power_balance)(model)
-    getattr(reserve_requirement, _reserve_requirement)(model)
+    ## record the time and memory used by each phase of the build
+    report = PerformanceReport()
+    model._performance_report = report
+
+    with report.phase('params', model):
+        params.load_params(model, model_data)
+    for name, module, formulation in ( ('status_vars', status_vars, _status_vars),
+                                       ('power_vars', power_vars, _power_vars),
+                                       ('reserve_vars', reserve_vars, _reserve_vars),
+                                       ('non_dispatchable_vars', non_dispatchable_vars, _non_dispatchable_vars),
+                                       ('generation_limits', generation_limits, _generation_limits),
+                                       ('ramping_limits', ramping_limits, _ramping_limits),
+                                       ('production_costs', production_costs, _production_costs),
+                                       ('uptime_downtime', uptime_downtime, _uptime_downtime),
+                                       ('startup_costs', startup_costs, _startup_costs),
+                                     ):
+        with report.phase(name, model):
+            getattr(module, formulation)(model)
+    with report.phase('storage_services', model):
+        services.storage_services(model)
+    with report.phase('ancillary_services', model):
+        services.ancillary_services(model)
+    with report.phase('power_balance', model):
+        getattr(power_balance, _power_balance)(model)
+    with report.phase('reserve_requirement', model):
+        getattr(reserve_requirement, _reserve_requirement)(model)
 
     if 'fuel_supply' in model_data.data['elements'] and bool(model_data.data['elements']['fuel_supply']):
-        fuel_consumption.fuel_consumption_model(model)
-        fuel_supply.fuel_supply_model(model)
+        with report.phase('fuel_supply', model):
+            fuel_consumption.fuel_consumption_model(model)
+            fuel_supply.fuel_supply_model(model)
 
-    getattr(objective, _objective)(model)
+    with report.phase('objective', model):
+        getattr(objective, _objective)(model)
 
     return model
 
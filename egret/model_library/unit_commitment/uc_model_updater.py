@@ -0,0 +1,444 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+Helpers for updating the data of a unit commitment model in place
+
+A model built by uc_model_generator can take the data of a new ModelData
+object with the same network, generator fleet, and number of time
+periods, so long as only the following have changed:
+
+* the loads (p_load)
+* the renewable generator forecasts (p_min, p_max)
+* the system reserve requirement and the system, area, and zonal
+  ancillary service requirements
+* the initial output of the thermal generators (initial_p_output)
+* the initial status of the thermal generators (initial_status), so
+  long as the uptime/downtime and startup cost constraints built from
+  it are unchanged, e.g., for a unit which has been on for at least
+  its minimum up time, or off for at least its longest startup lag
+
+These are held in mutable Params (and the fixed loads in the
+TransmissionBlocks), so the update does not construct any new
+pyomo components. Any other difference requires a new model.
+'''
+
+import pyomo.environ as pe
+from pyomo.core.expr.visitor import identify_variables, identify_mutable_parameters
+
+from egret.common.log import logger
+from .params import _get_bus_loads
+from .uc_utils import uc_time_helper
+
+## the ancillary service requirements which can be given for
+## the system, an area, or a zone, and the zonal and system
+## Params and shortfall Vars for each
+_ancillary_service_requirements = (
+    ('regulation_up_requirement', 'RegulationUp'),
+    ('regulation_down_requirement', 'RegulationDn'),
+    ('spinning_reserve_requirement', 'SpinningReserve'),
+    ('non_spinning_reserve_requirement', 'NonSpinningReserve'),
+    ('supplemental_reserve_requirement', 'SupplementalReserve'),
+    ('flexible_ramp_up_requirement', 'FlexUp'),
+    ('flexible_ramp_down_requirement', 'FlexDn'),
+    )
+
+_ancillary_service_attrs = tuple(attr for attr, _ in _ancillary_service_requirements)
+
+## the attributes, by element type, which may
+## differ between updates of the same model
+_updatable_attrs = { 'load' : ('p_load',),
+                     'thermal' : ('initial_status', 'initial_p_output',),
+                     'renewable' : ('p_min', 'p_max'),
+                     'area' : _ancillary_service_attrs,
+                     'zone' : _ancillary_service_attrs,
+                   }
+
+## the Vars with a bound given by an updated Param, as
+## (Var name, Param name, 'lb' or 'ub') on the same index
+_param_bounds = [ ('NondispatchablePowerUsed', 'MinNondispatchablePower', 'lb'),
+                  ('NondispatchablePowerUsed', 'MaxNondispatchablePower', 'ub'),
+                  ('LoadShedding', 'Demand', 'ub'),
+                ]
+for _, _product in _ancillary_service_requirements:
+    _param_bounds.append(('Zonal'+_product+'Shortfall', 'Zonal'+_product+'Requirement', 'ub'))
+    _param_bounds.append(('System'+_product+'Shortfall', 'System'+_product+'Requirement', 'ub'))
+
+## stands in for the value of an updatable attribute
+_UPDATABLE = '<updatable>'
+
+def _mask(att_dict, attrs):
+    return { key : (_UPDATABLE if key in attrs else att) for key, att in att_dict.items() }
+
+def structural_data(model_data):
+    '''
+    Returns the data in model_data which a unit commitment model is
+    built from and cannot be updated in place, i.e., everything but
+    the values of the updatable attributes (whose presence is kept)
+    and the labels of the time periods (whose number is kept).
+
+    Two ModelData objects with equal structural_data can
+    share a unit commitment model through update_model.
+    '''
+    system = _mask(model_data.data['system'], ('reserve_requirement',)+_ancillary_service_attrs)
+    system['time_indices'] = len(system['time_indices'])
+
+    elements = dict()
+    for element_type, element_dict in model_data.data['elements'].items():
+        ## the model build inserts some empty element types
+        if not element_dict:
+            continue
+        masked = dict()
+        for name, element in element_dict.items():
+            if element_type == 'generator':
+                attrs = _updatable_attrs.get(element.get('generator_type'), ())
+            else:
+                attrs = _updatable_attrs.get(element_type, ())
+            masked[name] = _mask(element, attrs)
+        elements[element_type] = masked
+
+    return { 'system' : system, 'elements' : elements }
+
+def _first_difference(old, new, path=''):
+    '''
+    the path to the first difference between the nested
+    dictionaries old and new, or None if they are equal
+    '''
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() | new.keys():
+            if key not in old or key not in new:
+                return path+'/'+str(key)
+            diff = _first_difference(old[key], new[key], path+'/'+str(key))
+            if diff is not None:
+                return diff
+        return None
+    if old == new:
+        return None
+    return path
+
+def _zonal_requirement(elements, attr):
+    def get_requirement(m, az, t):
+        az = str(az)
+        element_type = 'zone' if az[:5] == 'zone_' else 'area'
+        element = elements.get(element_type, dict()).get(az[5:], dict())
+        if attr not in element:
+            return 0.
+        return uc_time_helper(element[attr])(m, t)
+    return get_requirement
+
+def _system_requirement(system, attr):
+    return uc_time_helper(system.get(attr, 0.))
+
+def _updatable_params(model):
+    params = [ model.Demand,
+               model.TotalDemand,
+               model.MinNondispatchablePower,
+               model.MaxNondispatchablePower,
+               model.ReserveRequirement,
+               model.UnitOnT0State,
+               model.PowerGeneratedT0,
+             ]
+    for _, product in _ancillary_service_requirements:
+        for name in ('Zonal'+product+'Requirement', 'System'+product+'Requirement'):
+            if hasattr(model, name):
+                params.append(getattr(model, name))
+    return params
+
+def _get_new_param_values(model, model_data):
+    '''
+    a list of (Param, dict of index to value) for the updatable
+    Params on model, with the values given by model_data
+    '''
+    md = model_data
+    system = md.data['system']
+    elements = md.data['elements']
+    time_periods = list(model.TimePeriods)
+
+    new_values = list()
+
+    bus_loads = _get_bus_loads(md.columns(element_type='load'), list(model.Buses), time_periods)
+    new_values.append((model.Demand, bus_loads))
+    new_values.append((model.TotalDemand, { t : sum(bus_loads[b,t] for b in sorted(model.Buses)) for t in time_periods }))
+
+    renewable_gen_columns = md.columns(element_type='generator', generator_type='renewable')
+    ## the minimums are set first, since the maximums are validated against them
+    for param, attr in ((model.MinNondispatchablePower, 'p_min'), (model.MaxNondispatchablePower, 'p_max')):
+        values = renewable_gen_columns.time_series_dict(attr, time_periods)
+        new_values.append((param, { idx : values.get(idx, 0.) for idx in param.index_set() }))
+
+    reserve_requirement = _system_requirement(system, 'reserve_requirement')
+    new_values.append((model.ReserveRequirement, { t : reserve_requirement(model, t) for t in time_periods }))
+
+    thermal_gen_attrs = md.attributes(element_type='generator', generator_type='thermal')
+    initial_status = thermal_gen_attrs['initial_status']
+    new_values.append((model.UnitOnT0State, { g : initial_status[g] for g in model.ThermalGenerators }))
+    initial_p_output = thermal_gen_attrs['initial_p_output']
+    new_values.append((model.PowerGeneratedT0, { g : initial_p_output[g] for g in model.ThermalGenerators }))
+
+    for attr, product in _ancillary_service_requirements:
+        zonal_param = getattr(model, 'Zonal'+product+'Requirement', None)
+        if zonal_param is not None:
+            zonal_requirement = _zonal_requirement(elements, attr)
+            new_values.append((zonal_param, { (az,t) : zonal_requirement(model, az, t) for az,t in zonal_param.index_set() }))
+        system_param = getattr(model, 'System'+product+'Requirement', None)
+        if system_param is not None:
+            system_requirement = _system_requirement(system, attr)
+            new_values.append((system_param, { t : system_requirement(model, t) for t in time_periods }))
+
+    return new_values
+
+def _check_load_structure(model, bus_loads, min_nondispatchable_power):
+    '''
+    raises a ValueError if the new loads would change the
+    structure of the power balance or load mismatch components
+    '''
+    for (b,t), p_load in bus_loads.items():
+        if (p_load != 0.) != (pe.value(model.Demand[b,t]) != 0.):
+            raise ValueError("Cannot update the unit commitment model: the load at bus {} in time period {} changes "
+                             "between zero and nonzero".format(b,t))
+
+    if hasattr(model, 'LoadSheddingBusTimes'):
+        if set(bt for bt, p_load in bus_loads.items() if p_load > 0) != set(model.LoadSheddingBusTimes):
+            raise ValueError("Cannot update the unit commitment model: the buses and time periods with "
+                             "positive load have changed")
+
+    over_gen_maxes = None
+    if hasattr(model, 'OverGenerationBusTimes'):
+        over_gen_maxes = dict()
+        for b in model.Buses:
+            gen = sum(pe.value(model.MaximumPowerOutput[g]) for g in model.ThermalGeneratorsAtBus[b])
+            for t in model.TimePeriods:
+                total_gen = gen + sum(min_nondispatchable_power[n,t] for n in model.NondispatchableGeneratorsAtBus[b])
+                total_gen -= bus_loads[b,t]
+                if total_gen > 0:
+                    over_gen_maxes[b,t] = total_gen
+        if set(over_gen_maxes) != set(model.OverGenerationBusTimes):
+            raise ValueError("Cannot update the unit commitment model: the buses and time periods which "
+                             "can over-generate have changed")
+    return over_gen_maxes
+
+def _initial_status_structure(model, g, initial_status):
+    '''
+    the values derived from the initial status of thermal generator g
+    which the uptime/downtime and startup cost constraints are built from
+    (see params._add_initial_time_periods_on_off_line and startup_costs)
+    '''
+    time_period_length_hours = pe.value(model.TimePeriodLengthHours)
+    num_time_periods = pe.value(model.NumTimePeriods)
+    if initial_status >= 1:
+        periods_online = int(min(num_time_periods,
+                            round(max(0, pe.value(model.MinimumUpTime[g]) - initial_status) / time_period_length_hours)))
+        ## the ALS formulations also look for a start in the period before the first
+        return (1, periods_online, initial_status == 1)
+    periods_offline = int(min(num_time_periods,
+                            round(max(0, pe.value(model.MinimumDownTime[g]) + initial_status) / time_period_length_hours)))
+    ## the startup costs cannot tell apart units off for at least the longest lag
+    periods_off = -int(round(initial_status / time_period_length_hours))
+    return (0, periods_offline, min(periods_off, model.ScaledStartupLags[g].last()))
+
+def _check_initial_status(model, initial_status):
+    '''
+    raises a ValueError if the new initial status of a thermal
+    generator would change the structure of the model
+    '''
+    for g, status in initial_status.items():
+        old_status = pe.value(model.UnitOnT0State[g])
+        if status == old_status:
+            continue
+        if status == 0:
+            raise ValueError("Cannot update the unit commitment model: the initial status of generator {} "
+                             "is 0".format(g))
+        if _initial_status_structure(model, g, status) != _initial_status_structure(model, g, old_status):
+            raise ValueError("Cannot update the unit commitment model: the initial status of generator {0} "
+                             "changes from {1} to {2}, which changes the uptime/downtime or startup cost "
+                             "constraints".format(g, old_status, status))
+
+def _check_param_values(model, param_values):
+    '''
+    raises a ValueError if any of the new Param values would fail the
+    domain or validation of its Param, so that nothing is changed
+    '''
+    for name, values in param_values.items():
+        param = getattr(model, name)
+        for idx, val in values.items():
+            if val not in param.domain:
+                raise ValueError("Cannot update the unit commitment model: the value {0} for {1}[{2}] is not in "
+                                 "the domain {3}".format(val, name, idx, param.domain.name))
+
+    min_nondispatchable_power = param_values['MinNondispatchablePower']
+    for idx, val in param_values['MaxNondispatchablePower'].items():
+        if val < min_nondispatchable_power[idx]:
+            raise ValueError("Cannot update the unit commitment model: the maximum output {0} of renewable generator {1} "
+                             "in time period {2} is less than its minimum output {3}".format(val, idx[0], idx[1], min_nondispatchable_power[idx]))
+
+    for g, val in param_values['PowerGeneratedT0'].items():
+        unit_on = pe.value(model.UnitOnT0[g])
+        if not (pe.value(model.MinimumPowerOutput[g])*unit_on <= val <= pe.value(model.MaximumPowerOutput[g])*unit_on):
+            raise ValueError("Cannot update the unit commitment model: the initial output {0} of generator {1} "
+                             "is not within its limits given its initial status".format(val, g))
+
+def _get_dependent_constraints(model):
+    '''
+    maps the id of each updatable Param and fixed load Var to the
+    constraints on model it appears in. This walks every constraint,
+    so it is built once, on the first update with a persistent solver.
+    '''
+    dependents = getattr(model, '_update_dependents', None)
+    if dependents is not None:
+        return dependents
+
+    watched = dict()
+    for param in _updatable_params(model):
+        for param_data in param.values():
+            watched[id(param_data)] = param_data
+    load_vars = dict()
+    if hasattr(model, 'TransmissionBlock'):
+        for b in model.TransmissionBlock.values():
+            for var_data in b.pl.values():
+                load_vars[id(var_data)] = var_data
+
+    dependents = dict()
+    for constr in model.component_data_objects(pe.Constraint, active=True, descend_into=True):
+        for expr in (constr.lower, constr.body, constr.upper):
+            if expr is None:
+                continue
+            for param_data in identify_mutable_parameters(expr):
+                if id(param_data) in watched:
+                    dependents.setdefault(id(param_data), dict())[id(constr)] = constr
+            if load_vars:
+                for var_data in identify_variables(expr, include_fixed=True):
+                    if id(var_data) in load_vars:
+                        dependents.setdefault(id(var_data), dict())[id(constr)] = constr
+
+    model._update_dependents = dependents
+    return dependents
+
+def update_model(model, model_data, structure, solver=None):
+    '''
+    Updates the unit commitment model in place with the loads, renewable
+    forecasts, reserve requirements, and initial generator status and
+    output in model_data. If solver is a persistent solver which has model loaded,
+    only the changed variable bounds and constraints are updated in it.
+
+    Parameters
+    ----------
+    model : pyomo.environ.ConcreteModel
+        A unit commitment model from uc_model_generator.generate_model
+    model_data : egret.data.ModelData
+        The new data, with only the elements in service and scaled to p.u.
+    structure : dict
+        The structural_data of the (in service, p.u.) ModelData object
+        model was built from
+    solver : pyomo.solvers.plugins.solvers.persistent_solver.PersistentSolver (optional)
+        A persistent solver with model loaded
+
+    Returns
+    -------
+        int : The number of Param values which changed
+
+    Raises
+    ------
+    ValueError
+        If model cannot take the data in model_data, in which case
+        the model (and solver) are unchanged
+    '''
+
+    diff = _first_difference(structure, structural_data(model_data))
+    if diff is not None:
+        raise ValueError("Cannot update the unit commitment model: the data at {} differs from the data "
+                         "the model was built with".format(diff))
+
+    new_values = _get_new_param_values(model, model_data)
+    param_values = { param.name : values for param, values in new_values }
+    over_gen_maxes = _check_load_structure(model, param_values['Demand'], param_values['MinNondispatchablePower'])
+    _check_initial_status(model, param_values['UnitOnT0State'])
+    _check_param_values(model, param_values)
+
+    ## if we're updating a persistent solver, we need to know
+    ## which constraints to re-add before changing anything
+    if solver is not None:
+        dependents = _get_dependent_constraints(model)
+
+    bounds_by_param = dict()
+    for var_name, param_name, bound in _param_bounds:
+        var = getattr(model, var_name, None)
+        if var is not None:
+            bounds_by_param.setdefault(param_name, list()).append((var, bound))
+
+    changed_components = list()
+    changed_vars = dict()
+    ## to restore the model should anything go wrong
+    old_param_values = list()
+    old_var_values = list()
+    try:
+        for param, values in new_values:
+            bounded_vars = bounds_by_param.get(param.name, ())
+            for idx, val in values.items():
+                param_data = param[idx]
+                old_val = pe.value(param_data)
+                if old_val == val:
+                    continue
+                old_param_values.append((param, idx, old_val))
+                param[idx] = val
+                changed_components.append(param_data)
+                for var, bound in bounded_vars:
+                    if idx in var:
+                        var_data = var[idx]
+                        old_var_values.append((var_data, var_data.lb, var_data.ub, var_data.value))
+                        if bound == 'lb':
+                            var_data.setlb(val)
+                        else:
+                            var_data.setub(val)
+                        changed_vars[id(var_data)] = var_data
+
+        if over_gen_maxes is not None:
+            for bt, over_gen_max in over_gen_maxes.items():
+                var_data = model.OverGeneration[bt]
+                if var_data.ub != over_gen_max:
+                    old_var_values.append((var_data, var_data.lb, var_data.ub, var_data.value))
+                    var_data.setub(over_gen_max)
+                    changed_vars[id(var_data)] = var_data
+
+        ## the loads in the network model are fixed variables
+        if hasattr(model, 'TransmissionBlock'):
+            for t, b in model.TransmissionBlock.items():
+                for bus, var_data in b.pl.items():
+                    p_load = pe.value(model.Demand[bus,t])
+                    if var_data.value != p_load:
+                        old_var_values.append((var_data, var_data.lb, var_data.ub, var_data.value))
+                        var_data.fix(p_load)
+                        changed_components.append(var_data)
+                        changed_vars[id(var_data)] = var_data
+    except:
+        ## in the reverse order, so every Param
+        ## is validated against its old data
+        for var_data, lb, ub, val in reversed(old_var_values):
+            var_data.setlb(lb)
+            var_data.setub(ub)
+            var_data.value = val
+        for param, idx, old_val in reversed(old_param_values):
+            param[idx] = old_val
+        raise
+
+    model.model_data = model_data
+
+    if solver is not None:
+        for var_data in changed_vars.values():
+            solver.update_var(var_data)
+        ## the persistent solvers hold the values of the parameters
+        ## and fixed variables in the constraints, so we re-add those
+        constrs_to_update = dict()
+        for component_data in changed_components:
+            constrs_to_update.update(dependents.get(id(component_data), ()))
+        for constr in constrs_to_update.values():
+            solver.remove_constraint(constr)
+            solver.add_constraint(constr)
+        logger.info("Updated {0} variable(s) and {1} constraint(s) in the persistent solver".format(len(changed_vars), len(constrs_to_update)))
+
+    return len(changed_components)
@@ -19,7 +19,7 @@ except ImportError:
 
 
 def _create_base_relaxation(model_data):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
@@ -56,7 +56,7 @@ def _include_feasibility_slack(model, bus_attrs, gen_attrs, bus_p_loads, bus_q_l
 
 
 def create_psv_acopf_model(model_data, include_feasibility_slack=False):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
@@ -250,7 +250,7 @@ def create_psv_acopf_model(model_data, include_feasibility_slack=False):
 
 
 def create_rsv_acopf_model(model_data, include_feasibility_slack=False):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
@@ -448,7 +448,7 @@ def create_rsv_acopf_model(model_data, include_feasibility_slack=False):
 
 
 def create_riv_acopf_model(model_data, include_feasibility_slack=False):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
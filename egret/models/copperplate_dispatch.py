@@ -43,7 +43,7 @@ def _include_system_feasibility_slack(model, gen_attrs, bus_p_loads, penalty=100
 
 
 def create_copperplate_dispatch_approx_model(model_data, include_feasibility_slack=False):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
@@ -157,7 +157,7 @@ def solve_copperplate_dispatch(model_data,
     m, results = _solve_model(m,solver,timelimit=timelimit,solver_tee=solver_tee,
                               symbolic_solver_labels=symbolic_solver_labels,options=options)
 
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
 
     # save results data to ModelData object
     gens = dict(md.elements(element_type='generator'))
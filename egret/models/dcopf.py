@@ -49,7 +49,7 @@ def _include_feasibility_slack(model, bus_attrs, gen_attrs, bus_p_loads, penalty
 
 
 def create_btheta_dcopf_model(model_data, include_angle_diff_limits=False, include_feasibility_slack=False):
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
     gens = dict(md.elements(element_type='generator'))
@@ -178,7 +178,7 @@ def create_ptdf_dcopf_model(model_data, include_feasibility_slack=False, base_po
     baseMVA = model_data.data['system']['baseMVA']
     lpu.check_and_scale_ptdf_options(ptdf_options, baseMVA)
     
-    md = model_data.clone_in_service()
+    md = model_data.clone_in_service(deep=False)
     tx_utils.scale_ModelData_to_pu(md, inplace = True)
 
 
@@ -246,7 +246,12 @@ def create_ptdf_dcopf_model(model_data, include_feasibility_slack=False, base_po
 
     PTDF = data_utils.get_ptdf_potentially_from_file(ptdf_options, branches_idx, buses_idx)
     if PTDF is None:
-        PTDF = data_utils.PTDFMatrix(branches, buses, reference_bus, base_point, ptdf_options, branches_keys=branches_idx, buses_keys=buses_idx)
+        if ptdf_options['lazy'] and ptdf_options['lazy_ptdf_rows']:
+            PTDF = data_utils.LazyPTDFMatrix(branches, buses, reference_bus, base_point, ptdf_options, branches_keys=branches_idx, buses_keys=buses_idx)
+        elif ptdf_options['sparse_ptdf']:
+            PTDF = data_utils.SparsePTDFMatrix(branches, buses, reference_bus, base_point, ptdf_options, branches_keys=branches_idx, buses_keys=buses_idx)
+        else:
+            PTDF = data_utils.PTDFMatrix(branches, buses, reference_bus, base_point, ptdf_options, branches_keys=branches_idx, buses_keys=buses_idx)
 
     model._PTDF = PTDF
     model._ptdf_options = ptdf_options
@@ -266,6 +271,10 @@ def create_ptdf_dcopf_model(model_data, include_feasibility_slack=False, base_po
         ### add helpers for tracking monitored branches
         lpu.add_monitored_branch_tracker(model)
 
+        if ptdf_options['contingencies'] is not None:
+            ### add "blank" post-contingency flow limits
+            libbranch.declare_ineq_p_contingency_branch_thermal_lbub(model=model)
+
     else:
         p_max = {k: branches[k]['rating_long_term'] for k in branches.keys()}
         ## add all the constraints
@@ -330,6 +339,7 @@ def _lazy_ptdf_dcopf_model_solve_loop(m, md, solver, solver_tee=True, symbolic_s
 
     '''
     from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+    from egret.common.solver_interface import _solve_non_persistent
 
     PTDF = m._PTDF
 
@@ -339,7 +349,8 @@ def _lazy_ptdf_dcopf_model_solve_loop(m, md, solver, solver_tee=True, symbolic_s
 
     for i in range(iteration_limit):
 
-        PFV, viol_num, mon_viol_num, gt_viol_lazy, lt_viol_lazy = lpu.check_violations(m, md, PTDF, ptdf_options['max_violations_per_iteration'])
+        PFV, PFV_I, viol_num, mon_viol_num, gt_viol_lazy, lt_viol_lazy, gt_viol_lazy_I, lt_viol_lazy_I, gt_viol_lazy_C, lt_viol_lazy_C \
+                = lpu.check_violations(m, md, PTDF, ptdf_options['max_violations_per_iteration'])
 
         iter_status_str = "iteration {0}, found {1} violation(s)".format(i,viol_num)
         if mon_viol_num:
@@ -360,15 +371,20 @@ def _lazy_ptdf_dcopf_model_solve_loop(m, md, solver, solver_tee=True, symbolic_s
                 solver.load_duals()
             return lpu.LazyPTDFTerminationCondition.FLOW_VIOLATION
 
-        lpu.add_violations(gt_viol_lazy, lt_viol_lazy, PFV, m, md, solver, ptdf_options, PTDF)
-        total_flow_constr_added = len(gt_viol_lazy) + len(lt_viol_lazy)
+        lpu.add_violations(gt_viol_lazy, lt_viol_lazy, PFV, m, md, solver, ptdf_options, PTDF,
+                           gt_viol_lazy_I=gt_viol_lazy_I, lt_viol_lazy_I=lt_viol_lazy_I, PFV_I=PFV_I,
+                           gt_viol_lazy_C=gt_viol_lazy_C, lt_viol_lazy_C=lt_viol_lazy_C)
+        total_flow_constr_added = len(gt_viol_lazy) + len(lt_viol_lazy) + len(gt_viol_lazy_I) + len(lt_viol_lazy_I) \
+                                    + len(gt_viol_lazy_C) + len(lt_viol_lazy_C)
         logger.info( "iteration {0}, added {1} flow constraint(s)".format(i,total_flow_constr_added))
 
         if persistent_solver:
             solver.solve(m, tee=solver_tee, load_solutions=False, save_results=False)
             solver.load_vars()
         else:
-            solver.solve(m, tee=solver_tee, symbolic_solver_labels=symbolic_solver_labels)
+            results = _solve_non_persistent(m, solver, solver_tee=solver_tee, symbolic_solver_labels=symbolic_solver_labels,
+                                            warmstart=ptdf_options['non_persistent_warmstart'], prepend_str="iteration {0}, ".format(i))
+            m.solutions.load_from(results)
 
     else: # we hit the iteration limit
         logger.warning('WARNING: Exiting on maximum iterations for lazy PTDF model. Result is not transmission feasible.')
@@ -448,14 +464,12 @@ def solve_dcopf(model_data,
     ## calculate the LMPC (LMP congestion) using numpy
     if dcopf_model_generator == create_ptdf_dcopf_model:
         PTDF = m._PTDF
-        PTDFM = PTDF.PTDFM
         branches_idx = PTDF.branches_keys
 
         NWV = np.array([pe.value(m.p_nw[b]) for b in PTDF.bus_iterator()])
         NWV += PTDF.phi_adjust_array
 
-        PFV  = PTDFM.dot(NWV)
-        PFV += PTDF.phase_shift_array
+        PFV = PTDF.calculate_PFV(NWV)
 
         PFD = np.zeros(len(branches_idx))
         for i,bn in enumerate(branches_idx):
@@ -464,9 +478,10 @@ def solve_dcopf(model_data,
                 PFD[i] += value(m.dual[m.ineq_pf_branch_thermal_lb[bn]])
             if bn in m.ineq_pf_branch_thermal_ub:
                 PFD[i] += value(m.dual[m.ineq_pf_branch_thermal_ub[bn]])
+        lpu.add_contingency_duals(PFD, m, PTDF, m.dual)
         ## TODO: PFD is likely to be sparse, implying we just need a few
         ##       rows of the PTDF matrix (or columns in its transpose).
-        LMPC = -PTDFM.T.dot(PFD)
+        LMPC = PTDF.calculate_LMPC(PFD)
     else:
         for k, k_dict in branches.items():
             k_dict['pf'] = value(m.pf[k])
@@ -0,0 +1,201 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+This module provides a rolling-horizon driver for the unit commitment
+models, which solves a long horizon as a sequence of overlapping windows
+
+The commitment and output of the thermal generators (and the state of
+the storage units) at the end of each step are carried into the initial
+conditions of the next window. A window's model is kept and updated in
+place when it can take the data of the next window, i.e., when no thermal
+unit changes its commitment in the step in a way that changes the
+uptime/downtime or startup cost constraints of the next window (see
+egret.model_library.unit_commitment.uc_model_updater). Otherwise a new
+model is built, which reuses the PTDF matrices and starts from the flow
+constraints monitored in the previous window.
+'''
+
+from egret.models.unit_commitment import UnitCommitmentModel, create_tight_unit_commitment_model
+from egret.common.log import logger
+
+import egret.common.lazy_ptdf_utils as lpu
+
+def _get_status_runs(md_window, step):
+    '''
+    the initial_status (hours on, or negative hours off) of the thermal
+    generators in md_window after the first step time periods, given
+    the commitment in the results of md_window
+    '''
+    time_period_length_hours = md_window.data['system'].get('time_period_length_minutes', 60) / 60.
+
+    initial_status = dict()
+    for g, g_dict in md_window.elements(element_type='generator', generator_type='thermal'):
+        commitment = [ int(round(c)) for c in g_dict['commitment']['values'][:step] ]
+        on = commitment[-1]
+        run = 1
+        while run < step and commitment[step-run-1] == on:
+            run += 1
+        hours = run*time_period_length_hours
+
+        ## the unit kept its state from before the window
+        old_status = g_dict['initial_status']
+        if run == step and (old_status > 0) == bool(on):
+            initial_status[g] = old_status + (hours if on else -hours)
+        else:
+            initial_status[g] = hours if on else -hours
+    return initial_status
+
+def _carry_initial_conditions(md_next, md_window, step):
+    '''
+    sets the initial conditions of the window md_next from the
+    results of the window md_window in time period step-1
+    '''
+    initial_status = _get_status_runs(md_window, step)
+
+    generators = md_next.data['elements'].get('generator', {})
+    for g, status in initial_status.items():
+        g_dict = generators[g]
+        g_dict['initial_status'] = status
+        if status > 0:
+            ## guard against solver tolerances
+            pg = md_window.data['elements']['generator'][g]['pg']['values'][step-1]
+            g_dict['initial_p_output'] = min(max(pg, g_dict['p_min']), g_dict['p_max'])
+        else:
+            g_dict['initial_p_output'] = 0.
+
+    storage = md_next.data['elements'].get('storage', {})
+    for s, s_dict in md_window.elements(element_type='storage'):
+        storage[s]['initial_state_of_charge'] = s_dict['state_of_charge']['values'][step-1]
+        storage[s]['initial_charge_rate'] = s_dict['p_charge']['values'][step-1]
+        storage[s]['initial_discharge_rate'] = s_dict['p_discharge']['values'][step-1]
+
+def _lazy_ptdf(uc):
+    m = uc.model
+    return uc._network and m.power_balance == 'ptdf_power_flow' and m._ptdf_options['lazy']
+
+def solve_rolling_horizon_unit_commitment(model_data,
+                                          solver,
+                                          window,
+                                          step,
+                                          mipgap = 0.001,
+                                          timelimit = None,
+                                          solver_tee = True,
+                                          symbolic_solver_labels = False,
+                                          options = None,
+                                          uc_model_generator = create_tight_unit_commitment_model,
+                                          relaxed = False,
+                                          return_windows = False,
+                                          **kwargs):
+    '''
+    Solve the unit commitment problem over the time periods of model_data
+    in windows of window time periods, which start step time periods apart.
+    The first step time periods of the results of each window are kept, and
+    the commitment and output of the thermal generators and the state of the
+    storage units at the end of these are the initial conditions of the next
+    window. The last window is truncated to the end of model_data, and all
+    of its results are kept.
+
+    Parameters
+    ----------
+    model_data : egret.data.ModelData
+        An egret ModelData object with the appropriate data loaded.
+    solver : str or pyomo.opt.base.solvers.OptSolver
+        Either a string specifying a pyomo solver name, or an instanciated pyomo solver
+    window : int
+        The number of time periods in each window
+    step : int
+        The number of time periods between the starts of the windows,
+        at most window
+    mipgap : float (optional)
+        Mipgap to use for unit commitment solve; default is 0.001
+    timelimit : float (optional)
+        Time limit for each window. Default of None results in no time
+        limit being set -- runs until mipgap is satisfied
+    solver_tee : bool (optional)
+        Display solver log. Default is True.
+    symbolic_solver_labels : bool (optional)
+        Use symbolic solver labels. Useful for debugging; default is False.
+    options : dict (optional)
+        Other options to pass into the solver. Default is dict().
+    uc_model_generator : function (optional)
+        Function for generating the unit commitment model. Default is
+        egret.models.unit_commitment.create_tight_unit_commitment_model
+    relaxed : bool (optional)
+        If True, creates relaxed unit commitment models
+    return_windows : bool (optional)
+        If True, also returns the list of the results of each window
+    kwargs : dictionary (optional)
+        Additional arguments for building the models
+
+    Returns
+    -------
+        egret.data.ModelData : A copy of model_data with the results of
+                               the windows over its time periods
+    '''
+    if not (1 <= step <= window):
+        raise ValueError("step must be between 1 and window, got step={0}, window={1}".format(step, window))
+
+    ## share the PTDF matrices between the models of the windows
+    ptdf_options = dict(kwargs.get('ptdf_options') or {})
+    if ptdf_options.get('ptdf_cache') is None:
+        ptdf_options['ptdf_cache'] = lpu.PTDFCache()
+    kwargs['ptdf_options'] = ptdf_options
+
+    num_time_periods = len(model_data.data['system']['time_indices'])
+    md_results = model_data.clone()
+    window_results = list()
+
+    uc = None
+    initial_conditions = None
+    monitored_flow_constraints = None
+    start = 0
+    while True:
+        stop = min(start+window, num_time_periods)
+        md_window = model_data.slice_time(start, stop)
+        if initial_conditions is not None:
+            _carry_initial_conditions(md_window, *initial_conditions)
+
+        ## keep the model if the new initial conditions allow it
+        if uc is not None:
+            try:
+                uc.update(md_window)
+                logger.info("[rolling horizon] updated the model for time periods {0} to {1}".format(start, stop-1))
+            except ValueError as e:
+                logger.info("[rolling horizon] building a new model for time periods {0} to {1}: {2}".format(start, stop-1, e))
+                uc = None
+        if uc is None:
+            uc = UnitCommitmentModel(md_window, uc_model_generator=uc_model_generator, relaxed=relaxed, **kwargs)
+            if monitored_flow_constraints is not None and _lazy_ptdf(uc):
+                lpu.add_monitored_flow_constraints(uc.model,
+                        { t : constrs for t, constrs in monitored_flow_constraints.items() if t in uc.model.TimePeriods },
+                        prepend_str="[rolling horizon] ")
+
+        md_window_results = uc.solve(solver, mipgap=mipgap, timelimit=timelimit, solver_tee=solver_tee,
+                                     symbolic_solver_labels=symbolic_solver_labels, options=options)
+        ## reuse the instanciated solver, which may be persistent
+        solver = uc.solver
+        window_results.append(md_window_results)
+
+        if stop == num_time_periods:
+            md_results.splice_results(md_window_results, start)
+            break
+
+        md_results.splice_results(md_window_results.slice_time(0, step), start)
+        initial_conditions = (md_window_results, step)
+
+        ## the monitored flow constraints, shifted to the next window
+        if _lazy_ptdf(uc):
+            monitored_flow_constraints = { t-step : constrs for t, constrs in \
+                                            lpu.get_monitored_flow_constraints(uc.model).items() if t-step >= 1 }
+        start += step
+
+    if return_windows:
+        return md_results, window_results
+    return md_results
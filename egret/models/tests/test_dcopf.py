@@ -12,7 +12,10 @@ dcopf tester
 '''
 import os
 import math
+import tempfile
 import unittest
+import numpy as np
+import egret.common.lazy_ptdf_utils as lpu
 from pyomo.opt import SolverFactory, TerminationCondition
 from egret.models.dcopf import *
 from egret.data.model_data import ModelData
@@ -88,5 +91,66 @@ class TestDCOPF(unittest.TestCase):
         comparison = math.isclose(md_serialization.data['system']['total_cost'], md_deserialization.data['system']['total_cost'], rel_tol=1e-6)
         self.assertTrue(comparison)
 
+    @parameterized.expand(zip(test_cases, soln_cases))
+    def test_ptdf_cache_dir(self, test_case, soln_case):
+        dcopf_model = create_ptdf_dcopf_model
+
+        md_dict = create_ModelData(test_case)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            kwargs = {'ptdf_options': {'cache_dir': cache_dir}}
+            md_calculated, results = solve_dcopf(md_dict, "ipopt", dcopf_model_generator=dcopf_model, solver_tee=False, return_results=True, **kwargs)
+            self.assertTrue(results.solver.termination_condition == TerminationCondition.optimal)
+
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            md_cached, results = solve_dcopf(md_dict, "ipopt", dcopf_model_generator=dcopf_model, solver_tee=False, return_results=True, **kwargs)
+            self.assertTrue(results.solver.termination_condition == TerminationCondition.optimal)
+
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+        comparison = math.isclose(md_calculated.data['system']['total_cost'], md_cached.data['system']['total_cost'], rel_tol=1e-6)
+        self.assertTrue(comparison)
+
+    @parameterized.expand(zip(test_cases, soln_cases))
+    def test_ptdf_sparse(self, test_case, soln_case):
+        dcopf_model = create_ptdf_dcopf_model
+
+        md_soln = ModelData.read(soln_case)
+
+        md_dict = create_ModelData(test_case)
+
+        for ptdf_float32, rel_tol in ((False, 1e-6), (True, 1e-4)):
+            kwargs = {'ptdf_options': {'lazy':False, 'sparse_ptdf':True, 'ptdf_float32':ptdf_float32}}
+            md, results = solve_dcopf(md_dict, "ipopt", dcopf_model_generator=dcopf_model, solver_tee=False, return_results=True, **kwargs)
+
+            self.assertTrue(results.solver.termination_condition == TerminationCondition.optimal)
+            comparison = math.isclose(md.data['system']['total_cost'], md_soln.data['system']['total_cost'], rel_tol=rel_tol)
+            self.assertTrue(comparison)
+
+    @parameterized.expand(zip(test_cases, soln_cases))
+    def test_ptdf_contingencies(self, test_case, soln_case):
+        dcopf_model = create_ptdf_dcopf_model
+
+        md_soln = ModelData.read(soln_case)
+
+        md_dict = create_ModelData(test_case)
+        for bn, branch in md_dict.elements(element_type='branch'):
+            if branch['rating_long_term'] is not None:
+                branch['rating_emergency'] = 2*branch['rating_long_term']
+
+        kwargs = {'ptdf_options': {'contingencies': 'all'}}
+        md, m, results = solve_dcopf(md_dict, "ipopt", dcopf_model_generator=dcopf_model, solver_tee=False, return_model=True, return_results=True, **kwargs)
+        self.assertTrue(results.solver.termination_condition == TerminationCondition.optimal)
+
+        ## the contingency constraints can only increase the cost
+        self.assertGreaterEqual(md.data['system']['total_cost'], md_soln.data['system']['total_cost']*(1-1e-6))
+
+        ## no post-contingency flow should exceed its limit
+        PTDF = m._PTDF
+        PFV, _, PFV_K = lpu.calculate_PFV(m, PTDF)
+        PFV_C = PFV[:,np.newaxis] + PTDF.LODF*PFV_K
+        self.assertTrue((np.abs(PFV_C) <= PTDF.enforced_contingency_branch_limits[:,np.newaxis]).all())
+
 if __name__ == '__main__':
      unittest.main()
@@ -0,0 +1,127 @@
+#  ___________________________________________________________________________
+#
+#  EGRET: Electrical Grid Research and Engineering Tools
+#  Copyright 2019 National Technology & Engineering Solutions of Sandia, LLC
+#  (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+#  Government retains certain rights in this software.
+#  This software is distributed under the Revised BSD License.
+#  ___________________________________________________________________________
+
+'''
+rolling horizon unit commitment tester
+'''
+import json
+import os
+import math
+
+import pytest
+import pyomo.environ as pe
+import egret.models.rolling_horizon as rolling_horizon
+from egret.models.rolling_horizon import solve_rolling_horizon_unit_commitment, _carry_initial_conditions
+from egret.models.unit_commitment import solve_unit_commitment, create_tight_unit_commitment_model, UnitCommitmentModel
+from egret.common.lazy_ptdf_utils import PTDFCache
+from egret.data.model_data import ModelData
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+def _get_ptdf_uc_model(model_data, relaxed=False, **kwargs):
+    return create_tight_unit_commitment_model(model_data,
+                            network_constraints='ptdf_power_flow',
+                            relaxed=relaxed,
+                            **kwargs)
+
+def _get_test_model_data():
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+    return ModelData(json.load(open(input_json_file_name, 'r')))
+
+def test_rolling_horizon_single_window():
+    md_in = _get_test_model_data()
+    num_time_periods = len(md_in.data['system']['time_indices'])
+
+    md_results, windows = solve_rolling_horizon_unit_commitment(md_in, 'cbc', num_time_periods, num_time_periods, mipgap=0.0,
+                                                                uc_model_generator=_get_ptdf_uc_model, return_windows=True)
+    md_full = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator=_get_ptdf_uc_model)
+
+    assert len(windows) == 1
+    assert math.isclose(md_full.data['system']['total_cost'], windows[0].data['system']['total_cost'])
+    for g, g_dict in windows[0].elements(element_type='generator', generator_type='thermal'):
+        assert md_results.data['elements']['generator'][g]['commitment']['values'] == g_dict['commitment']['values']
+
+def test_rolling_horizon():
+    md_in = _get_test_model_data()
+    num_time_periods = len(md_in.data['system']['time_indices'])
+    window, step = 12, 6
+
+    ptdf_cache = PTDFCache()
+    md_results, windows = solve_rolling_horizon_unit_commitment(md_in, 'cbc', window, step, mipgap=0.0,
+                                                                uc_model_generator=_get_ptdf_uc_model, return_windows=True,
+                                                                ptdf_options={'ptdf_cache':ptdf_cache})
+
+    ## the windows start at 0, 6, and 12
+    assert len(windows) == 3
+    assert [ len(md.data['system']['time_indices']) for md in windows ] == [12, 12, 12]
+
+    ## the PTDF matrix is calculated once
+    assert list(ptdf_cache.keys()) == [()]
+
+    ## the input is unchanged
+    assert 'commitment' not in md_in.data['elements']['generator']['GEN1_0_t']
+
+    for g, g_dict in md_results.elements(element_type='generator', generator_type='thermal'):
+        commitment = g_dict['commitment']['values']
+        assert len(commitment) == num_time_periods
+        assert None not in commitment
+        assert None not in g_dict['pg']['values']
+
+        ## the state at the end of each step is
+        ## carried into the next window
+        for i, md_window in enumerate(windows[1:]):
+            gen = md_window.data['elements']['generator'][g]
+            on = round(commitment[(i+1)*step-1])
+            assert (gen['initial_status'] > 0) == bool(on)
+            if on:
+                assert math.isclose(gen['initial_p_output'], g_dict['pg']['values'][(i+1)*step-1], abs_tol=1e-6)
+            ## the results are the first step time periods of the window
+            assert [ round(c) for c in md_window.data['elements']['generator'][g]['commitment']['values'][:step] ] == \
+                    [ round(c) for c in commitment[(i+1)*step:(i+2)*step] ]
+
+def test_rolling_horizon_model_reuse(monkeypatch):
+    md_in = _get_test_model_data()
+    window, step = 12, 6
+
+    ## the thermal units are on for the whole horizon, so the
+    ## initial conditions of every window leave the model's structure
+    for g, g_dict in md_in.elements(element_type='generator', generator_type='thermal'):
+        g_dict['fixed_commitment'] = 1
+        g_dict['initial_status'] = 24
+        g_dict['initial_p_output'] = g_dict['p_min']
+
+    built = list()
+    class CountingUnitCommitmentModel(UnitCommitmentModel):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            built.append(self)
+    monkeypatch.setattr(rolling_horizon, 'UnitCommitmentModel', CountingUnitCommitmentModel)
+
+    md_results, windows = solve_rolling_horizon_unit_commitment(md_in, 'cbc', window, step, mipgap=0.0,
+                                                                uc_model_generator=_get_ptdf_uc_model, return_windows=True)
+
+    ## one model for all three windows
+    assert len(windows) == 3
+    assert len(built) == 1
+    m = built[0].model
+    for g, g_dict in windows[-1].elements(element_type='generator', generator_type='thermal'):
+        assert g_dict['initial_status'] == 36
+        assert pe.value(m.UnitOnT0State[g]) == 36
+
+    ## which gives the same results as a new model for the last window
+    md_last = md_in.slice_time(2*step, 2*step+window)
+    _carry_initial_conditions(md_last, windows[1], step)
+    md_full = solve_unit_commitment(md_last, solver='cbc', mipgap=0.0, uc_model_generator=_get_ptdf_uc_model)
+    assert math.isclose(md_full.data['system']['total_cost'], windows[-1].data['system']['total_cost'])
+
+def test_rolling_horizon_bad_step():
+    md_in = _get_test_model_data()
+    with pytest.raises(ValueError):
+        solve_rolling_horizon_unit_commitment(md_in, 'cbc', 6, 12)
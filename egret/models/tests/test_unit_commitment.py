@@ -13,13 +13,16 @@ unit commitment tester
 import json
 import os
 import math
+import tempfile
 
 import pytest
 import unittest
+import pyomo.environ as pe
 from pyomo.opt import SolverFactory, TerminationCondition
 from pyomo.core.plugins.transform.relax_integrality \
         import RelaxIntegrality
 from egret.models.unit_commitment import *
+import egret.common.lazy_ptdf_utils as lpu
 from egret.data.model_data import ModelData
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -136,7 +139,7 @@ def test_uc_runner():
 def test_uc_transmission_models():
 
     ## the network tests can optionally specify some kwargs so we can pass them into solve_unit_commitment
-    tc_networks = {'btheta_power_flow': [dict()], 'ptdf_power_flow':[{'ptdf_options': {'lazy':False}}, dict()], 'power_balance_constraints':[dict()],}
+    tc_networks = {'btheta_power_flow': [dict()], 'ptdf_power_flow':[{'ptdf_options': {'lazy':False}}, {'ptdf_options': {'ptdf_method':'dense'}}, {'ptdf_options': {'lazy_ptdf_rows':True}}, {'ptdf_options': {'batch_violation_check':False}}, {'ptdf_options': {'non_persistent_warmstart':True}}, {'ptdf_options': {'lazy_interfaces':False}}, {'ptdf_options': {'num_threads':2}}, {'ptdf_options': {'num_threads':2, 'batch_violation_check':False}}, {'ptdf_options': {'sparse_ptdf':True}}, dict()], 'power_balance_constraints':[dict()],}
     no_network = 'copperplate_power_flow'
     test_names = ['tiny_uc_tc', 'tiny_uc_tc_2'] ## based on tiny_uc_1, tiny_uc_tc_2 has an interface
 
@@ -230,3 +233,243 @@ def test_uc_ptdf_serialization_deserialization():
     md_deserialization = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
 
     assert math.isclose(md_serialization.data['system']['total_cost'], md_deserialization.data['system']['total_cost'])
+
+def test_uc_binding_constraint_store():
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store_file = os.path.join(tmpdir, 'binding_constraints.json')
+        kwargs = {'ptdf_options' : {'binding_constraint_store': store_file}}
+
+        md_first, results_first = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), return_results=True, **kwargs)
+        assert os.path.isfile(store_file)
+
+        md_second, results_second = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), return_results=True, **kwargs)
+
+    assert math.isclose(md_first.data['system']['total_cost'], md_second.data['system']['total_cost'])
+    assert results_second.egret_metasolver['iterations'] <= results_first.egret_metasolver['iterations']
+
+    ## the hours are those of the time indices, not
+    ## counted from the first time period of the solve
+    store = lpu.BindingConstraintStore()
+    kwargs = {'ptdf_options' : {'binding_constraint_store': store}}
+    solve_unit_commitment(md_in.slice_time(6, 18), solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+    for constrs in store._constraints.values():
+        for bn, sense, hour in constrs:
+            assert 6 <= hour < 18
+
+def test_binding_constraint_store_prune():
+    store = lpu.BindingConstraintStore(max_age=2)
+
+    store.begin_run()
+    store.add('topology', 'Branch1', 'UB', 3)
+    store.prune()
+    store.begin_run()
+    store.add('topology', 'Branch2', 'LB', 3)
+    store.prune()
+    assert sorted(store.get('topology', 3)) == [('Branch1', 'UB'), ('Branch2', 'LB')]
+    assert store.get('topology', 4) == []
+    assert store.get('other topology', 3) == []
+
+    ## Branch1 was last binding two runs ago
+    store.begin_run()
+    store.add('topology', 'Branch2', 'LB', 3)
+    store.prune()
+    assert store.get('topology', 3) == [('Branch2', 'LB')]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store.file_name = os.path.join(tmpdir, 'binding_constraints.json')
+        store.write()
+        store_read = lpu.BindingConstraintStore(store.file_name, max_age=2)
+    assert store_read.get('topology', 3) == [('Branch2', 'LB')]
+
+    ## an empty run removes everything
+    store_read.begin_run()
+    store_read.begin_run()
+    store_read.prune()
+    assert store_read.get('topology', 3) == []
+
+def test_uc_performance_report():
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trace_file = os.path.join(tmpdir, 'trace.json')
+        md_results, results = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'),
+                                                    return_results=True, performance_trace=trace_file)
+        with open(trace_file, 'r') as f:
+            trace = json.load(f)
+
+    report = results.egret_metasolver['performance']
+    assert trace == report
+
+    phases = { p['name'] : p for p in report['phases'] }
+    for name in ('params', 'status_vars', 'power_balance', 'objective'):
+        assert name in phases
+        assert phases[name]['time'] >= 0.
+    assert phases['status_vars']['variables'] > 0
+    assert phases['power_balance']['constraints'] > 0
+
+    ## every lazy iteration records its check, add, and solve times
+    assert len(report['lazy_iterations']) > 0
+    for it in report['lazy_iterations']:
+        assert it['check_time'] >= 0. and it['add_time'] >= 0. and it['solve_time'] >= 0.
+
+def test_uc_model_update():
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    uc = UnitCommitmentModel(md_in, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'))
+    md_results = uc.solve(solver='cbc', mipgap=0.0)
+
+    reference_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'_results.json')
+    md_reference = ModelData(json.load(open(reference_json_file_name, 'r')))
+    assert math.isclose(md_reference.data['system']['total_cost'], md_results.data['system']['total_cost'])
+
+    ## a new forecast, with the loads and reserve requirements 2% higher
+    md_new = md_in.clone()
+    for load in md_new.data['elements']['load'].values():
+        load['p_load'] = { 'data_type':'time_series', 'values': [ 1.02*p for p in load['p_load']['values'] ] }
+    system = md_new.data['system']
+    for req in ('reserve_requirement', 'spinning_reserve_requirement', 'regulation_up_requirement'):
+        system[req] = { 'data_type':'time_series', 'values': [ 1.02*r for r in system[req]['values'] ] }
+
+    uc.update(md_new)
+    md_update = uc.solve(mipgap=0.0)
+
+    md_full = solve_unit_commitment(md_new, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'))
+    assert math.isclose(md_full.data['system']['total_cost'], md_update.data['system']['total_cost'])
+    assert md_update.data['system']['total_cost'] > md_results.data['system']['total_cost']
+
+    ## the initial status changes the structure of the model
+    md_status = md_new.clone()
+    gen = md_status.data['elements']['generator']['GEN5_0_t']
+    gen['initial_status'] = -gen['initial_status']
+    with pytest.raises(ValueError):
+        uc.update(md_status)
+
+    ## and the model is unchanged
+    assert math.isclose(md_update.data['system']['total_cost'], uc.solve(mipgap=0.0).data['system']['total_cost'])
+
+    ## but units on for longer than their minimum up time can stay on longer
+    md_on = md_new.clone()
+    for gen in md_on.data['elements']['generator'].values():
+        if gen['generator_type'] == 'thermal' and gen['initial_status'] >= gen['min_up_time']:
+            gen['initial_status'] += 16
+    uc.update(md_on)
+    assert pe.value(uc.model.UnitOnT0State['GEN1_0_t']) == 24
+    md_update = uc.solve(mipgap=0.0)
+
+    md_full = solve_unit_commitment(md_on, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'))
+    assert math.isclose(md_full.data['system']['total_cost'], md_update.data['system']['total_cost'])
+
+def test_uc_model_update_invalid(monkeypatch):
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    uc = UnitCommitmentModel(md_in, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'))
+    md_results = uc.solve(solver='cbc', mipgap=0.0)
+
+    ## new loads, but an initial output above the generator's maximum
+    md_bad = md_in.clone()
+    for load in md_bad.data['elements']['load'].values():
+        load['p_load'] = { 'data_type':'time_series', 'values': [ 1.02*p for p in load['p_load']['values'] ] }
+    gen = md_bad.data['elements']['generator']['GEN1_0_t']
+    gen['initial_p_output'] = 2*gen['p_max']
+
+    def get_values(m):
+        param_values = { (param.name, idx) : pe.value(v) for param in (m.Demand, m.TotalDemand, m.PowerGeneratedT0)
+                            for idx, v in param.items() }
+        load_values = { (t, bus) : v.value for t, b in m.TransmissionBlock.items() for bus, v in b.pl.items() }
+        load_shedding_ubs = { idx : v.ub for idx, v in m.LoadShedding.items() }
+        return param_values, load_values, load_shedding_ubs
+
+    values = get_values(uc.model)
+    model_data = uc.model.model_data
+    with pytest.raises(ValueError):
+        uc.update(md_bad)
+    assert get_values(uc.model) == values
+    assert uc.model.model_data is model_data
+
+    ## the same, without checking the values first, so
+    ## the invalid initial output is only found by pyomo
+    from egret.model_library.unit_commitment import uc_model_updater
+    monkeypatch.setattr(uc_model_updater, '_check_param_values', lambda model, param_values : None)
+    with pytest.raises(ValueError):
+        uc.update(md_bad)
+    assert get_values(uc.model) == values
+    assert uc.model.model_data is model_data
+
+    assert math.isclose(md_results.data['system']['total_cost'], uc.solve(mipgap=0.0).data['system']['total_cost'])
+
+def test_uc_ptdf_outage_update():
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    ## add a parallel branch which is out of service for part of the horizon
+    branch = dict(md_in.data['elements']['branch']['Branch1'])
+    branch['rating_long_term'] = 100
+    branch['planned_outage'] = { 'data_type':'time_series',
+                                 'values': [ (t % 3 == 0) for t in range(len(md_in.data['system']['time_indices'])) ] }
+    md_in.data['elements']['branch']['Branch2'] = branch
+    md_in.data['elements']['branch']['Branch1']['rating_long_term'] = 200
+
+    kwargs = {'ptdf_options' : {'low_rank_outage_update': True}}
+    md_update = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+
+    kwargs = {'ptdf_options' : {'low_rank_outage_update': False}}
+    md_full = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+
+    kwargs = {'ptdf_options' : {'low_rank_outage_update': False, 'ptdf_workers': 2}}
+    md_parallel = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+
+    for md in (md_update, md_parallel):
+        assert math.isclose(md.data['system']['total_cost'], md_full.data['system']['total_cost'])
+        for t in range(len(md_in.data['system']['time_indices'])):
+            for bn in ('Branch1', 'Branch2'):
+                assert math.isclose(md.data['elements']['branch'][bn]['pf']['values'][t],
+                                    md_full.data['elements']['branch'][bn]['pf']['values'][t], abs_tol=1e-6)
+
+def test_uc_ptdf_outage_update_cached(monkeypatch):
+    test_name = 'tiny_uc_tc' ## based on tiny_uc_1
+    input_json_file_name = os.path.join(current_dir, 'uc_test_instances', test_name+'.json')
+
+    md_in = ModelData(json.load(open(input_json_file_name, 'r')))
+
+    ## add a parallel branch which is out of service for part of the horizon
+    branch = dict(md_in.data['elements']['branch']['Branch1'])
+    branch['planned_outage'] = { 'data_type':'time_series',
+                                 'values': [ (t % 3 == 0) for t in range(len(md_in.data['system']['time_indices'])) ] }
+    md_in.data['elements']['branch']['Branch2'] = branch
+
+    import egret.data.data_utils as data_utils
+    calculate_ptdf = data_utils.tx_calc.calculate_ptdf
+    calls = list()
+    def counting_calculate_ptdf(*args, **kwargs):
+        calls.append(args)
+        return calculate_ptdf(*args, **kwargs)
+    monkeypatch.setattr(data_utils.tx_calc, 'calculate_ptdf', counting_calculate_ptdf)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        kwargs = {'ptdf_options' : {'low_rank_outage_update': True, 'cache_dir': cache_dir}}
+        md_calculated = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+        ## only the PTDF matrix with every branch in service is calculated in full
+        assert len(calls) == 1
+
+        ## which is loaded from the cache, and still
+        ## used for the outages by a low-rank update
+        md_cached = solve_unit_commitment(md_in, solver='cbc', mipgap=0.0, uc_model_generator = _make_get_dcopf_uc_model('ptdf_power_flow'), **kwargs)
+        assert len(calls) == 1
+
+    assert math.isclose(md_calculated.data['system']['total_cost'], md_cached.data['system']['total_cost'])
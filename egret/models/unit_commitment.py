@@ -17,11 +17,14 @@ unit commitment formulations
 from egret.model_library.unit_commitment.uc_model_generator \
         import UCFormulation, generate_model 
 from egret.common.log import logger
-from egret.model_library.transmission.tx_utils import unscale_ModelData_to_pu
+from egret.model_library.unit_commitment import uc_model_updater
+from egret.model_library.transmission.tx_utils import scale_ModelData_to_pu, unscale_ModelData_to_pu
 from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
 from pyomo.solvers.plugins.solvers.gurobi_persistent import GurobiPersistent 
 
+import time
 import egret.common.lazy_ptdf_utils as lpu
+from egret.common.instrumentation import PerformanceReport
 import egret.data.data_utils as data_utils
 import pyomo.environ as pe
 import numpy as np
@@ -555,6 +558,7 @@ def _lazy_ptdf_warmstart_copy_violations(m, md, t_subset, solver, ptdf_options,
     gt_viol_lazy = dict()
     lt_viol_lazy = dict()
     total_flow_constr_added = 0
+    constrs_to_add = list()
     for t_o in m.TimePeriods:
         if t_o in t_subset:
             continue
@@ -577,17 +581,21 @@ def _lazy_ptdf_warmstart_copy_violations(m, md, t_subset, solver, ptdf_options,
         PVF[t_o], gt_viol_lazy[t_o], lt_viol_lazy[t_o] = lpu.copy_active_to_next_time(m,  b_other, PTDF_other, slacks_ub, slacks_lb)
 
         logger.debug(prepend_str+"adding {0} flow constraints at time {1}".format(len(gt_viol_lazy[t_o])+len(lt_viol_lazy[t_o]),t_o))
-        lpu.add_violations(gt_viol_lazy[t_o], lt_viol_lazy[t_o], PVF[t_o], b_other, md, solver, ptdf_options, PTDF_other, time=t_o, prepend_str=prepend_str)
+        lpu.add_violations(gt_viol_lazy[t_o], lt_viol_lazy[t_o], PVF[t_o], b_other, md, solver, ptdf_options, PTDF_other, time=t_o, prepend_str=prepend_str, constrs_to_add=constrs_to_add)
         total_flow_constr_added += len(gt_viol_lazy[t_o]) + len(lt_viol_lazy[t_o])
+    lpu.add_constraints_to_solver(solver, constrs_to_add)
     logger.info(prepend_str+"added {0} flow constraint(s)".format(total_flow_constr_added))
 
-def _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load):
+def _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load, prepend_str=""):
     if persistent_solver:
         results = solver.solve(m, tee=solver_tee, load_solutions=False, save_results=False)
         solver.load_vars(vars_to_load)
     else:
-        results = solver.solve(m, tee=solver_tee, symbolic_solver_labels=symbolic_solver_labels, load_solutions=False)
+        from egret.common.solver_interface import _solve_non_persistent
+        results = _solve_non_persistent(m, solver, solver_tee=solver_tee, symbolic_solver_labels=symbolic_solver_labels,
+                                        warmstart=m._ptdf_options['non_persistent_warmstart'], prepend_str=prepend_str)
         m.solutions.load_from(results)
+    return results
 
 def _lazy_ptdf_normal_terminatation(all_viol_in_model, results, i, prepend_str):
     if all_viol_in_model:
@@ -595,6 +603,15 @@ def _lazy_ptdf_normal_terminatation(all_viol_in_model, results, i, prepend_str):
         return lpu.LazyPTDFTerminationCondition.FLOW_VIOLATION, results, i
     return lpu.LazyPTDFTerminationCondition.NORMAL, results, i
 
+def _get_performance_report(m):
+    '''
+    the PerformanceReport for the model m, which is created
+    if m was not built by uc_model_generator.generate_model
+    '''
+    if not hasattr(m, '_performance_report'):
+        m._performance_report = PerformanceReport()
+    return m._performance_report
+
 def _lazy_ptdf_uc_solve_loop(m, md, solver, timelimit, solver_tee=True, symbolic_solver_labels=False, iteration_limit=100000, vars_to_load=None, add_all_lazy_violations=False, warmstart_loop=False, t_subset=None, vars_to_load_t_subset=None, prepend_str=""):
     '''
     The lazy PTDF unit commitment solver loop. This function iteratively
@@ -647,16 +664,22 @@ def _lazy_ptdf_uc_solve_loop(m, md, solver, timelimit, solver_tee=True, symbolic
     results = None 
 
     ptdf_options = m._ptdf_options
+    report = _get_performance_report(m)
 
     PVF = dict()
+    PVF_I = dict()
     viol_num = dict()
     mon_viol_num = dict()
     gt_viol_lazy = dict()
     lt_viol_lazy = dict()
+    gt_viol_lazy_I = dict()
+    lt_viol_lazy_I = dict()
+    gt_viol_lazy_C = dict()
+    lt_viol_lazy_C = dict()
 
     if warmstart_loop:
         if t_subset is None:
-            t_subset = [max(m.TotalDemand, key=m.TotalDemand.__getitem__)]
+            t_subset = [max(m.TimePeriods, key=lambda t : pe.value(m.TotalDemand[t]))]
         time_periods = t_subset
         if vars_to_load_t_subset is None:
             vars_to_load_t_subset = vars_to_load
@@ -668,17 +691,37 @@ def _lazy_ptdf_uc_solve_loop(m, md, solver, timelimit, solver_tee=True, symbolic
         vars_to_load_time_periods = vars_to_load
 
 
-    for i in range(iteration_limit):
+    ## group the time periods by PTDF matrix so the flows
+    ## can be checked for all of them at once
+    if ptdf_options['batch_violation_check']:
+        time_periods_by_PTDF = dict()
         for t in time_periods:
-            b = m.TransmissionBlock[t]
+            time_periods_by_PTDF.setdefault(m.TransmissionBlock[t]._PTDF, list()).append(t)
 
-            PTDF = b._PTDF
+    ## the violation checks for each time period are independent,
+    ## so they can be done in a pool of threads
+    num_threads = ptdf_options['num_threads']
+    def _check_violations(t):
+        b = m.TransmissionBlock[t]
+        return lpu.check_violations(b, md, b._PTDF, ptdf_options['max_violations_per_iteration'], time=t, prepend_str=prepend_str)
 
-            PVF[t], viol_num[t], mon_viol_num[t], gt_viol_lazy[t], lt_viol_lazy[t] = \
-                    lpu.check_violations(b, md, PTDF, ptdf_options['max_violations_per_iteration'], time=t, prepend_str=prepend_str)
+    for i in range(iteration_limit):
+        check_start = time.perf_counter()
+        if ptdf_options['batch_violation_check']:
+            viol_data = list()
+            for PTDF, t_batch in time_periods_by_PTDF.items():
+                viol_data.extend(zip(t_batch, lpu.check_violations_batch([m.TransmissionBlock[t] for t in t_batch], md, PTDF, ptdf_options['max_violations_per_iteration'],
+                                                                         times=t_batch, prepend_str=prepend_str, num_threads=num_threads)))
+        else:
+            viol_data = zip(time_periods, lpu.map_in_threads(_check_violations, time_periods, num_threads))
+
+        for t, t_viol_data in viol_data:
+            PVF[t], PVF_I[t], viol_num[t], mon_viol_num[t], gt_viol_lazy[t], lt_viol_lazy[t], gt_viol_lazy_I[t], lt_viol_lazy_I[t], \
+                    gt_viol_lazy_C[t], lt_viol_lazy_C[t] = t_viol_data
 
         total_viol_num = sum(viol_num.values())
         total_mon_viol_num = sum(mon_viol_num.values())
+        check_time = time.perf_counter() - check_start
 
         ## this flag is for if we found violations **and** every violation is in the model
         all_viol_in_model = (total_viol_num > 0) and (total_viol_num == total_mon_viol_num)
@@ -695,53 +738,68 @@ def _lazy_ptdf_uc_solve_loop(m, md, solver, timelimit, solver_tee=True, symbolic
         logger.info(iter_status_str)
 
         if terminate_this_iter and not add_all_lazy_violations:
+            solve_start = time.perf_counter()
             if warmstart_loop:
                 _lazy_ptdf_warmstart_copy_violations(m, md, time_periods, solver, ptdf_options, prepend_str)
-                results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load)
+                results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load, prepend_str)
+            report.record_iteration(prepend_str, i, check_time, solve_time=time.perf_counter()-solve_start, violations=total_viol_num)
             if persistent_solver and duals and (results is not None) and (vars_to_load is None):
                 solver.load_duals()
             return _lazy_ptdf_normal_terminatation(all_viol_in_model, results, i, prepend_str)
 
+        add_start = time.perf_counter()
         total_flow_constr_added = 0
+        ## collect the new constraints for every time
+        ## period and add them to the solver together
+        constrs_to_add = list()
         for t in time_periods:
             b = m.TransmissionBlock[t]
 
             PTDF = b._PTDF
 
-            lpu.add_violations(gt_viol_lazy[t], lt_viol_lazy[t], PVF[t], b, md, solver, ptdf_options, PTDF, time=t, prepend_str=prepend_str)
-            total_flow_constr_added += len(gt_viol_lazy[t]) + len(lt_viol_lazy[t])
+            lpu.add_violations(gt_viol_lazy[t], lt_viol_lazy[t], PVF[t], b, md, solver, ptdf_options, PTDF, time=t, prepend_str=prepend_str, constrs_to_add=constrs_to_add,
+                               gt_viol_lazy_I=gt_viol_lazy_I[t], lt_viol_lazy_I=lt_viol_lazy_I[t], PFV_I=PVF_I[t],
+                               gt_viol_lazy_C=gt_viol_lazy_C[t], lt_viol_lazy_C=lt_viol_lazy_C[t])
+            total_flow_constr_added += len(gt_viol_lazy[t]) + len(lt_viol_lazy[t]) + len(gt_viol_lazy_I[t]) + len(lt_viol_lazy_I[t]) \
+                                        + len(gt_viol_lazy_C[t]) + len(lt_viol_lazy_C[t])
+        lpu.add_constraints_to_solver(solver, constrs_to_add)
+        add_time = time.perf_counter() - add_start
 
         logger.info(prepend_str+"iteration {0}, added {1} flow constraint(s)".format(i,total_flow_constr_added))
 
         ## NOTE: Here we should not load additional variables as
         ##       we've added more constraints to the model
         if terminate_this_iter and add_all_lazy_violations:
+            report.record_iteration(prepend_str, i, check_time, add_time, violations=total_viol_num, added=total_flow_constr_added)
             return _lazy_ptdf_normal_terminatation(all_viol_in_model, results, i, prepend_str)
 
-        results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load_time_periods)
+        solve_start = time.perf_counter()
+        results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load_time_periods, prepend_str)
+        report.record_iteration(prepend_str, i, check_time, add_time, time.perf_counter()-solve_start,
+                                violations=total_viol_num, added=total_flow_constr_added)
 
     else:
         logger.warning(prepend_str+'WARNING: Exiting on maximum iterations for lazy PTDF model. Result is not transmission feasible.')
         if warmstart_loop:
-            _lazy_ptdf_warmstart_copy_violations(m, md, time_periods, solver, ptdf_options)
-            results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load)
+            _lazy_ptdf_warmstart_copy_violations(m, md, time_periods, solver, ptdf_options, prepend_str)
+            results = _lazy_ptdf_solve(m, solver, persistent_solver, symbolic_solver_labels, solver_tee, vars_to_load, prepend_str)
         if persistent_solver and duals and (results is not None) and (vars_to_load is None):
             solver.load_duals()
         return lpu.LazyPTDFTerminationCondition.ITERATION_LIMIT, results, i
 
-def _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels, options, relaxed):
+def _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels, options, relaxed, set_instance=True):
 
     from egret.common.solver_interface import _solve_model
-    import time
 
     egret_metasolver_status = dict()
+    report = _get_performance_report(m)
 
     start_time = time.time()
 
     ## cache here the variables that need to be 
     ## loaded to check transimission feasbility
     ## for a persistent solver
-    max_demand_time = max(m.TotalDemand, key=m.TotalDemand.__getitem__)
+    max_demand_time = max(m.TimePeriods, key=lambda t : pe.value(m.TotalDemand[t]))
     t_subset = [max_demand_time, ]
     if isinstance(solver, PersistentSolver) or (isinstance(solver,str) and 'persistent' in solver):
         vars_to_load = list()
@@ -764,11 +822,18 @@ def _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbol
     lp_warmstart_iter_limit = m._ptdf_options['pre_lp_iteration_limit']
     model_data = m.model_data
 
+    ## start from the flow constraints which were
+    ## binding in earlier solves, if we have them
+    binding_constraint_store = lpu.get_binding_constraint_store(m._ptdf_options)
+    if binding_constraint_store is not None:
+        lpu.add_stored_binding_constraints(m, binding_constraint_store, solver=(None if set_instance else solver), prepend_str="[binding constraint store] ")
+
     ## if this is a MIP, iterate though a few times with just the LP relaxation
     if not relaxed and lp_iter_limit > 0:
 
-        lpu.uc_instance_binary_relaxer(m, None)
-        m, results_init, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True, vars_to_load = vars_to_load)
+        lpu.uc_instance_binary_relaxer(m, None if set_instance else solver)
+        with report.phase('initial LP solve'):
+            m, results_init, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True, vars_to_load = vars_to_load, set_instance=set_instance)
         if lp_warmstart_iter_limit > 0:
             lp_warmstart_termination_cond, results, lp_warmstart_iterations = \
                     _lazy_ptdf_uc_solve_loop(m, model_data, solver, timelimit, solver_tee=solver_tee,iteration_limit=lp_warmstart_iter_limit, vars_to_load_t_subset = vars_to_load_t_subset, vars_to_load=vars_to_load, t_subset=t_subset, warmstart_loop=True, prepend_str="[LP warmstart phase] ")
@@ -787,22 +852,26 @@ def _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbol
 
         if m._ptdf_options['lp_cleanup_phase']:
             tot_removed = 0
+            constrs_to_remove = list()
             for t,b in m.TransmissionBlock.items():
-                tot_removed += lpu.remove_inactive(b, solver, t, prepend_str="[LP cleanup phase] ")
+                tot_removed += lpu.remove_inactive(b, solver, t, prepend_str="[LP cleanup phase] ", constrs_to_remove=constrs_to_remove)
+            lpu.remove_constraints_from_solver(solver, constrs_to_remove)
             logger.info("[LP cleanup phase] removed {0} inactive flow constraint(s)".format(tot_removed))
 
         lpu.uc_instance_binary_enforcer(m, solver)
 
         ## solve the MIP after enforcing binaries
-        results_init = solver.solve(m, tee=solver_tee, load_solutions=False)
-        if isinstance(solver, PersistentSolver):
-            solver.load_vars(vars_to_load)
-        else:
-            m.solutions.load_from(results_init)
+        with report.phase('initial MIP solve'):
+            results_init = solver.solve(m, tee=solver_tee, load_solutions=False)
+            if isinstance(solver, PersistentSolver):
+                solver.load_vars(vars_to_load)
+            else:
+                m.solutions.load_from(results_init)
 
     ## else if relaxed or lp_iter_limit == 0, do an initial solve
     else:
-        m, results_init, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True, vars_to_load=vars_to_load)
+        with report.phase('initial solve'):
+            m, results_init, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True, vars_to_load=vars_to_load, set_instance=set_instance)
 
     iter_limit = m._ptdf_options['iteration_limit']
     
@@ -825,6 +894,10 @@ def _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbol
         if hasattr(m, "slack"):
             solver.load_slacks()
 
+    if binding_constraint_store is not None:
+        lpu.record_binding_constraints(m, binding_constraint_store)
+        binding_constraint_store.write()
+
     egret_metasolver_status['time'] = time.time() - start_time
     results.egret_metasolver = egret_metasolver_status
 
@@ -839,6 +912,18 @@ def _time_series_dict(values):
 def _preallocated_list(other_iter):
     return [ None for _ in other_iter ]
 
+def _get_time_series_arrays(component, index_set, time_periods):
+    '''
+    Returns a dict mapping each i in index_set to a numpy array with the
+    values of component[i,t] for t in time_periods. The values of a Var
+    are read for the whole indexed component in one pass.
+    '''
+    _len_time = len(time_periods)
+    if isinstance(component, pe.Var):
+        values = { idx : var_data.value for idx, var_data in component.items() }
+        return { i : np.fromiter((values[i,t] for t in time_periods), float, count=_len_time) for i in index_set }
+    return { i : np.fromiter((pe.value(component[i,t]) for t in time_periods), float, count=_len_time) for i in index_set }
+
 def solve_unit_commitment(model_data,
                           solver,
                           mipgap = 0.001,
@@ -850,6 +935,7 @@ def solve_unit_commitment(model_data,
                           relaxed = False,
                           return_model = False,
                           return_results = False,
+                          performance_trace = None,
                           **kwargs):
     '''
     Create and solve a new unit commitment model
@@ -881,13 +967,15 @@ def solve_unit_commitment(model_data,
         If True, returns the pyomo model object
     return_results : bool (optional)
         If True, returns the pyomo results object
+    performance_trace : str (optional)
+        If given, the time and memory used by each phase of the model
+        build and solve (which is always available on the results object
+        as results.egret_metasolver['performance']) is written to this
+        file as JSON
     kwargs : dictionary (optional)
         Additional arguments for building model
     '''
 
-    from pyomo.environ import value
-    from egret.common.solver_interface import _solve_model
-
     m = uc_model_generator(model_data, relaxed=relaxed, **kwargs)
 
     network = ('branch' in model_data.data['elements']) and bool(len(model_data.data['elements']['branch']))
@@ -895,10 +983,36 @@ def solve_unit_commitment(model_data,
     if relaxed:
         m.dual = pe.Suffix(direction=pe.Suffix.IMPORT)
 
+    md, m, results, solver = _solve_unit_commitment_model(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels,
+                                                          options, relaxed, network, performance_trace)
+
+    if return_model and return_results:
+        return md, m, results
+    elif return_model:
+        return md, m
+    elif return_results:
+        return md, results
+    return md
+
+def _solve_unit_commitment_model(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels,
+                                 options, relaxed, network, performance_trace=None, set_instance=True):
+    '''
+    Solves the unit commitment model m and saves the results in m.model_data,
+    which is returned (scaled back from p.u.) with m, the pyomo results
+    object, and the (instanciated) solver. See solve_unit_commitment.
+    '''
+    from pyomo.environ import value
+    from egret.common.solver_interface import _solve_model
+
+    report = _get_performance_report(m)
     if m.power_balance == 'ptdf_power_flow' and m._ptdf_options['lazy'] and network:
-        m, results, solver = _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels, options, relaxed )
+        m, results, solver = _outer_lazy_ptdf_solve_loop(m, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels, options, relaxed, set_instance=set_instance)
     else:
-        m, results, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True)
+        with report.phase('solve'):
+            m, results, solver = _solve_model(m,solver,mipgap,timelimit,solver_tee,symbolic_solver_labels,options, return_solver=True, set_instance=set_instance)
+        results.egret_metasolver = dict()
+
+    extract_start = time.perf_counter()
 
     md = m.model_data
 
@@ -938,163 +1052,142 @@ def solve_unit_commitment(model_data,
     if hasattr(m, 'fuel_consumption'):
         fc = True
 
-    for g,g_dict in thermal_gens.items():
-        pg_dict = _preallocated_list(data_time_periods)
-        if reserve_requirement:
-            rg_dict = _preallocated_list(data_time_periods)
-        commitment_dict = _preallocated_list(data_time_periods)
-        commitment_cost_dict = _preallocated_list(data_time_periods)
-        production_cost_dict = _preallocated_list(data_time_periods)
-        ramp_up_avail_dict = _preallocated_list(data_time_periods)
-
-        ## all of the potential constraints that could limit maximum output
-        ## Not all unit commitment models have these constraints, so first
-        ## we need check if they're on the model object
-        ramp_up_avail_potential_constrs = [
-                                          'EnforceMaxAvailableRampUpRates',
-                                          'AncillaryServiceRampUpLimit',
-                                          'power_limit_from_start',
-                                          'power_limit_from_stop',
-                                          'power_limit_from_start_stop',
-                                          'power_limit_from_start_stops',
-                                          'EnforceMaxAvailableRampDownRates',
-                                          'EnforceMaxCapacity',
-                                         ]
-        ramp_up_avail_constrs = []
-        for constr in ramp_up_avail_potential_constrs:
-            if hasattr(m, constr):
-                ramp_up_avail_constrs.append(getattr(m, constr))
+    time_periods = list(m.TimePeriods)
+    time_period_idx = { mt : dt for dt, mt in enumerate(time_periods) }
 
-        if regulation:
-            reg_prov = _preallocated_list(data_time_periods)
-            reg_up_supp = _preallocated_list(data_time_periods)
-            reg_dn_supp = _preallocated_list(data_time_periods)
-        if spin:
-            spin_supp = _preallocated_list(data_time_periods)
-        if nspin:
-            nspin_supp = _preallocated_list(data_time_periods)
-        if supp:
-            supp_supp = _preallocated_list(data_time_periods)
-        if flex:
-            flex_up_supp = _preallocated_list(data_time_periods)
-            flex_dn_supp = _preallocated_list(data_time_periods)
-        gfs = (fs and (g in m.FuelSupplyGenerators))
-        if gfs:
-            fuel_consumed = _preallocated_list(data_time_periods)
-        gdf = (fc and (g in m.DualFuelGenerators))
-        if gdf:
-            aux_fuel_consumed = _preallocated_list(data_time_periods)
-        gdsf = (gdf and (g in m.SingleFireDualFuelGenerators))
-        if gdsf:
-            aux_fuel_indicator = _preallocated_list(data_time_periods)
+    ## pull the values for every generator at once
+    dual_fuel_gens = [ g for g in thermal_gens if g in m.DualFuelGenerators ]
+    single_fuel_gens = [ g for g in thermal_gens if g not in m.DualFuelGenerators ]
 
+    pg_arrays = _get_time_series_arrays(m.PowerGenerated, thermal_gens, time_periods)
+    if reserve_requirement:
+        rg_arrays = _get_time_series_arrays(m.ReserveProvided, thermal_gens, time_periods)
+    commitment_arrays = _get_time_series_arrays(m.UnitOn, thermal_gens, time_periods)
+
+    commitment_cost_arrays = _get_time_series_arrays(m.ShutdownCost, thermal_gens, time_periods)
+    production_cost_arrays = dict()
+    if dual_fuel_gens:
+        for g, v in _get_time_series_arrays(m.DualFuelCommitmentCost, dual_fuel_gens, time_periods).items():
+            commitment_cost_arrays[g] += v
+        production_cost_arrays.update(_get_time_series_arrays(m.DualFuelProductionCost, dual_fuel_gens, time_periods))
+    for g, v in _get_time_series_arrays(m.NoLoadCost, single_fuel_gens, time_periods).items():
+        commitment_cost_arrays[g] += v
+    for g, v in _get_time_series_arrays(m.StartupCost, single_fuel_gens, time_periods).items():
+        commitment_cost_arrays[g] += v
+    production_cost_arrays.update(_get_time_series_arrays(m.ProductionCost, single_fuel_gens, time_periods))
 
-        for dt, mt in enumerate(m.TimePeriods):
-            pg_dict[dt] = value(m.PowerGenerated[g,mt])
-            if reserve_requirement:
-                rg_dict[dt] = value(m.ReserveProvided[g,mt])
-            commitment_dict[dt] = value(m.UnitOn[g,mt])
-            commitment_cost_dict[dt] = value(m.ShutdownCost[g,mt])
-            if g in m.DualFuelGenerators:
-                commitment_cost_dict[dt] += value(m.DualFuelCommitmentCost[g,mt])
-                production_cost_dict[dt] = value(m.DualFuelProductionCost[g,mt])
-            else:
-                commitment_cost_dict[dt] += value(m.NoLoadCost[g,mt]+m.StartupCost[g,mt])
-                production_cost_dict[dt] = value(m.ProductionCost[g,mt])
-
-            if regulation:
-                if g in m.AGC_Generators:
-                    reg_prov[dt] = value(m.RegulationOn[g,mt])
-                    reg_up_supp[dt] = value(m.RegulationReserveUp[g,mt])
-                    reg_dn_supp[dt] = value(m.RegulationReserveDn[g,mt])
-                    commitment_cost_dict[dt] += value(m.RegulationCostCommitment[g,mt])
-                    production_cost_dict[dt] += value(m.RegulationCostGeneration[g,mt])
-                else:
-                    reg_prov[dt] = 0.
-                    reg_up_supp[dt] = 0.
-                    reg_dn_supp[dt] = 0.
-
-            if spin:
-                spin_supp[dt] = value(m.SpinningReserveDispatched[g,mt])
-                production_cost_dict[dt] += value(m.SpinningReserveCostGeneration[g,mt])
-
-            if nspin:
-                if g in m.NonSpinGenerators:
-                    nspin_supp[dt] = value(m.NonSpinningReserveDispatched[g,mt])
-                    production_cost_dict[dt] += value(m.NonSpinningReserveCostGeneration[g,mt])
-                else:
-                    nspin_supp[dt] = 0.
-            if supp:
-                supp_supp[dt] = value(m.SupplementalReserveDispatched[g,mt])
-                production_cost_dict[dt] += value(m.SupplementalReserveCostGeneration[g,mt])
-            if flex:
-                flex_up_supp[dt] = value(m.FlexUpProvided[g,mt])
-                flex_dn_supp[dt] = value(m.FlexDnProvided[g,mt])
-            if gfs:
-                fuel_consumed[dt] = value(m.PrimaryFuelConsumed[g,mt])
-            if gdsf:
-                aux_fuel_indicator[dt] = value(m.UnitOnAuxFuel[g,mt])
-            if gdf:
-                aux_fuel_consumed[dt] = value(m.AuxiliaryFuelConsumed[g,mt])
-
-            ## pyomo doesn't add constraints that are skiped to the index set, so we also
-            ## need check here if the index exists.
-            slack_list = []
-            for constr in ramp_up_avail_constrs:
-                if (g,mt) in constr:
-                    slack_list.append(constr[g,mt].slack())
-
-            ramp_up_avail_dict[dt] = min( slack_list )
-
-
-        g_dict['pg'] = _time_series_dict(pg_dict)
+    if regulation:
+        agc_gens = [ g for g in thermal_gens if g in m.AGC_Generators ]
+        reg_prov_arrays = _get_time_series_arrays(m.RegulationOn, agc_gens, time_periods)
+        reg_up_supp_arrays = _get_time_series_arrays(m.RegulationReserveUp, agc_gens, time_periods)
+        reg_dn_supp_arrays = _get_time_series_arrays(m.RegulationReserveDn, agc_gens, time_periods)
+        for g, v in _get_time_series_arrays(m.RegulationCostCommitment, agc_gens, time_periods).items():
+            commitment_cost_arrays[g] += v
+        for g, v in _get_time_series_arrays(m.RegulationCostGeneration, agc_gens, time_periods).items():
+            production_cost_arrays[g] += v
+    if spin:
+        spin_supp_arrays = _get_time_series_arrays(m.SpinningReserveDispatched, thermal_gens, time_periods)
+        for g, v in _get_time_series_arrays(m.SpinningReserveCostGeneration, thermal_gens, time_periods).items():
+            production_cost_arrays[g] += v
+    if nspin:
+        nspin_gens = [ g for g in thermal_gens if g in m.NonSpinGenerators ]
+        nspin_supp_arrays = _get_time_series_arrays(m.NonSpinningReserveDispatched, nspin_gens, time_periods)
+        for g, v in _get_time_series_arrays(m.NonSpinningReserveCostGeneration, nspin_gens, time_periods).items():
+            production_cost_arrays[g] += v
+    if supp:
+        supp_supp_arrays = _get_time_series_arrays(m.SupplementalReserveDispatched, thermal_gens, time_periods)
+        for g, v in _get_time_series_arrays(m.SupplementalReserveCostGeneration, thermal_gens, time_periods).items():
+            production_cost_arrays[g] += v
+    if flex:
+        flex_up_supp_arrays = _get_time_series_arrays(m.FlexUpProvided, thermal_gens, time_periods)
+        flex_dn_supp_arrays = _get_time_series_arrays(m.FlexDnProvided, thermal_gens, time_periods)
+    if fs:
+        fuel_consumed_arrays = _get_time_series_arrays(m.PrimaryFuelConsumed, [ g for g in thermal_gens if g in m.FuelSupplyGenerators ], time_periods)
+    if fc and dual_fuel_gens:
+        aux_fuel_consumed_arrays = _get_time_series_arrays(m.AuxiliaryFuelConsumed, dual_fuel_gens, time_periods)
+        single_fire_gens = [ g for g in dual_fuel_gens if g in m.SingleFireDualFuelGenerators ]
+        if single_fire_gens:
+            aux_fuel_indicator_arrays = _get_time_series_arrays(m.UnitOnAuxFuel, single_fire_gens, time_periods)
+        else:
+            aux_fuel_indicator_arrays = dict()
+    else:
+        aux_fuel_consumed_arrays = dict()
+        aux_fuel_indicator_arrays = dict()
+
+    ## all of the potential constraints that could limit maximum output
+    ## Not all unit commitment models have these constraints, so first
+    ## we need check if they're on the model object
+    ramp_up_avail_potential_constrs = [
+                                      'EnforceMaxAvailableRampUpRates',
+                                      'AncillaryServiceRampUpLimit',
+                                      'power_limit_from_start',
+                                      'power_limit_from_stop',
+                                      'power_limit_from_start_stop',
+                                      'power_limit_from_start_stops',
+                                      'EnforceMaxAvailableRampDownRates',
+                                      'EnforceMaxCapacity',
+                                     ]
+    ## pyomo doesn't add constraints that are skiped to the index set,
+    ## so we just take the minimum over those which are present
+    ramp_up_avail_arrays = { g : np.full(len(time_periods), np.inf) for g in thermal_gens }
+    for constr in ramp_up_avail_potential_constrs:
+        if hasattr(m, constr):
+            for (g,mt), constr_data in getattr(m, constr).items():
+                if g in ramp_up_avail_arrays:
+                    dt = time_period_idx[mt]
+                    ramp_up_avail_arrays[g][dt] = min(ramp_up_avail_arrays[g][dt], constr_data.slack())
+
+    for g,g_dict in thermal_gens.items():
+        g_dict['pg'] = _time_series_dict(pg_arrays[g].tolist())
         if reserve_requirement:
-            g_dict['rg'] = _time_series_dict(rg_dict)
-        g_dict['commitment'] = _time_series_dict(commitment_dict)
-        g_dict['commitment_cost'] = _time_series_dict(commitment_cost_dict)
-        g_dict['production_cost'] = _time_series_dict(production_cost_dict)
+            g_dict['rg'] = _time_series_dict(rg_arrays[g].tolist())
+        g_dict['commitment'] = _time_series_dict(commitment_arrays[g].tolist())
+        g_dict['commitment_cost'] = _time_series_dict(commitment_cost_arrays[g].tolist())
+        g_dict['production_cost'] = _time_series_dict(production_cost_arrays[g].tolist())
         if regulation:
-            g_dict['reg_provider'] = _time_series_dict(reg_prov)
-            g_dict['reg_up_supplied'] = _time_series_dict(reg_up_supp)
-            g_dict['reg_down_supplied'] = _time_series_dict(reg_dn_supp)
+            if g in reg_prov_arrays:
+                g_dict['reg_provider'] = _time_series_dict(reg_prov_arrays[g].tolist())
+                g_dict['reg_up_supplied'] = _time_series_dict(reg_up_supp_arrays[g].tolist())
+                g_dict['reg_down_supplied'] = _time_series_dict(reg_dn_supp_arrays[g].tolist())
+            else:
+                g_dict['reg_provider'] = _time_series_dict([ 0. for _ in data_time_periods ])
+                g_dict['reg_up_supplied'] = _time_series_dict([ 0. for _ in data_time_periods ])
+                g_dict['reg_down_supplied'] = _time_series_dict([ 0. for _ in data_time_periods ])
         if spin:
-            g_dict['spinning_supplied'] = _time_series_dict(spin_supp)
+            g_dict['spinning_supplied'] = _time_series_dict(spin_supp_arrays[g].tolist())
         if nspin:
-            g_dict['non_spinning_supplied'] = _time_series_dict(nspin_supp)
+            if g in nspin_supp_arrays:
+                g_dict['non_spinning_supplied'] = _time_series_dict(nspin_supp_arrays[g].tolist())
+            else:
+                g_dict['non_spinning_supplied'] = _time_series_dict([ 0. for _ in data_time_periods ])
         if supp:
-            g_dict['supplemental_supplied'] = _time_series_dict(supp_supp)
+            g_dict['supplemental_supplied'] = _time_series_dict(supp_supp_arrays[g].tolist())
         if flex:
-            g_dict['flex_up_supplied'] = _time_series_dict(flex_up_supp)
-            g_dict['flex_down_supplied'] = _time_series_dict(flex_dn_supp)
-        if gfs:
-            g_dict['fuel_consumed'] = _time_series_dict(fuel_consumed)
-        if gdsf:
-            g_dict['aux_fuel_status'] = _time_series_dict(aux_fuel_indicator)
-        if gdf:
-            g_dict['aux_fuel_consumed'] = _time_series_dict(aux_fuel_consumed)
-        g_dict['headroom'] = _time_series_dict(ramp_up_avail_dict)
-
+            g_dict['flex_up_supplied'] = _time_series_dict(flex_up_supp_arrays[g].tolist())
+            g_dict['flex_down_supplied'] = _time_series_dict(flex_dn_supp_arrays[g].tolist())
+        if fs and g in fuel_consumed_arrays:
+            g_dict['fuel_consumed'] = _time_series_dict(fuel_consumed_arrays[g].tolist())
+        if g in aux_fuel_indicator_arrays:
+            g_dict['aux_fuel_status'] = _time_series_dict(aux_fuel_indicator_arrays[g].tolist())
+        if g in aux_fuel_consumed_arrays:
+            g_dict['aux_fuel_consumed'] = _time_series_dict(aux_fuel_consumed_arrays[g].tolist())
+        g_dict['headroom'] = _time_series_dict(ramp_up_avail_arrays[g].tolist())
+
+    if renewable_gens:
+        pg_arrays = _get_time_series_arrays(m.NondispatchablePowerUsed, renewable_gens, time_periods)
     for g,g_dict in renewable_gens.items():
-        pg_dict = _preallocated_list(data_time_periods)
-        for dt, mt in enumerate(m.TimePeriods):
-            pg_dict[dt] = value(m.NondispatchablePowerUsed[g,mt])
-        g_dict['pg'] = _time_series_dict(pg_dict)
+        g_dict['pg'] = _time_series_dict(pg_arrays[g].tolist())
 
+    if storage:
+        p_discharge_arrays = _get_time_series_arrays(m.PowerOutputStorage, storage, time_periods)
+        p_charge_arrays = _get_time_series_arrays(m.PowerInputStorage, storage, time_periods)
+        operational_cost_arrays = _get_time_series_arrays(m.StorageCost, storage, time_periods)
+        state_of_charge_arrays = _get_time_series_arrays(m.SocStorage, storage, time_periods)
     for s,s_dict in storage.items():
-        state_of_charge_dict = _preallocated_list(data_time_periods)
-        p_discharge_dict = _preallocated_list(data_time_periods)
-        p_charge_dict = _preallocated_list(data_time_periods)
-        operational_cost_dict = _preallocated_list(data_time_periods)
-        for dt, mt in enumerate(m.TimePeriods):
-            p_discharge_dict[dt] = value(m.PowerOutputStorage[s,mt])
-            p_charge_dict[dt] = value(m.PowerInputStorage[s,mt])
-            operational_cost_dict[dt] = value(m.StorageCost[s,mt])
-            state_of_charge_dict[dt] = value(m.SocStorage[s.mt])
-
-        s_dict['p_discharge'] = _time_series_dict(p_discharge_dict)
-        s_dict['p_charge'] = _time_series_dict(p_charge_dict)
-        s_dict['operational_cost'] = _time_series_dict(operational_cost_dict)
-        s_dict['state_of_charge'] = _time_series_dict(state_of_charge_dict)
+        s_dict['p_discharge'] = _time_series_dict(p_discharge_arrays[s].tolist())
+        s_dict['p_charge'] = _time_series_dict(p_charge_arrays[s].tolist())
+        s_dict['operational_cost'] = _time_series_dict(operational_cost_arrays[s].tolist())
+        s_dict['state_of_charge'] = _time_series_dict(state_of_charge_arrays[s].tolist())
 
     ## NOTE: UC model currently has no notion of separate loads
 
@@ -1143,13 +1236,15 @@ def solve_unit_commitment(model_data,
             PTDF = b._PTDF
 
             branches_idx = PTDF.branches_keys
-            PTDFM = PTDF.PTDFM
 
             NWV = np.array([value(b.p_nw[bus]) for bus in PTDF.bus_iterator()])
+
+            ## the phi adjustments are already in PTDFM_I_const
+            PFIV = PTDF.calculate_PFV_I(NWV)
+
             NWV += PTDF.phi_adjust_array
 
-            PFV = np.dot(PTDFM, NWV)
-            PFV += PTDF.phase_shift_array
+            PFV = PTDF.calculate_PFV(NWV)
 
             flows_dict[mt] = dict()
             for i,bn in enumerate(branches_idx):
@@ -1157,8 +1252,6 @@ def solve_unit_commitment(model_data,
 
             interface_idx = PTDF.interface_keys
             PTDFM_I = PTDF.PTDFM_I
-            PFIV = np.dot(PTDFM_I, NWV)
-            PFIV += PTDF.PTDFM_I_const
 
             interface_flows_dict[mt] = dict()
             for i, i_n in enumerate(interface_idx):
@@ -1171,18 +1264,19 @@ def solve_unit_commitment(model_data,
                         PFD[i] += value(m.dual[b.ineq_pf_branch_thermal_lb[bn]])
                     if bn in b.ineq_pf_branch_thermal_ub:
                         PFD[i] += value(m.dual[b.ineq_pf_branch_thermal_ub[bn]])
+                lpu.add_contingency_duals(PFD, b, PTDF, m.dual)
                 ## interface constributions to LMP
                 PFID = np.zeros(len(interface_idx))
                 for i,i_n in enumerate(interface_idx):
-                    for i_n in b.ineq_pf_interface_lb:
+                    if i_n in b.ineq_pf_interface_lb:
                         PFID[i] += value(m.dual[b.ineq_pf_interface_lb[i_n]])
-                    for i_n in b.ineq_pf_interface_ub:
+                    if i_n in b.ineq_pf_interface_ub:
                         PFID[i] += value(m.dual[b.ineq_pf_interface_ub[i_n]])
 
                 ## TODO: PFD is likely to be sparse, implying we just need a few
                 ##       rows of the PTDF matrix (or columns in its transpose).
-                LMPC = np.dot(-PTDFM.T, PFD)
-                LMPI = np.dot(-PTDFM_I.T, PFID)
+                LMPC = PTDF.calculate_LMPC(PFD)
+                LMPI = -PTDFM_I.T.dot(PFID)
                 LMPE = value(m.dual[b.eq_p_balance])
                 buses_idx = PTDF.buses_keys
                 lmps_dict[mt] = dict()
@@ -1414,14 +1508,141 @@ def solve_unit_commitment(model_data,
     md.data['system']['total_cost'] = value(m.TotalCostObjective)
 
     unscale_ModelData_to_pu(md, inplace=True)
-    
-    if return_model and return_results:
-        return md, m, results
-    elif return_model:
-        return md, m
-    elif return_results:
-        return md, results
-    return md
+
+    report.record_phase('extract results', time.perf_counter()-extract_start)
+    results.egret_metasolver['performance'] = report.to_dict()
+    if performance_trace is not None:
+        report.write(performance_trace)
+
+    return md, m, results, solver
+
+class UnitCommitmentModel(object):
+    '''
+    A unit commitment model which is built once, and then updated in place
+    for new data with the same network, generator fleet, and number of
+    time periods, e.g., to re-solve as the load and renewable forecasts
+    and the reserve requirements are updated. See
+    egret.model_library.unit_commitment.uc_model_updater for the data
+    which may change.
+
+    >>> uc = UnitCommitmentModel(md)  # doctest: +SKIP
+    >>> md_results = uc.solve('gurobi_persistent')  # doctest: +SKIP
+    >>> uc.update(md_new_forecast)  # doctest: +SKIP
+    >>> md_results = uc.solve()  # doctest: +SKIP
+
+    If the solver is persistent, it keeps the model between solves, and
+    update sends it only the changed variable bounds and constraints.
+    The lazy PTDF flow constraints added in earlier solves are kept.
+
+    Parameters
+    ----------
+    model_data : egret.data.ModelData
+        An egret ModelData object with the appropriate data loaded.
+    uc_model_generator : function (optional)
+        Function for generating the unit commitment model. Default is
+        egret.models.unit_commitment.create_tight_unit_commitment_model
+    relaxed : bool (optional)
+        If True, creates a relaxed unit commitment model
+    kwargs : dictionary (optional)
+        Additional arguments for building model
+    '''
+    def __init__(self, model_data, uc_model_generator=create_tight_unit_commitment_model, relaxed=False, **kwargs):
+        self.relaxed = relaxed
+        self.model = uc_model_generator(model_data, relaxed=relaxed, **kwargs)
+        if relaxed:
+            self.model.dual = pe.Suffix(direction=pe.Suffix.IMPORT)
+
+        self._network = ('branch' in model_data.data['elements']) and bool(len(model_data.data['elements']['branch']))
+
+        ## the results are written to a copy of the
+        ## (in service, p.u.) data of the model
+        self._model_data = self.model.model_data
+        self._structure = uc_model_updater.structural_data(self._model_data)
+
+        self.solver = None
+        ## if the solver is persistent and has the current model
+        self._solver_loaded = False
+
+    def update(self, model_data):
+        '''
+        Updates the model in place with the data in model_data
+
+        Parameters
+        ----------
+        model_data : egret.data.ModelData
+            The new data, which differs from the data the
+            model was built with only in the updatable data
+
+        Raises
+        ------
+        ValueError
+            If the model cannot take the data in model_data, in which case
+            it is unchanged and a new UnitCommitmentModel is needed
+        '''
+        md = model_data.clone_in_service(deep=False)
+        scale_ModelData_to_pu(md, inplace=True)
+
+        report = PerformanceReport()
+        solver_loaded, self._solver_loaded = self._solver_loaded, False
+        with report.phase('update'):
+            try:
+                uc_model_updater.update_model(self.model, md, self._structure,
+                                              solver=(self.solver if solver_loaded else None))
+            except ValueError:
+                ## the model and solver are unchanged
+                self._solver_loaded = solver_loaded
+                raise
+        self._solver_loaded = solver_loaded
+
+        self.model._performance_report = report
+        self._model_data = md
+
+    def solve(self, solver=None, mipgap=0.001, timelimit=None, solver_tee=True, symbolic_solver_labels=False,
+              options=None, return_results=False, performance_trace=None):
+        '''
+        Solves the model, see solve_unit_commitment
+
+        Parameters
+        ----------
+        solver : str or pyomo.opt.base.solvers.OptSolver (optional)
+            Either a string specifying a pyomo solver name, or an instanciated
+            pyomo solver. If None, the solver of the last solve is used.
+        mipgap : float (optional)
+            Mipgap to use for unit commitment solve; default is 0.001
+        timelimit : float (optional)
+            Time limit for unit commitment run. Default of None results in no time
+            limit being set -- runs until mipgap is satisfied
+        solver_tee : bool (optional)
+            Display solver log. Default is True.
+        symbolic_solver_labels : bool (optional)
+            Use symbolic solver labels. Useful for debugging; default is False.
+        options : dict (optional)
+            Other options to pass into the solver. Default is dict().
+        return_results : bool (optional)
+            If True, returns the pyomo results object
+        performance_trace : str (optional)
+            If given, the performance report is written to this file as JSON
+
+        Returns
+        -------
+            egret.data.ModelData : A new ModelData object with the results
+        '''
+        if solver is None:
+            if self.solver is None:
+                raise ValueError("A solver must be given for the first solve")
+            solver = self.solver
+        set_instance = not (self._solver_loaded and solver is self.solver)
+        self._solver_loaded = False
+
+        self.model.model_data = self._model_data.clone(deep=False)
+        md, self.model, results, self.solver = \
+                _solve_unit_commitment_model(self.model, solver, mipgap, timelimit, solver_tee, symbolic_solver_labels,
+                                             options, self.relaxed, self._network, performance_trace, set_instance=set_instance)
+        self._solver_loaded = isinstance(self.solver, PersistentSolver)
+
+        if return_results:
+            return md, results
+        return md
 
 # if __name__ == '__main__':
 #     from egret.data.model_data import ModelData